@@ -0,0 +1,134 @@
+import asyncio
+import itertools
+import os
+import random
+from collections import Counter
+from types import SimpleNamespace
+from telethon import events
+from telethon.errors import FloodWaitError
+from telethon.tl.functions.upload import SaveBigFilePartRequest
+from telethon.tl.types import InputFile
+
+
+class FakeMessage:
+    """Mensaje mínimo con los atributos que usan los handlers y MessageInfo."""
+
+    def __init__(self, message_id, chat_id, text='', sender_id=None, document=None, buttons=None):
+        self.id = message_id
+        self.chat_id = chat_id
+        self.sender_id = sender_id if sender_id is not None else chat_id
+        self.text = text
+        self.message = text
+        self.document = document
+        self.buttons = buttons
+        self.forward = None
+        self.is_private = chat_id > 0
+        self.is_group = chat_id < 0
+        self.is_channel = False
+        self.sender = SimpleNamespace(id=self.sender_id, username=f"user{self.sender_id}",
+                                      first_name="Bench", last_name=None)
+
+
+class FakeTelegramClient:
+    """
+    Sustituto de TelegramClient para benchmarks sin red.
+
+    Registra cada llamada saliente (send/edit/delete/upload), simula latencia y ancho
+    de banda de subida, e inyecta FloodWaitError con la probabilidad indicada en las
+    llamadas de mensajería para ejercitar el dispatcher.
+    """
+
+    def __init__(self, latency=0.05, upload_bandwidth=20 * 1024 * 1024,
+                 flood_rate=0.0, flood_seconds=1, seed=0):
+        self.latency = latency
+        self.upload_bandwidth = upload_bandwidth
+        self.flood_rate = flood_rate
+        self.flood_seconds = flood_seconds
+        self.random = random.Random(seed)
+        self.calls = Counter()
+        self.uploaded_bytes = 0
+        # Archivos entregados por chat (un álbum cuenta tantos como elementos tenga)
+        self.delivered = Counter()
+        self.session = SimpleNamespace(dc_id=0, auth_key=None)
+        self._handlers = []
+        self._ids = itertools.count(1)
+
+    # --- registro de eventos ---
+
+    def on(self, event):
+        def decorator(callback):
+            self._handlers.append((event, callback))
+            return callback
+        return decorator
+
+    async def dispatch_message(self, chat_id, text, sender_id=None):
+        """Entrega un mensaje entrante a los handlers NewMessage, como haría Telethon."""
+        message = FakeMessage(next(self._ids), chat_id, text, sender_id)
+        handlers = []
+        for builder, callback in self._handlers:
+            if not isinstance(builder, events.NewMessage) or builder.outgoing:
+                continue
+            match = None
+            if builder.pattern:
+                match = builder.pattern(text)
+                if not match:
+                    continue
+            event = SimpleNamespace(message=message, chat_id=chat_id, raw_text=text, pattern_match=match)
+            handlers.append(callback(event))
+        await asyncio.gather(*handlers)
+
+    # --- API de TelegramClient usada por el bot ---
+
+    async def _rpc(self, name, payload_bytes=0):
+        self.calls[name] += 1
+        if name in ('send_message', 'edit_message', 'send_file') and self.random.random() < self.flood_rate:
+            self.calls['flood_wait'] += 1
+            raise FloodWaitError(request=None, capture=self.flood_seconds)
+        delay = self.latency
+        if payload_bytes and self.upload_bandwidth:
+            delay += payload_bytes / self.upload_bandwidth
+        await asyncio.sleep(delay)
+
+    async def send_message(self, chat_id, text, parse_mode=None, buttons=None, **kwargs):
+        await self._rpc('send_message')
+        return FakeMessage(next(self._ids), chat_id, text, buttons=buttons)
+
+    async def edit_message(self, chat_id, message_id, text=None, parse_mode=None, **kwargs):
+        await self._rpc('edit_message')
+        return FakeMessage(message_id, chat_id, text or '')
+
+    async def delete_messages(self, chat_id, message_ids, **kwargs):
+        await self._rpc('delete_messages')
+
+    async def send_file(self, chat_id, file, caption=None, buttons=None, **kwargs):
+        await self._rpc('send_file')
+        files = file if isinstance(file, list) else [file]
+        self.delivered[chat_id] += len(files)
+        sent = [
+            FakeMessage(next(self._ids), chat_id, caption if isinstance(caption, str) else '',
+                        document=SimpleNamespace(id=self.random.getrandbits(63),
+                                                 access_hash=self.random.getrandbits(63),
+                                                 file_reference=b'bench'),
+                        buttons=buttons)
+            for _ in files
+        ]
+        return sent if isinstance(file, list) else sent[0]
+
+    async def upload_file(self, file, progress_callback=None, **kwargs):
+        size = os.path.getsize(file)
+        await self._rpc('upload_file', size)
+        self.uploaded_bytes += size
+        if progress_callback:
+            progress_callback(size, size)
+        return InputFile(self.random.getrandbits(63), 1, os.path.basename(file), '')
+
+    async def __call__(self, request):
+        if isinstance(request, SaveBigFilePartRequest):
+            await self._rpc('upload_part', len(request.bytes))
+            self.uploaded_bytes += len(request.bytes)
+            return True
+        await self._rpc(type(request).__name__)
+
+    async def _get_dc(self, dc_id):
+        # Sin conexiones extra: UploadEngine usa la principal (client(request))
+        raise ConnectionError("FakeTelegramClient no abre conexiones a otros DC")
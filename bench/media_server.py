@@ -0,0 +1,139 @@
+import html
+import json
+import os
+import re
+import threading
+import time
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+_CHUNK = 64 * 1024
+_RANGE_RE = re.compile(r'bytes=(\d+)-(\d*)$')
+
+
+class _MediaRequestHandler(SimpleHTTPRequestHandler):
+    bandwidth = 0  # bytes/s por conexión (0 = sin límite)
+    # Keep-alive, como un CDN real
+    protocol_version = 'HTTP/1.1'
+
+    def send_head(self):
+        """Responde 206 a las peticiones con Range (descargas por rangos y reanudación)."""
+        match = _RANGE_RE.match(self.headers.get('Range', ''))
+        path = self.translate_path(self.path)
+        if not match or not os.path.isfile(path):
+            self._remaining = None
+            return super().send_head()
+        size = os.path.getsize(path)
+        start = int(match.group(1))
+        end = min(int(match.group(2)) if match.group(2) else size - 1, size - 1)
+        if start > end:
+            self.send_error(416)
+            return None
+        source = open(path, 'rb')
+        source.seek(start)
+        self.send_response(206)
+        self.send_header('Content-Type', self.guess_type(path))
+        self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+        self._remaining = end - start + 1
+        return source
+
+    def copyfile(self, source, outputfile):
+        remaining = self._remaining
+        if not self.bandwidth and remaining is None:
+            return super().copyfile(source, outputfile)
+        start = time.monotonic()
+        sent = 0
+        while remaining is None or sent < remaining:
+            size = _CHUNK if remaining is None else min(_CHUNK, remaining - sent)
+            chunk = source.read(size)
+            if not chunk:
+                return
+            outputfile.write(chunk)
+            sent += len(chunk)
+            ahead = sent / self.bandwidth - (time.monotonic() - start) if self.bandwidth else 0
+            if ahead > 0:
+                time.sleep(ahead)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _QuietHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clientes que cortan la conexión a medias (yt-dlp, rangos cancelados): no es un error del bench
+        pass
+
+
+class MediaServer:
+    """
+    Servidor HTTP local con archivos .mp4 generados para el extractor genérico de yt-dlp.
+    Los archivos se crean dispersos (truncate) o enlazados entre sí, así un escenario
+    de 1GB o de cientos de enlaces no necesita escribir todos esos bytes al preparar.
+    """
+
+    def __init__(self, root, bandwidth=0):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        handler = type('MediaRequestHandler', (_MediaRequestHandler,), {'bandwidth': bandwidth})
+        self.httpd = _QuietHTTPServer(('127.0.0.1', 0), partial(handler, directory=root))
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def add_file(self, name, size, sparse=False):
+        """Crea un archivo de size bytes y devuelve su URL."""
+        path = os.path.join(self.root, name)
+        with open(path, 'wb') as f:
+            if sparse:
+                f.truncate(size)
+            else:
+                block = os.urandom(min(size, 1024 * 1024)) or b'\0'
+                written = 0
+                while written < size:
+                    written += f.write(block[:size - written])
+        return self.url(name)
+
+    def link_file(self, source_name, name):
+        """Publica source_name bajo otro nombre (hardlink) y devuelve su URL."""
+        os.link(os.path.join(self.root, source_name), os.path.join(self.root, name))
+        return self.url(name)
+
+    def add_page(self, name, media_name):
+        """
+        Publica una página HTML con un VideoObject JSON-LD que apunta a media_name y
+        declara su tamaño (contentSize). Con un enlace directo el extractor genérico no
+        conoce el tamaño; con la página sí, así el bench pasa por la subida en streaming
+        y la descarga por rangos como con un sitio real.
+        """
+        video = {
+            '@context': 'https://schema.org',
+            '@type': 'VideoObject',
+            'name': os.path.splitext(name)[0],
+            'contentUrl': self.url(media_name),
+            'encodingFormat': 'video/mp4',
+            'contentSize': os.path.getsize(os.path.join(self.root, media_name)),
+        }
+        page = (f"<html><head><title>{html.escape(video['name'])}</title>"
+                f"<script type=\"application/ld+json\">{json.dumps(video)}</script></head><body></body></html>")
+        with open(os.path.join(self.root, f"{name}.html"), 'w', encoding='utf-8') as f:
+            f.write(page)
+        return self.url(f"{name}.html")
+
+    def url(self, name):
+        return f"{self.base_url}/{name}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='media-server', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,286 @@
+"""
+Benchmark offline del bot: HandlerRegistry/LinkHandler/TelegramMessenger reales contra
+un cliente de Telegram falso y un servidor HTTP local (extractor genérico de yt-dlp).
+
+    python bench/run_bench.py --scenario chats
+    python bench/run_bench.py --scenario big --json
+
+Sale con código 1 si algún trabajo registra un error o algún chat no recibe todos sus archivos.
+
+Las variables de entorno del bot (OUTBOUND_*, DOWNLOAD_*, UPLOAD_*...) se respetan,
+así se puede comparar el efecto de cada ajuste.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.fake_telegram import FakeTelegramClient
+from bench.media_server import MediaServer
+
+OWNER_ID = 1
+MB = 1024 * 1024
+
+SCENARIOS = {
+    # 100 chats privados pegando 3 enlaces distintos a la vez
+    'chats': {'chats': 100, 'links': 3, 'size': 2 * MB},
+    # Un único archivo de 1GB (subida en streaming, retención, disco); la página declara el tamaño
+    'big': {'chats': 1, 'links': 1, 'size': 1024 * MB, 'sparse': True, 'pages': True},
+    # El mismo archivo sin streaming: descarga por rangos en paralelo y subida en partes
+    'ranges': {'chats': 1, 'links': 1, 'size': 1024 * MB, 'sparse': True, 'pages': True,
+               'env': {'STREAMING_UPLOAD': 'false'}},
+    # Los mismos enlaces desde muchos chats (single-flight y caché)
+    'shared': {'chats': 50, 'links': 3, 'size': 2 * MB, 'shared': True},
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenario', choices=sorted(SCENARIOS), default='chats')
+    parser.add_argument('--chats', type=int, help="Número de chats (sobrescribe el escenario)")
+    parser.add_argument('--links', type=int, help="Enlaces por mensaje")
+    parser.add_argument('--size', type=int, help="Tamaño de cada archivo en bytes")
+    parser.add_argument('--shared', action='store_true', help="Todos los chats envían los mismos enlaces")
+    parser.add_argument('--latency', type=float, default=0.05, help="Latencia simulada por llamada a Telegram (s)")
+    parser.add_argument('--upload-bandwidth', type=float, default=20 * MB, help="Bytes/s de subida simulados")
+    parser.add_argument('--download-bandwidth', type=float, default=0, help="Bytes/s por conexión del servidor (0 = sin límite)")
+    parser.add_argument('--flood-rate', type=float, default=0.0, help="Probabilidad de FloodWaitError por mensaje")
+    parser.add_argument('--flood-seconds', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true', help="Salida en JSON")
+    parser.add_argument('--keep', action='store_true', help="No borrar el directorio de trabajo")
+    parser.add_argument('--verbose', action='store_true', help="Mostrar los logs del bot")
+    args = parser.parse_args()
+
+    scenario = dict(SCENARIOS[args.scenario])
+    for key in ('chats', 'links', 'size'):
+        if getattr(args, key) is not None:
+            scenario[key] = getattr(args, key)
+    if args.shared:
+        scenario['shared'] = True
+    return args, scenario
+
+
+def prepare_media(server, scenario):
+    """Genera los archivos y devuelve, por chat, el texto del mensaje con sus enlaces."""
+    server.add_file('source.mp4', scenario['size'], sparse=scenario.get('sparse', False))
+
+    def new_link(name):
+        server.link_file('source.mp4', f'{name}.mp4')
+        return server.add_page(name, f'{name}.mp4') if scenario.get('pages') else server.url(f'{name}.mp4')
+
+    shared_links = None
+    if scenario.get('shared'):
+        shared_links = [new_link(f'shared_{i}') for i in range(scenario['links'])]
+
+    messages = []
+    for chat in range(scenario['chats']):
+        links = shared_links or [new_link(f'c{chat}_{i}') for i in range(scenario['links'])]
+        messages.append((1000 + chat, "\n".join(links)))
+    return messages
+
+
+def configure_env(workdir, scenario):
+    for key, value in scenario.get('env', {}).items():
+        os.environ.setdefault(key, value)
+    os.environ.setdefault('BOT_TOKEN', 'bench')
+    os.environ.setdefault('API_ID', '1')
+    os.environ.setdefault('API_HASH', 'bench')
+    os.environ.setdefault('USER_ID', str(OWNER_ID))
+    os.environ.setdefault('WWW_DIR', os.path.join(workdir, 'www'))
+    os.environ.setdefault('RETENTION_MIN_FREE_BYTES', '0')
+    os.environ.setdefault('METRICS_PORT', '0')
+
+
+def dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.stat(os.path.join(root, name)).st_blocks * 512
+            except OSError:
+                pass
+    return total
+
+
+async def sample_disk(paths, peak, interval=0.2):
+    while True:
+        used = sum(await asyncio.gather(*(asyncio.to_thread(dir_size, p) for p in paths)))
+        peak[0] = max(peak[0], used)
+        await asyncio.sleep(interval)
+
+
+class ErrorCounter(logging.Handler):
+    """Cuenta los errores que registra el bot (un trabajo que falla siempre deja uno)."""
+
+    def __init__(self):
+        super().__init__(logging.ERROR)
+        self.count = 0
+
+    def emit(self, record):
+        self.count += 1
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run(args, scenario, workdir):
+    # Importar tras fijar el entorno y el directorio de trabajo (downloads/, data/)
+    from src.config.config import Config
+    from src.handlers.handler_registry import HandlerRegistry
+    from src.handlers.link_handler import LinkHandler
+    from src.utils.metrics import metrics, watch_loop_lag
+
+    if not args.verbose:
+        # Sin barras de progreso ni mensajes de yt-dlp en la salida del bench
+        build_ydl_opts = LinkHandler._build_ydl_opts
+
+        def quiet_ydl_opts(self, link):
+            return dict(build_ydl_opts(self, link), quiet=True, noprogress=True, no_warnings=True)
+        LinkHandler._build_ydl_opts = quiet_ydl_opts
+
+    server = MediaServer(os.path.join(workdir, 'media'), bandwidth=args.download_bandwidth)
+    messages = prepare_media(server, scenario)
+    server.start()
+
+    client = FakeTelegramClient(latency=args.latency, upload_bandwidth=args.upload_bandwidth,
+                                flood_rate=args.flood_rate, flood_seconds=args.flood_seconds,
+                                seed=args.seed)
+    registry = HandlerRegistry(client, Config())
+    registry.register_all_handlers()
+
+    peak_disk = [0]
+    watchers = [
+        asyncio.create_task(sample_disk([os.path.join(workdir, 'downloads'), os.path.join(workdir, 'www')],
+                                        peak_disk)),
+        asyncio.create_task(watch_loop_lag()),
+    ]
+    latencies = []
+    errors = ErrorCounter()
+    logging.getLogger().addHandler(errors)
+
+    async def deliver(chat_id, text):
+        start = time.monotonic()
+        await client.dispatch_message(chat_id, text)
+        latencies.append(time.monotonic() - start)
+
+    start = time.monotonic()
+    try:
+        await asyncio.gather(*(deliver(chat_id, text) for chat_id, text in messages))
+        elapsed = time.monotonic() - start
+    finally:
+        for task in watchers:
+            task.cancel()
+        for handler in registry.handlers:
+            scheduler = getattr(handler, 'scheduler', None)
+            if scheduler is not None:
+                scheduler.shutdown()
+            media_processor = getattr(handler, 'media_processor', None)
+            if media_processor is not None:
+                media_processor.shutdown()
+        server.stop()
+        logging.getLogger().removeHandler(errors)
+
+    stages = metrics.get('stage_seconds')
+    loop_lag = metrics.get('event_loop_lag_seconds')
+    stage_report = {}
+    if stages is not None:
+        for (labels, series) in stages.series.items():
+            stage = dict(labels)['stage']
+            stage_report[stage] = {
+                'count': series[2],
+                'mean': series[1] / series[2] if series[2] else None,
+                'p50_le': stages.quantile(0.5, stage=stage),
+                'p99_le': stages.quantile(0.99, stage=stage),
+            }
+
+    links = scenario['chats'] * scenario['links']
+    # Cada chat tiene que recibir todos sus enlaces (también los que siguen a otro líder)
+    missing = {chat_id: scenario['links'] - client.delivered[chat_id] for chat_id, _ in messages
+               if client.delivered[chat_id] < scenario['links']}
+    return {
+        'scenario': args.scenario,
+        'chats': scenario['chats'],
+        'links_per_message': scenario['links'],
+        'file_size': scenario['size'],
+        'elapsed_s': elapsed,
+        'messages_per_s': len(messages) / elapsed if elapsed else None,
+        'links_per_s': links / elapsed if elapsed else None,
+        'latency_p50_s': percentile(latencies, 0.5),
+        'latency_p99_s': percentile(latencies, 0.99),
+        'latency_mean_s': statistics.fmean(latencies) if latencies else None,
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'peak_disk_mb': peak_disk[0] / MB,
+        'uploaded_mb': client.uploaded_bytes / MB,
+        'telegram_calls': dict(client.calls),
+        'loop_lag_p99_le_s': loop_lag.quantile(0.99) if loop_lag else None,
+        'stages': stage_report,
+        'missing_deliveries': missing,
+        'errors': errors.count,
+    }
+
+
+def print_report(report):
+    print(f"Escenario {report['scenario']}: {report['chats']} chats × {report['links_per_message']} enlaces "
+          f"de {report['file_size'] / MB:.1f}MB")
+    print(f"  Tiempo total:      {report['elapsed_s']:.2f}s")
+    print(f"  Mensajes/s:        {report['messages_per_s']:.2f} ({report['links_per_s']:.2f} enlaces/s)")
+    print(f"  Latencia p50/p99:  {report['latency_p50_s']:.2f}s / {report['latency_p99_s']:.2f}s")
+    print(f"  Pico RSS:          {report['peak_rss_mb']:.0f}MB")
+    print(f"  Pico disco:        {report['peak_disk_mb']:.0f}MB")
+    print(f"  Subido:            {report['uploaded_mb']:.0f}MB")
+    print(f"  Llamadas Telegram: {report['telegram_calls']}")
+    if report['loop_lag_p99_le_s'] is not None:
+        print(f"  Lag event loop:    p99≤{report['loop_lag_p99_le_s']:g}s")
+    for stage, values in sorted(report['stages'].items()):
+        print(f"  Etapa {stage:<9} n={values['count']:<5} media={values['mean']:.2f}s "
+              f"p50≤{values['p50_le']:g}s p99≤{values['p99_le']:g}s")
+    if report['errors']:
+        print(f"  Errores:           {report['errors']}")
+    if report['missing_deliveries']:
+        print(f"  Entregas que faltan: {sum(report['missing_deliveries'].values())} "
+              f"en {len(report['missing_deliveries'])} chats")
+
+
+def main():
+    args, scenario = parse_args()
+    if not args.verbose:
+        logging.disable(logging.WARNING)
+
+    workdir = tempfile.mkdtemp(prefix='grande-bench-')
+    cwd = os.getcwd()
+    configure_env(workdir, scenario)
+    os.chdir(workdir)
+    try:
+        report = asyncio.run(run(args, scenario, workdir))
+    finally:
+        os.chdir(cwd)
+        if args.keep:
+            print(f"Directorio de trabajo: {workdir}", file=sys.stderr)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    if report['errors'] or report['missing_deliveries']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -5,6 +5,7 @@ from telethon import TelegramClient
 from src.config.config import Config
 from src.handlers.handler_registry import HandlerRegistry
 from src.config.logger import setup_logger
+from src.utils.metrics import start_metrics_server, watch_loop_lag
 
 # Cargar variables de entorno
 load_dotenv()
@@ -21,6 +22,11 @@ async def main():
     # Registrar manejadores
     handler_registry = HandlerRegistry(client, config)
     handler_registry.register_all_handlers()
+
+    # Métricas: watchdog del event loop y endpoint Prometheus local
+    lag_watchdog = asyncio.create_task(watch_loop_lag(config.loop_lag_interval))
+    if config.metrics_port:
+        await start_metrics_server(config.metrics_host, config.metrics_port)
     
     logger.info("Bot iniciado correctamente")
     print("Bot iniciado correctamente")
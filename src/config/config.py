@@ -1,14 +1,106 @@
 import os
 
 class Config:
-    def __init__(self):
+    def __init__(self, require_telegram=True):
         self.bot_token = os.getenv('BOT_TOKEN')
-        self.api_id = int(os.getenv('API_ID'))
+        self.api_id = int(os.getenv('API_ID') or 0)
         self.api_hash = os.getenv('API_HASH')
-        self.user_id = int(os.getenv('USER_ID'))
+        self.user_id = int(os.getenv('USER_ID') or 0)
 
         self.logs_level = os.getenv('LOGS_LEVEL', 'INFO')
+
+        # Límites de salida hacia Telegram (mensajes por segundo)
+        self.outbound_private_rate = float(os.getenv('OUTBOUND_PRIVATE_RATE', 1))
+        self.outbound_group_rate = float(os.getenv('OUTBOUND_GROUP_RATE', 20 / 60))
+        self.outbound_global_rate = float(os.getenv('OUTBOUND_GLOBAL_RATE', 25))
+        self.outbound_burst = int(os.getenv('OUTBOUND_BURST', 3))
+        self.outbound_max_in_flight = int(os.getenv('OUTBOUND_MAX_IN_FLIGHT', 8))
+
+        # Scheduler de descargas
+        self.download_workers = int(os.getenv('DOWNLOAD_WORKERS', os.cpu_count() or 2))
+        self.download_per_chat = int(os.getenv('DOWNLOAD_PER_CHAT', 2))
+        self.download_executor = os.getenv('DOWNLOAD_EXECUTOR', 'thread')  # thread | process
+
+        # Workers externos: local (pool en este proceso) | sqlite (mismo host) | redis (varios hosts)
+        self.download_backend = os.getenv('DOWNLOAD_BACKEND', 'local')
+        self.queue_db_path = os.getenv('QUEUE_DB_PATH', os.path.join('data', 'queue.db'))
+        self.redis_url = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+        self.queue_lease = float(os.getenv('QUEUE_LEASE', 30))
+        self.queue_max_attempts = int(os.getenv('QUEUE_MAX_ATTEMPTS', 3))
+        self.queue_poll_interval = float(os.getenv('QUEUE_POLL_INTERVAL', 0.5))
+        # Trabajos remotos esperando resultado a la vez (0 = sin límite; DOWNLOAD_PER_CHAT sigue aplicando)
+        self.queue_max_in_flight = int(os.getenv('QUEUE_MAX_IN_FLIGHT', 0))
+        self.worker_concurrency = int(os.getenv('WORKER_CONCURRENCY', 2))
+        # Red: fragmentos HLS/DASH en paralelo, rangos en paralelo para archivos progresivos,
+        # presupuesto global de ancho de banda (bytes/s, 0 = sin límite) y límites por dominio
+        self.fragment_concurrency = int(os.getenv('FRAGMENT_CONCURRENCY', 4))
+        self.range_connections = int(os.getenv('RANGE_CONNECTIONS', 4))
+        self.range_min_bytes = int(os.getenv('RANGE_MIN_BYTES', 16 * 1024 * 1024))
+        self.range_chunk_size = int(os.getenv('RANGE_CHUNK_SIZE', 4 * 1024 * 1024))
+        self.download_bandwidth = int(os.getenv('DOWNLOAD_BANDWIDTH', 0))
+        self.domain_max_connections = int(os.getenv('DOMAIN_MAX_CONNECTIONS', 8))
+        self.domain_requests_per_second = float(os.getenv('DOMAIN_REQUESTS_PER_SECOND', 5))
+        self.domain_profiles = os.getenv('DOMAIN_PROFILES', os.path.join('data', 'domains.json'))
+        self.cookies_file = os.getenv('COOKIES_FILE', '')
+        self.download_user_agent = os.getenv(
+            'DOWNLOAD_USER_AGENT',
+            'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36')
+
+        # Catálogo de archivos: escritura diferida en SQLite y tamaño de página de /files
+        self.catalog_flush_interval = float(os.getenv('CATALOG_FLUSH_INTERVAL', 2))
+        self.files_page_size = int(os.getenv('FILES_PAGE_SIZE', 10))
+
+        # Post-proceso con ffmpeg: MP4 faststart, reencode si no cabe, miniatura y atributos
+        self.media_postprocess = os.getenv('MEDIA_POSTPROCESS', 'true').lower() == 'true'
+        self.media_workers = int(os.getenv('MEDIA_WORKERS', 1))
+        self.media_preset = os.getenv('MEDIA_PRESET', 'veryfast')
+        self.media_audio_bitrate = int(os.getenv('MEDIA_AUDIO_BITRATE', 128000))
+        self.media_timeout = float(os.getenv('MEDIA_TIMEOUT', 3600))
+        self.links_per_message_concurrency = int(os.getenv('LINKS_PER_MESSAGE_CONCURRENCY', 3))
+
+        # Retención de downloads/ (persist/ no se desaloja). También limita los archivos de la
+        # caché de descargas; CACHE_MAX_BYTES se acepta como nombre antiguo de la cuota
+        self.retention_quota_bytes = int(os.getenv('RETENTION_QUOTA_BYTES',
+                                                   os.getenv('CACHE_MAX_BYTES', 10 * 1024 * 1024 * 1024)))
+        self.retention_ttl = int(os.getenv('RETENTION_TTL', 24 * 3600))
+        self.retention_interval = int(os.getenv('RETENTION_INTERVAL', 600))
+        self.retention_min_age = int(os.getenv('RETENTION_MIN_AGE', 600))
+        self.retention_min_free_bytes = int(os.getenv('RETENTION_MIN_FREE_BYTES', 1024 * 1024 * 1024))
+        self.retention_admission_wait = int(os.getenv('RETENTION_ADMISSION_WAIT', 60))
+
+        # Límites de tamaño: lo que se sube a Telegram y lo máximo que se descarga (para www)
+        # Con MTProto (api_id/api_hash) un bot puede subir hasta 2GB
+        self.max_upload_bytes = int(os.getenv('MAX_UPLOAD_BYTES', 2000 * 1024 * 1024))
+        self.max_download_bytes = int(os.getenv('MAX_DOWNLOAD_BYTES', 4 * 1024 * 1024 * 1024))
+        self.probe_cache_ttl = int(os.getenv('PROBE_CACHE_TTL', 300))
+
+        # Publicación en www cuando no se puede enviar por Telegram
+        self.www_dir = os.getenv('WWW_DIR', '/app/www')
+        self.www_base_url = os.getenv('WWW_BASE_URL', 'http://portal.davidperezmillan.com/grande/downloads')
+
+        # Subida en paralelo
+        self.upload_connections = int(os.getenv('UPLOAD_CONNECTIONS', 4))
+        self.upload_part_size = int(os.getenv('UPLOAD_PART_SIZE', 512 * 1024))
+        self.upload_retries = int(os.getenv('UPLOAD_RETRIES', 3))
+        self.progress_interval = float(os.getenv('PROGRESS_INTERVAL', 5))
+
+        # Subida en streaming mientras se descarga (solo MP4 progresivo)
+        self.streaming_upload = os.getenv('STREAMING_UPLOAD', 'true').lower() == 'true'
+        self.streaming_window = int(os.getenv('STREAMING_WINDOW', 16))  # partes en memoria
+        self.streaming_min_bytes = int(os.getenv('STREAMING_MIN_BYTES', 20 * 1024 * 1024))
+
+        # Enlaces sin extractor específico: por defecto se pasan al extractor genérico de yt-dlp;
+        # con false solo se aceptan enlaces directos a vídeo
+        self.link_allow_generic = os.getenv('LINK_ALLOW_GENERIC', 'true').lower() == 'true'
+
+        # Mantenimiento de yt-dlp: actualización periódica fuera de las peticiones (0 = nunca)
+        self.ytdlp_update_interval = int(os.getenv('YTDLP_UPDATE_INTERVAL', 24 * 3600))
+
+        # Métricas (endpoint Prometheus local; puerto 0 lo desactiva)
+        self.metrics_host = os.getenv('METRICS_HOST', '127.0.0.1')
+        self.metrics_port = int(os.getenv('METRICS_PORT', 9464))
+        self.loop_lag_interval = float(os.getenv('LOOP_LAG_INTERVAL', 0.5))
         
-        # Validar que todas las variables estén presentes
-        if not all([self.bot_token, self.api_id, self.api_hash, self.user_id]):
+        # Validar que todas las variables estén presentes (los workers no hablan con Telegram)
+        if require_telegram and not all([self.bot_token, self.api_id, self.api_hash, self.user_id]):
             raise ValueError("Faltan variables de entorno requeridas: BOT_TOKEN, API_ID, API_HASH, USER_ID")
\ No newline at end of file
@@ -0,0 +1,162 @@
+import asyncio
+import atexit
+import os
+import secrets
+import time
+from src.config.logger import setup_logger
+from src.database.manager import DatabaseManager
+from src.database.models import ArtifactEntry, ARTIFACT_STORED, ARTIFACT_PERSISTED, ARTIFACT_DELETED
+
+# Las entradas de archivos borrados se guardan una semana
+DELETED_RETENTION = 7 * 24 * 3600
+SORT_KEYS = {
+    'size': lambda entry: entry.size,
+    'age': lambda entry: entry.created_at,
+}
+
+_catalog = None
+
+
+def get_catalog(config):
+    """Devuelve el catálogo compartido del proceso (lo usan LinkHandler y CommandHandler)."""
+    global _catalog
+    if _catalog is None:
+        _catalog = ArtifactCatalog(DatabaseManager(), config)
+    return _catalog
+
+
+class ArtifactCatalog:
+    """
+    Catálogo de los archivos descargados, con un id corto por archivo.
+
+    Las búsquedas (por id o por ruta) y los listados se sirven de índices en memoria;
+    los cambios se marcan como sucios y se escriben en la tabla artifacts en lote cada
+    flush_interval segundos (write-behind), y al salir del proceso. Los botones inline
+    llevan solo el id, que cabe de sobra en los 64 bytes del callback data.
+    """
+
+    def __init__(self, db, config):
+        self.logger = setup_logger('ArtifactCatalog')
+        self.db = db
+        self.flush_interval = config.catalog_flush_interval
+        self._by_id = {}
+        self._by_path = {}
+        self._sorted = {}
+        self._dirty = {}
+        self._task = None
+        for entry in db.get_live_artifacts():
+            self._index(entry)
+        self.logger.info(f"Catálogo cargado: {len(self._by_id)} archivos")
+        atexit.register(self.flush_now)
+
+    def start(self):
+        """Arranca la escritura periódica en segundo plano."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    # --- consultas O(1) ---
+
+    def get(self, artifact_id):
+        return self._by_id.get(artifact_id)
+
+    def by_path(self, path):
+        return self._by_path.get(os.path.normpath(path))
+
+    def page(self, state, sort='age', page=0, per_page=10):
+        """
+        Una página de archivos en el estado indicado, por tamaño o antigüedad (los
+        más grandes / recientes primero). Devuelve (entradas, total, bytes totales).
+        """
+        key = (state, sort)
+        ordered = self._sorted.get(key)
+        if ordered is None:
+            ordered = sorted((entry for entry in self._by_id.values() if entry.state == state),
+                             key=SORT_KEYS[sort], reverse=True)
+            self._sorted[key] = ordered
+        start = page * per_page
+        return ordered[start:start + per_page], len(ordered), sum(entry.size for entry in ordered)
+
+    # --- cambios ---
+
+    def ensure(self, path, source_url=None, chat_id=None, requester_id=None):
+        """Devuelve la entrada del archivo, creándola si aún no está en el catálogo."""
+        entry = self.by_path(path)
+        if entry is not None:
+            return entry
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            size = 0
+        now = time.time()
+        entry = ArtifactEntry(self._new_id(), os.path.normpath(path), size, source_url, chat_id,
+                              requester_id, ARTIFACT_STORED, now, now)
+        self._index(entry)
+        self._mark(entry)
+        return entry
+
+    def mark_persisted(self, entry, new_path):
+        del self._by_path[entry.path]
+        entry.path = os.path.normpath(new_path)
+        entry.state = ARTIFACT_PERSISTED
+        self._by_path[entry.path] = entry
+        self._mark(entry)
+
+    def mark_deleted(self, entry):
+        self._by_id.pop(entry.id, None)
+        self._by_path.pop(entry.path, None)
+        entry.state = ARTIFACT_DELETED
+        self._mark(entry)
+
+    def forget_path(self, path):
+        """El archivo se ha borrado fuera del catálogo (p. ej. por retención)."""
+        entry = self.by_path(path)
+        if entry is not None:
+            self.mark_deleted(entry)
+
+    def _new_id(self):
+        while True:
+            artifact_id = secrets.token_urlsafe(6)
+            if artifact_id not in self._by_id:
+                return artifact_id
+
+    def _index(self, entry):
+        self._by_id[entry.id] = entry
+        self._by_path[os.path.normpath(entry.path)] = entry
+
+    def _mark(self, entry):
+        entry.updated_at = time.time()
+        self._dirty[entry.id] = entry
+        self._sorted.clear()
+
+    # --- write-behind ---
+
+    async def _run(self):
+        last_prune = 0
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+                if time.time() - last_prune > 3600:
+                    await asyncio.to_thread(self.db.prune_artifacts, time.time() - DELETED_RETENTION)
+                    last_prune = time.time()
+            except Exception as e:
+                self.logger.error(f"Error guardando el catálogo: {e}")
+
+    async def flush(self):
+        """Escribe en lote las entradas modificadas desde la última escritura."""
+        if not self._dirty:
+            return
+        entries, self._dirty = list(self._dirty.values()), {}
+        try:
+            await asyncio.to_thread(self.db.save_artifacts, entries)
+        except Exception:
+            # Reintentar en la siguiente escritura sin pisar cambios más recientes
+            for entry in entries:
+                self._dirty.setdefault(entry.id, entry)
+            raise
+
+    def flush_now(self):
+        """Escritura síncrona (al salir del proceso)."""
+        if self._dirty:
+            entries, self._dirty = list(self._dirty.values()), {}
+            self.db.save_artifacts(entries)
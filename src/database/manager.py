@@ -1,2 +1,225 @@
+import os
+import sqlite3
+import threading
+import time
+from src.config.logger import setup_logger
+from src.database.models import (
+    ArtifactEntry, ARTIFACT_DELETED, CacheEntry, Job, JOB_QUEUED, UNFINISHED_JOB_STATES
+)
+
+
 class DatabaseManager:
-    pass
\ No newline at end of file
+    """Acceso a la base de datos SQLite del bot (data/grande.db por defecto)."""
+
+    def __init__(self, db_path=None):
+        self.logger = setup_logger('DatabaseManager')
+        self.db_path = db_path or os.path.join('data', 'grande.db')
+        os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        self._create_tables()
+
+    def _create_tables(self):
+        with self._lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS media_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    filepath TEXT,
+                    size INTEGER NOT NULL DEFAULT 0,
+                    sha256 TEXT,
+                    doc_id INTEGER,
+                    access_hash INTEGER,
+                    file_reference BLOB,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS media_cache_urls (
+                    url TEXT PRIMARY KEY,
+                    cache_key TEXT NOT NULL REFERENCES media_cache(cache_key) ON DELETE CASCADE
+                )
+            """)
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_media_cache_last_used ON media_cache(last_used)")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    chat_id INTEGER NOT NULL,
+                    link TEXT NOT NULL,
+                    state TEXT NOT NULL,
+                    request_message_id INTEGER,
+                    status_message_id INTEGER,
+                    part_path TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs(state)")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS artifacts (
+                    id TEXT PRIMARY KEY,
+                    path TEXT NOT NULL,
+                    size INTEGER NOT NULL DEFAULT 0,
+                    source_url TEXT,
+                    chat_id INTEGER,
+                    requester_id INTEGER,
+                    state TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_artifacts_state ON artifacts(state)")
+
+    # --- media_cache ---
+
+    def get_cache_entry(self, cache_key):
+        """Devuelve la CacheEntry para la clave o None."""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT * FROM media_cache WHERE cache_key = ?", (cache_key,)).fetchone()
+        return CacheEntry.from_row(row) if row else None
+
+    def get_cache_entry_by_url(self, url):
+        """Devuelve la CacheEntry asociada a una URL canónica o None."""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT c.* FROM media_cache c JOIN media_cache_urls u ON u.cache_key = c.cache_key "
+                "WHERE u.url = ?", (url,)).fetchone()
+        return CacheEntry.from_row(row) if row else None
+
+    def upsert_cache_entry(self, cache_key, filepath, size, sha256):
+        """Crea o actualiza la entrada con el archivo local, sin tocar la referencia de Telegram."""
+        now = time.time()
+        with self._lock, self.conn:
+            self.conn.execute("""
+                INSERT INTO media_cache (cache_key, filepath, size, sha256, created_at, last_used)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(cache_key) DO UPDATE SET
+                    filepath = excluded.filepath, size = excluded.size,
+                    sha256 = excluded.sha256, last_used = excluded.last_used
+            """, (cache_key, filepath, size, sha256, now, now))
+
+    def add_cache_url(self, url, cache_key):
+        """Asocia una URL canónica a una entrada de la caché."""
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO media_cache_urls (url, cache_key) VALUES (?, ?)",
+                (url, cache_key))
+
+    def set_cache_file_reference(self, cache_key, doc_id, access_hash, file_reference):
+        """Guarda la referencia del documento subido a Telegram."""
+        with self._lock, self.conn:
+            self.conn.execute(
+                "UPDATE media_cache SET doc_id = ?, access_hash = ?, file_reference = ? "
+                "WHERE cache_key = ?", (doc_id, access_hash, file_reference, cache_key))
+
+    def clear_cache_file_reference(self, cache_key):
+        """Olvida la referencia de Telegram (p. ej. si ha caducado); sin archivo local, borra la entrada."""
+        with self._lock, self.conn:
+            self.conn.execute(
+                "UPDATE media_cache SET doc_id = NULL, access_hash = NULL, file_reference = NULL "
+                "WHERE cache_key = ?", (cache_key,))
+            self._delete_orphan_cache_entries("cache_key = ?", (cache_key,))
+
+    def touch_cache_entry(self, cache_key):
+        """Actualiza last_used para el LRU."""
+        with self._lock, self.conn:
+            self.conn.execute(
+                "UPDATE media_cache SET last_used = ? WHERE cache_key = ?", (time.time(), cache_key))
+
+    def clear_cache_filepath(self, filepath):
+        """Marca como sin archivo local las entradas que apuntan a filepath y borra las que quedan vacías."""
+        with self._lock, self.conn:
+            keys = [row['cache_key'] for row in self.conn.execute(
+                "SELECT cache_key FROM media_cache WHERE filepath = ?", (filepath,))]
+            self.conn.execute(
+                "UPDATE media_cache SET filepath = NULL, size = 0 WHERE filepath = ?", (filepath,))
+            for key in keys:
+                self._delete_orphan_cache_entries("cache_key = ?", (key,))
+
+    def _delete_orphan_cache_entries(self, where, params):
+        """Borra (con sus URLs) las entradas sin archivo local ni referencia de Telegram.
+
+        Debe llamarse con el lock y la transacción ya abiertos.
+        """
+        condition = f"filepath IS NULL AND doc_id IS NULL AND {where}"
+        self.conn.execute(
+            "DELETE FROM media_cache_urls WHERE cache_key IN "
+            f"(SELECT cache_key FROM media_cache WHERE {condition})", params)
+        self.conn.execute(f"DELETE FROM media_cache WHERE {condition}", params)
+
+    # --- jobs (journal de trabajos) ---
+
+    _JOB_FIELDS = ('state', 'status_message_id', 'part_path', 'attempts', 'error')
+
+    def create_job(self, chat_id, link, request_message_id=None, status_message_id=None):
+        """Registra un trabajo nuevo en estado queued y devuelve su id."""
+        now = time.time()
+        with self._lock, self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO jobs (chat_id, link, state, request_message_id, status_message_id, "
+                "created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (chat_id, link, JOB_QUEUED, request_message_id, status_message_id, now, now))
+        return cursor.lastrowid
+
+    def update_job(self, job_id, **fields):
+        """Actualiza los campos indicados (state, status_message_id, part_path, attempts, error)."""
+        unknown = set(fields) - set(self._JOB_FIELDS)
+        if unknown:
+            raise ValueError(f"Campos de job desconocidos: {', '.join(sorted(unknown))}")
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock, self.conn:
+            self.conn.execute(
+                f"UPDATE jobs SET {columns}, updated_at = ? WHERE id = ?",
+                (*fields.values(), time.time(), job_id))
+
+    def get_unfinished_jobs(self):
+        """Trabajos que no llegaron a done/failed (p. ej. por un reinicio), en orden de llegada."""
+        placeholders = ", ".join("?" * len(UNFINISHED_JOB_STATES))
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT * FROM jobs WHERE state IN ({placeholders}) ORDER BY id",
+                UNFINISHED_JOB_STATES).fetchall()
+        return [Job.from_row(row) for row in rows]
+
+    def prune_jobs(self, before):
+        """Borra los trabajos terminados antes de la marca de tiempo indicada."""
+        placeholders = ", ".join("?" * len(UNFINISHED_JOB_STATES))
+        with self._lock, self.conn:
+            self.conn.execute(
+                f"DELETE FROM jobs WHERE state NOT IN ({placeholders}) AND updated_at < ?",
+                (*UNFINISHED_JOB_STATES, before))
+
+    # --- artifacts (catálogo de archivos) ---
+
+    def get_live_artifacts(self):
+        """Archivos del catálogo que no se han borrado."""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT * FROM artifacts WHERE state != ?", (ARTIFACT_DELETED,)).fetchall()
+        return [ArtifactEntry.from_row(row) for row in rows]
+
+    def save_artifacts(self, entries):
+        """Inserta o actualiza varias entradas en una sola transacción."""
+        columns = ArtifactEntry.__slots__
+        updates = ", ".join(f"{name} = excluded.{name}" for name in columns if name != 'id')
+        with self._lock, self.conn:
+            self.conn.executemany(
+                f"INSERT INTO artifacts ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+                f"ON CONFLICT(id) DO UPDATE SET {updates}",
+                [entry.to_row() for entry in entries])
+
+    def prune_artifacts(self, before):
+        """Borra las entradas de archivos eliminados antes de la marca de tiempo indicada."""
+        with self._lock, self.conn:
+            self.conn.execute(
+                "DELETE FROM artifacts WHERE state = ? AND updated_at < ?", (ARTIFACT_DELETED, before))
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
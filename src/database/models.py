@@ -1,2 +1,90 @@
 class Message:
-    pass
\ No newline at end of file
+    pass
+
+
+class CacheEntry:
+    """Entrada de la caché de descargas (una fila de la tabla media_cache)."""
+
+    def __init__(self, cache_key, filepath, size, sha256, doc_id=None, access_hash=None,
+                 file_reference=None, created_at=None, last_used=None):
+        self.cache_key = cache_key
+        self.filepath = filepath
+        self.size = size
+        self.sha256 = sha256
+        self.doc_id = doc_id
+        self.access_hash = access_hash
+        self.file_reference = file_reference
+        self.created_at = created_at
+        self.last_used = last_used
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(**{key: row[key] for key in row.keys()})
+
+    def has_file_reference(self):
+        """True si tenemos la referencia de Telegram del primer envío."""
+        return self.doc_id is not None and self.access_hash is not None
+
+
+# Estados de un trabajo en el journal
+JOB_QUEUED = 'queued'
+JOB_PROBING = 'probing'
+JOB_DOWNLOADING = 'downloading'
+JOB_UPLOADING = 'uploading'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+UNFINISHED_JOB_STATES = (JOB_QUEUED, JOB_PROBING, JOB_DOWNLOADING, JOB_UPLOADING)
+
+
+class Job:
+    """Trabajo del journal (una fila de la tabla jobs): un enlace pedido en un chat."""
+
+    def __init__(self, id, chat_id, link, state, request_message_id=None, status_message_id=None,
+                 part_path=None, attempts=0, error=None, created_at=None, updated_at=None):
+        self.id = id
+        self.chat_id = chat_id
+        self.link = link
+        self.state = state
+        self.request_message_id = request_message_id
+        self.status_message_id = status_message_id
+        self.part_path = part_path
+        self.attempts = attempts
+        self.error = error
+        self.created_at = created_at
+        self.updated_at = updated_at
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(**{key: row[key] for key in row.keys()})
+
+
+# Estados de un archivo del catálogo
+ARTIFACT_STORED = 'stored'
+ARTIFACT_PERSISTED = 'persisted'
+ARTIFACT_DELETED = 'deleted'
+
+
+class ArtifactEntry:
+    """Archivo descargado del catálogo (una fila de la tabla artifacts), con id corto para los botones."""
+
+    __slots__ = ('id', 'path', 'size', 'source_url', 'chat_id', 'requester_id', 'state',
+                 'created_at', 'updated_at')
+
+    def __init__(self, id, path, size=0, source_url=None, chat_id=None, requester_id=None,
+                 state=ARTIFACT_STORED, created_at=None, updated_at=None):
+        self.id = id
+        self.path = path
+        self.size = size
+        self.source_url = source_url
+        self.chat_id = chat_id
+        self.requester_id = requester_id
+        self.state = state
+        self.created_at = created_at
+        self.updated_at = updated_at
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(**{key: row[key] for key in row.keys()})
+
+    def to_row(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
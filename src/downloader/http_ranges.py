@@ -0,0 +1,242 @@
+import http.client
+import json
+import os
+import queue
+import re
+import threading
+import time
+import urllib.parse
+from src.config.logger import setup_logger
+
+logger = setup_logger('HttpRanges')
+
+_CONTENT_RANGE_RE = re.compile(r'bytes\s+(\d+)-(\d+)/(\d+)')
+_READ_SIZE = 64 * 1024
+# Intentos por rango antes de dar la descarga por rangos por perdida
+RANGE_RETRIES = 3
+
+
+class RangesNotSupported(Exception):
+    """El servidor no acepta peticiones Range (o redirige): se descarga con yt-dlp."""
+
+
+class _Connection:
+    """Conexión HTTP(S) persistente que se reutiliza para todos los rangos de un hilo."""
+
+    def __init__(self, url):
+        parts = urllib.parse.urlsplit(url)
+        cls = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self._conn = cls(parts.hostname, parts.port, timeout=60)
+        self._path = urllib.parse.urlunsplit(('', '', parts.path or '/', parts.query, ''))
+
+    def get_range(self, start, end, headers):
+        request_headers = dict(headers, Range=f'bytes={start}-{end}')
+        for attempt in range(2):
+            try:
+                self._conn.request('GET', self._path, headers=request_headers)
+                return self._conn.getresponse()
+            except (http.client.HTTPException, ConnectionError):
+                # Keep-alive cerrado por el servidor: reconectar una vez
+                self._conn.close()
+                if attempt:
+                    raise
+
+    def close(self):
+        self._conn.close()
+
+
+class _RangeState:
+    """
+    Rangos ya escritos en el .ranges.part, guardados en un .ranges.ytdl al lado.
+    Permite reanudar tras un reinicio sin volver a pedir lo que ya está en disco.
+    """
+
+    def __init__(self, path, chunk_size):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.total = None
+        self.done = set()
+        try:
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('chunk_size') == chunk_size:
+                self.total = data['total']
+                self.done = set(data['done'])
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def reset(self, total):
+        self.total = total
+        self.done = set()
+
+    def chunk_end(self, offset):
+        return min(offset + self.chunk_size, self.total) - 1
+
+    def done_bytes(self):
+        return sum(self.chunk_end(offset) - offset + 1 for offset in self.done)
+
+    def save(self):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'total': self.total, 'chunk_size': self.chunk_size, 'done': sorted(self.done)}, f)
+        os.replace(tmp, self.path)
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def range_download(url, headers, path, connections, chunk_size, limiter, host, progress_hook=None):
+    """
+    Descarga url en path con varias conexiones, cada una pidiendo trozos de
+    chunk_size con Range sobre su propia conexión keep-alive.
+
+    Cada petición pasa por el límite de peticiones del dominio y cada bloque leído
+    por el presupuesto global de ancho de banda. Escribe en path.ranges.part y apunta
+    los trozos terminados en path.ranges.ytdl, así que si el proceso muere la siguiente
+    llamada reanuda donde se quedó. Cada trozo se reintenta RANGE_RETRIES veces.
+
+    Devuelve el tamaño descargado, o None si el servidor no admite rangos o la descarga
+    falla: en ese caso borra los temporales y el llamador sigue con yt-dlp.
+    """
+    headers = {key: value for key, value in (headers or {}).items() if key.lower() != 'range'}
+    tmp = f"{path}.ranges.part"
+    state = _RangeState(f"{path}.ranges.ytdl", chunk_size)
+    if not os.path.exists(tmp):
+        state.reset(None)
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT, 0o644)
+    progress = {'done': 0, 'reported': 0.0, 'error': None}
+    lock = threading.Lock()
+    start_time = time.monotonic()
+
+    def report(force=False):
+        now = time.monotonic()
+        if progress_hook is None or (not force and now - progress['reported'] < 0.5):
+            return
+        progress['reported'] = now
+        elapsed = now - start_time
+        speed = progress['done'] / elapsed if elapsed > 0 else None
+        progress_hook({
+            'status': 'downloading', 'filename': path, 'tmpfilename': tmp,
+            'downloaded_bytes': state.done_bytes() if force else progress['done'],
+            'total_bytes': state.total, 'speed': speed,
+            'eta': (state.total - progress['done']) / speed if speed and state.total else None,
+        })
+
+    def copy_body(response, offset):
+        while True:
+            data = response.read(_READ_SIZE)
+            if not data:
+                return offset
+            limiter.throttle(len(data))
+            os.pwrite(fd, data, offset)
+            offset += len(data)
+            with lock:
+                progress['done'] += len(data)
+                report()
+
+    def fetch(conn, offset):
+        """Descarga un trozo; devuelve el total que anuncia el servidor."""
+        end = offset + chunk_size - 1 if state.total is None else state.chunk_end(offset)
+        limiter.wait_request(host)
+        response = conn.get_range(offset, end, headers)
+        match = _CONTENT_RANGE_RE.match(response.getheader('Content-Range') or '')
+        if response.status == 429 or response.status >= 500:
+            # Error pasajero del servidor: se reintenta el trozo
+            response.read()
+            raise IOError(f"HTTP {response.status}")
+        if response.status != 206 or not match:
+            response.read()
+            raise RangesNotSupported(f"HTTP {response.status} sin Content-Range")
+        total = int(match.group(3))
+        if state.total is not None and total != state.total:
+            raise RangesNotSupported(f"El tamaño cambió ({state.total} -> {total})")
+        end = min(end, total - 1)
+        if copy_body(response, offset) != end + 1:
+            raise IOError(f"Rango {offset}-{end} incompleto")
+        return total
+
+    def fetch_with_retries(conn, offset):
+        for attempt in range(1, RANGE_RETRIES + 1):
+            try:
+                total = fetch(conn, offset)
+                break
+            except RangesNotSupported:
+                raise
+            except (OSError, http.client.HTTPException) as e:
+                if attempt == RANGE_RETRIES:
+                    raise
+                logger.warning(f"Rango {offset} de {path}, intento {attempt}/{RANGE_RETRIES}: {e}")
+                conn.close()
+                time.sleep(attempt)
+        with lock:
+            state.done.add(offset)
+            state.save()
+        return total
+
+    first = _Connection(url)
+    threads = []
+    try:
+        if state.total is None:
+            # El primer trozo confirma el soporte de Range y da el tamaño total
+            state.total = fetch_with_retries(first, 0)
+        elif state.done:
+            logger.info(f"Reanudando {path}: {len(state.done)} trozos ya descargados")
+        os.ftruncate(fd, state.total)
+
+        pending = queue.Queue()
+        for offset in range(0, state.total, chunk_size):
+            if offset not in state.done:
+                pending.put(offset)
+
+        def worker(conn):
+            try:
+                while progress['error'] is None:
+                    try:
+                        offset = pending.get_nowait()
+                    except queue.Empty:
+                        return
+                    fetch_with_retries(conn, offset)
+            except Exception as e:
+                progress['error'] = progress['error'] or e
+            finally:
+                conn.close()
+
+        extra = [_Connection(url) for _ in range(max(0, min(connections, pending.qsize()) - 1))]
+        threads = [threading.Thread(target=worker, args=(conn,), name='range-download')
+                   for conn in extra]
+        for thread in threads:
+            thread.start()
+        worker(first)
+        for thread in threads:
+            thread.join()
+        if progress['error'] is not None:
+            raise progress['error']
+        if len(state.done) * chunk_size < state.total:
+            raise IOError(f"Descarga incompleta: {state.done_bytes()}/{state.total} bytes")
+        os.close(fd)
+        fd = None
+        os.replace(tmp, path)
+        state.remove()
+    except RangesNotSupported as e:
+        logger.warning(f"Descarga por rangos de {path} abandonada, se usa yt-dlp: {e}")
+        if fd is not None:
+            os.close(fd)
+        os.remove(tmp)
+        state.remove()
+        return None
+    except Exception as e:
+        logger.warning(f"Descarga por rangos de {path} interrumpida, se reanudará "
+                       f"({state.done_bytes() if state.total else 0} bytes en disco): {e}")
+        if fd is not None:
+            os.close(fd)
+        raise
+    finally:
+        first.close()
+
+    report(force=True)
+    if progress_hook is not None:
+        progress_hook({'status': 'finished', 'filename': path,
+                       'downloaded_bytes': state.total, 'total_bytes': state.total})
+    logger.info(f"Descargado por rangos {path} ({state.total} bytes, {len(threads) + 1} conexiones)")
+    return state.total
@@ -0,0 +1,369 @@
+import asyncio
+import importlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from src.config.logger import setup_logger
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+# Solo se ejecutan funciones del propio bot (p. ej. src.downloader.ytdlp_runner:run_download)
+_ALLOWED_MODULE_PREFIX = 'src.'
+
+
+def func_path(func):
+    return f"{func.__module__}:{func.__qualname__}"
+
+
+def resolve_func(path):
+    module_name, _, name = path.partition(':')
+    if not module_name.startswith(_ALLOWED_MODULE_PREFIX):
+        raise ValueError(f"Función no permitida en la cola: {path}")
+    return getattr(importlib.import_module(module_name), name)
+
+
+class SQLiteQueue:
+    """
+    Cola de trabajos en SQLite (data/queue.db por defecto).
+
+    Sirve para varios procesos en el mismo host (frontend y workers comparten el
+    archivo): cada reclamación se hace en una transacción BEGIN IMMEDIATE y deja el
+    trabajo en running con un lease que el worker renueva con heartbeats.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._local = threading.local()
+        self._conn().execute("PRAGMA journal_mode=WAL")
+        with self._write() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS queue_jobs (
+                    id TEXT PRIMARY KEY,
+                    payload TEXT NOT NULL,
+                    state TEXT NOT NULL,
+                    worker TEXT,
+                    lease_until REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_queue_jobs_state ON queue_jobs(state, created_at)")
+
+    def _conn(self):
+        # Una conexión por hilo; isolation_level=None para controlar las transacciones
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        return conn
+
+    def _write(self):
+        return _Transaction(self._conn())
+
+    def put(self, job_id, payload):
+        now = time.time()
+        with self._write() as conn:
+            conn.execute(
+                "INSERT INTO queue_jobs (id, payload, state, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, json.dumps(payload), QUEUED, now, now))
+
+    def claim(self, worker, lease):
+        """Reclama el trabajo más antiguo en cola; devuelve (id, payload) o None."""
+        now = time.time()
+        with self._write() as conn:
+            row = conn.execute(
+                "SELECT id, payload FROM queue_jobs WHERE state = ? ORDER BY created_at LIMIT 1",
+                (QUEUED,)).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE queue_jobs SET state = ?, worker = ?, lease_until = ?, attempts = attempts + 1, "
+                "updated_at = ? WHERE id = ?", (RUNNING, worker, now + lease, now, row[0]))
+        return row[0], json.loads(row[1])
+
+    def heartbeat(self, job_id, worker, lease):
+        """Renueva el lease; devuelve False si el trabajo ya no es de este worker."""
+        now = time.time()
+        with self._write() as conn:
+            cursor = conn.execute(
+                "UPDATE queue_jobs SET lease_until = ?, updated_at = ? WHERE id = ? AND worker = ? AND state = ?",
+                (now + lease, now, job_id, worker, RUNNING))
+        return cursor.rowcount == 1
+
+    def complete(self, job_id, worker, result):
+        self._finish(job_id, worker, DONE, result=json.dumps(result))
+
+    def fail(self, job_id, worker, error):
+        self._finish(job_id, worker, FAILED, error=error)
+
+    def _finish(self, job_id, worker, state, result=None, error=None):
+        with self._write() as conn:
+            conn.execute(
+                "UPDATE queue_jobs SET state = ?, result = ?, error = ?, lease_until = NULL, updated_at = ? "
+                "WHERE id = ? AND worker = ? AND state = ?",
+                (state, result, error, time.time(), job_id, worker, RUNNING))
+
+    def status(self, job_id):
+        """(state, result, error) del trabajo, o None si no existe."""
+        row = self._conn().execute(
+            "SELECT state, result, error FROM queue_jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1]) if row[1] else None, row[2]
+
+    def delete(self, job_id):
+        with self._write() as conn:
+            conn.execute("DELETE FROM queue_jobs WHERE id = ?", (job_id,))
+
+    def requeue_expired(self, max_attempts):
+        """Devuelve a la cola los trabajos de workers muertos (lease caducado); falla los agotados."""
+        now = time.time()
+        with self._write() as conn:
+            failed = conn.execute(
+                "UPDATE queue_jobs SET state = ?, error = 'Lease caducado demasiadas veces', worker = NULL, "
+                "updated_at = ? WHERE state = ? AND lease_until < ? AND attempts >= ?",
+                (FAILED, now, RUNNING, now, max_attempts)).rowcount
+            requeued = conn.execute(
+                "UPDATE queue_jobs SET state = ?, worker = NULL, lease_until = NULL, updated_at = ? "
+                "WHERE state = ? AND lease_until < ?", (QUEUED, now, RUNNING, now)).rowcount
+        return requeued, failed
+
+    def prune(self, before):
+        with self._write() as conn:
+            conn.execute("DELETE FROM queue_jobs WHERE state IN (?, ?) AND updated_at < ?", (DONE, FAILED, before))
+
+    def depth(self):
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM queue_jobs WHERE state = ?", (QUEUED,)).fetchone()[0]
+
+
+class _Transaction:
+    """Context manager BEGIN IMMEDIATE / COMMIT sobre una conexión en autocommit."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+
+
+# Reclamación atómica: saca ids de pending hasta dar con un trabajo cuyo hash siga vivo
+# (el frontend borra el hash si deja de esperar) y lo pasa a processing con su lease.
+_CLAIM_SCRIPT = """
+while true do
+    local job_id = redis.call('RPOP', KEYS[1])
+    if not job_id then
+        return nil
+    end
+    local key = ARGV[1] .. job_id
+    if redis.call('EXISTS', key) == 1 then
+        redis.call('LPUSH', KEYS[2], job_id)
+        redis.call('ZADD', KEYS[3], ARGV[2], job_id)
+        redis.call('HSET', key, 'state', ARGV[3], 'worker', ARGV[4], 'updated_at', ARGV[5])
+        redis.call('HINCRBY', key, 'attempts', 1)
+        redis.call('EXPIRE', key, ARGV[6])
+        return {job_id, redis.call('HGET', key, 'payload')}
+    end
+end
+"""
+
+# Cierre atómico: solo si el trabajo sigue siendo de este worker y el hash existe
+_FINISH_SCRIPT = """
+local key = KEYS[1]
+if redis.call('HGET', key, 'worker') ~= ARGV[1] or redis.call('HGET', key, 'state') ~= ARGV[2] then
+    return 0
+end
+redis.call('HSET', key, 'state', ARGV[3], 'updated_at', ARGV[4], ARGV[5], ARGV[6])
+redis.call('EXPIRE', key, ARGV[7])
+redis.call('ZREM', KEYS[2], ARGV[8])
+redis.call('LREM', KEYS[3], 0, ARGV[8])
+return 1
+"""
+
+# Lease caducado: devuelve el trabajo a pending o lo falla; si el hash ya no existe solo lo suelta
+_REQUEUE_SCRIPT = """
+local job_id = ARGV[1]
+if redis.call('ZREM', KEYS[1], job_id) == 0 then
+    return 0
+end
+redis.call('LREM', KEYS[2], 0, job_id)
+local key = KEYS[4]
+if redis.call('EXISTS', key) == 0 then
+    return 0
+end
+if tonumber(redis.call('HGET', key, 'attempts') or '0') >= tonumber(ARGV[2]) then
+    redis.call('HSET', key, 'state', ARGV[3], 'error', 'Lease caducado demasiadas veces', 'updated_at', ARGV[5])
+    return 2
+end
+redis.call('HSET', key, 'state', ARGV[4], 'worker', '', 'updated_at', ARGV[5])
+redis.call('LPUSH', KEYS[3], job_id)
+return 1
+"""
+
+
+class RedisQueue:
+    """
+    Cola de trabajos en Redis, para workers en otros hosts.
+
+    Listas para pending/processing, un hash por trabajo y un sorted set de leases.
+    Las transiciones (reclamar, cerrar, reencolar) son scripts Lua, así que son
+    atómicas y nunca recrean el hash de un trabajo que el frontend ya borró. Hace
+    falta un servidor con EVAL (Redis, Valkey o KeyDB).
+    """
+
+    def __init__(self, url, prefix='grande:queue'):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("DOWNLOAD_BACKEND=redis necesita el paquete 'redis' (pip install redis)") from e
+        self.redis = redis.Redis.from_url(url, decode_responses=True)
+        self.pending = f"{prefix}:pending"
+        self.processing = f"{prefix}:processing"
+        self.leases = f"{prefix}:leases"
+        self.prefix = prefix
+        # Un trabajo cuyo frontend ya no lo espera acaba caducando
+        self.job_ttl = 7 * 24 * 3600
+        self.result_ttl = 24 * 3600
+        self._claim = self.redis.register_script(_CLAIM_SCRIPT)
+        self._finish_job = self.redis.register_script(_FINISH_SCRIPT)
+        self._requeue = self.redis.register_script(_REQUEUE_SCRIPT)
+
+    def _key(self, job_id):
+        return f"{self.prefix}:job:{job_id}"
+
+    def put(self, job_id, payload):
+        now = time.time()
+        pipe = self.redis.pipeline()
+        pipe.hset(self._key(job_id), mapping={
+            'payload': json.dumps(payload), 'state': QUEUED, 'attempts': 0,
+            'created_at': now, 'updated_at': now,
+        })
+        pipe.expire(self._key(job_id), self.job_ttl)
+        pipe.lpush(self.pending, job_id)
+        pipe.execute()
+
+    def claim(self, worker, lease):
+        now = time.time()
+        claimed = self._claim(keys=[self.pending, self.processing, self.leases],
+                              args=[self._key(''), now + lease, RUNNING, worker, now, self.job_ttl])
+        if not claimed:
+            return None
+        job_id, payload = claimed
+        return job_id, json.loads(payload)
+
+    def heartbeat(self, job_id, worker, lease):
+        if self.redis.hget(self._key(job_id), 'worker') != worker:
+            return False
+        self.redis.zadd(self.leases, {job_id: time.time() + lease}, xx=True)
+        return True
+
+    def complete(self, job_id, worker, result):
+        self._finish(job_id, worker, DONE, result=json.dumps(result))
+
+    def fail(self, job_id, worker, error):
+        self._finish(job_id, worker, FAILED, error=error)
+
+    def _finish(self, job_id, worker, state, result=None, error=None):
+        field, value = ('result', result) if result is not None else ('error', error or '')
+        self._finish_job(keys=[self._key(job_id), self.leases, self.processing],
+                         args=[worker, RUNNING, state, time.time(), field, value, self.result_ttl, job_id])
+
+    def status(self, job_id):
+        data = self.redis.hgetall(self._key(job_id))
+        if not data:
+            return None
+        result = data.get('result')
+        return data['state'], json.loads(result) if result else None, data.get('error')
+
+    def delete(self, job_id):
+        self.redis.delete(self._key(job_id))
+
+    def requeue_expired(self, max_attempts):
+        requeued = failed = 0
+        for job_id in self.redis.zrangebyscore(self.leases, '-inf', time.time()):
+            # El script hace el ZREM: solo uno de los procesos que ven el lease caducado se queda con él
+            outcome = self._requeue(keys=[self.leases, self.processing, self.pending, self._key(job_id)],
+                                    args=[job_id, max_attempts, FAILED, QUEUED, time.time()])
+            if outcome == 1:
+                requeued += 1
+            elif outcome == 2:
+                failed += 1
+        return requeued, failed
+
+    def prune(self, before):
+        # Los resultados los borra el frontend al leerlos; los huérfanos caducan por TTL
+        pass
+
+    def depth(self):
+        return self.redis.llen(self.pending)
+
+
+def get_queue_backend(config):
+    """Crea el backend de cola configurado en DOWNLOAD_BACKEND (sqlite | redis)."""
+    if config.download_backend == 'redis':
+        return RedisQueue(config.redis_url)
+    if config.download_backend == 'sqlite':
+        return SQLiteQueue(config.queue_db_path)
+    raise ValueError(f"Backend de cola desconocido: {config.download_backend}")
+
+
+class RemoteRunner:
+    """
+    Lado frontend de la cola: publica func(*args) como trabajo y espera el resultado
+    que deja un worker (ver src/downloader/worker.py).
+    """
+
+    def __init__(self, backend, config):
+        self.logger = setup_logger('RemoteRunner')
+        self.backend = backend
+        self.poll_interval = config.queue_poll_interval
+        self.lease = config.queue_lease
+        self.max_attempts = config.queue_max_attempts
+        self._maintenance = None
+
+    async def run(self, func, args):
+        self._ensure_maintenance()
+        job_id = uuid.uuid4().hex
+        await asyncio.to_thread(self.backend.put, job_id, {'func': func_path(func), 'args': list(args)})
+        try:
+            while True:
+                await asyncio.sleep(self.poll_interval)
+                status = await asyncio.to_thread(self.backend.status, job_id)
+                if status is None:
+                    raise RuntimeError(f"El trabajo {job_id} ha desaparecido de la cola")
+                state, result, error = status
+                if state == DONE:
+                    return result
+                if state == FAILED:
+                    raise RuntimeError(error or "El worker no pudo completar la descarga")
+        finally:
+            await asyncio.to_thread(self.backend.delete, job_id)
+
+    def _ensure_maintenance(self):
+        if self._maintenance is None or self._maintenance.done():
+            self._maintenance = asyncio.create_task(self._run_maintenance())
+
+    async def _run_maintenance(self):
+        # Los workers también lo hacen; así no depende de que quede alguno vivo
+        while True:
+            try:
+                requeued, failed = await asyncio.to_thread(self.backend.requeue_expired, self.max_attempts)
+                if requeued or failed:
+                    self.logger.warning(f"Leases caducados: {requeued} reencolados, {failed} fallidos")
+                await asyncio.to_thread(self.backend.prune, time.time() - 24 * 3600)
+            except Exception as e:
+                self.logger.error(f"Error en el mantenimiento de la cola: {e}")
+            await asyncio.sleep(self.lease)
@@ -0,0 +1,288 @@
+import asyncio
+import re
+import urllib.parse
+from telethon.tl.types import MessageEntityTextUrl, MessageEntityUrl
+from src.config.logger import setup_logger
+from src.downloader.ytdlp_engine import get_yt_dlp
+
+# Solo se usa si el mensaje no trae entidades (p. ej. texto reenviado sin formato)
+_URL_RE = re.compile(r'https?://[^\s<>"\']+')
+_TRAILING = '.,;:!?\'"»”’>'
+_PAIRS = {')': '(', ']': '[', '}': '{'}
+_TRACKING_PARAMS = {
+    'fbclid', 'gclid', 'dclid', 'msclkid', 'igshid', 'igsh', 'mc_cid', 'mc_eid',
+    'ref_src', 'ref_url', 'si', 'feature', '_ga', 'yclid', 'twclid',
+}
+_DIRECT_MEDIA_EXTS = ('.mp4', '.m4v', '.webm', '.mkv', '.mov', '.avi', '.m3u8', '.mpd', '.ts', '.flv')
+
+# Secuencias del patrón que no aportan palabras de dominio: \d, \w..., (?P<name>, (?x)
+_PATTERN_NOISE_RE = re.compile(r'\\[a-zA-Z]|\?P<\w+>|\(\?[a-zA-Z]+\)')
+_WORD_RE = re.compile(r'[a-z0-9][a-z0-9-]*')
+_IGNORED_WORDS = {'www', 'm', 'com', 'net', 'org', 'tv', 'co', 'io', 'me', 'de', 'fr', 'es', 'ru', 'jp'}
+
+
+def normalize_url(url):
+    """
+    Limpia una URL tal como llega en un mensaje: quita puntuación final, añade esquema
+    si falta, pasa el host a minúsculas y elimina parámetros de seguimiento y fragmento.
+    Devuelve None si no es una URL http(s).
+    """
+    url = url.strip()
+    while url:
+        last = url[-1]
+        if last in _TRAILING:
+            url = url[:-1]
+        elif last in _PAIRS and url.count(last) > url.count(_PAIRS[last]):
+            # Paréntesis de cierre que pertenece al texto, no a la URL
+            url = url[:-1]
+        else:
+            break
+    if not url:
+        return None
+    if '://' not in url:
+        url = f'https://{url}'
+    try:
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme.lower() not in ('http', 'https') or not parts.hostname:
+            return None
+    except ValueError:
+        return None
+    query = parts.query
+    params = urllib.parse.parse_qsl(query, keep_blank_values=True)
+    kept = [(key, value) for key, value in params
+            if key.lower() not in _TRACKING_PARAMS and not key.lower().startswith('utm_')]
+    if len(kept) != len(params):
+        query = urllib.parse.urlencode(kept, doseq=True)
+    return urllib.parse.urlunsplit((
+        parts.scheme.lower(), parts.netloc.lower(), parts.path or '/', query, ''))
+
+
+def extract_urls(message):
+    """
+    URLs del mensaje a partir de sus entidades (MessageEntityUrl / MessageEntityTextUrl),
+    normalizadas y sin duplicados, en orden de aparición.
+    """
+    raw = []
+    entities = getattr(message, 'entities', None)
+    if entities:
+        # get_entities_text resuelve los offsets UTF-16 de Telegram
+        for entity, text in message.get_entities_text():
+            if isinstance(entity, MessageEntityUrl):
+                raw.append(text)
+            elif isinstance(entity, MessageEntityTextUrl):
+                raw.append(entity.url)
+    elif message.text and '://' in message.text:
+        raw = _URL_RE.findall(message.text)
+
+    urls = []
+    seen = set()
+    for url in raw:
+        url = normalize_url(url)
+        if url and url not in seen:
+            seen.add(url)
+            urls.append(url)
+    return urls
+
+
+def _host_segments(pattern):
+    """Trozos del patrón que describen el host: lo que sigue a cada '://' hasta la primera '/'."""
+    segments = []
+    start = pattern.find('://')
+    while start >= 0:
+        index = begin = start + 3
+        depth = 0
+        in_class = False
+        while index < len(pattern):
+            char = pattern[index]
+            if char == '\\':
+                index += 2
+                continue
+            if in_class:
+                in_class = char != ']'
+            elif char == '[':
+                in_class = True
+            elif char == '(':
+                depth += 1
+            elif char == ')':
+                if depth == 0:
+                    if index > begin:
+                        break
+                    # Cierre de un esquema opcional: (?:https?://)?host
+                    index += 2 if pattern[index + 1:index + 2] == '?' else 1
+                    begin = index
+                    continue
+                depth -= 1
+            elif char in '/|' and depth == 0:
+                break
+            index += 1
+        segments.append(pattern[begin:index])
+        start = pattern.find('://', index)
+    return segments or [pattern]
+
+
+def _optional_variants(segment):
+    """
+    Dos lecturas del trozo de patrón: con los caracteres opcionales (x?) y sin ellos,
+    así www.tiktokv?.com da tanto 'tiktokv' como 'tiktok'.
+    """
+    kept = re.sub(r'([a-z0-9])\?', r'\1', segment)
+    dropped = re.sub(r'[a-z0-9]\?', '', segment)
+    return kept, dropped
+
+
+def _host_words(pattern):
+    """
+    Palabras de dominio de un _VALID_URL. Devuelve None si algún host del patrón es un
+    comodín (p. ej. (?P<host>[^/]+)) y el extractor tiene que probarse con cualquier URL.
+    Las palabras con dígitos finales se indexan también sin ellos (xnxx3 -> xnxx).
+    """
+    words = set()
+    for segment in _host_segments(pattern):
+        segment = _PATTERN_NOISE_RE.sub(' ', segment.replace('\\-', '-')).lower()
+        segment_words = set()
+        for variant in _optional_variants(segment):
+            for word in _WORD_RE.findall(variant):
+                segment_words.add(word)
+                segment_words.add(word.rstrip('0123456789'))
+        segment_words -= _IGNORED_WORDS | {''}
+        if not segment_words:
+            return None
+        words |= segment_words
+    return words
+
+
+def _label_keys(host):
+    """Claves de búsqueda de un host: cada etiqueta, también sin dígitos finales (xvideos2 -> xvideos)."""
+    keys = set()
+    for label in host.split('.'):
+        if label and label not in _IGNORED_WORDS:
+            keys.add(label)
+            keys.add(label.rstrip('0123456789'))
+    keys.discard('')
+    return keys
+
+
+class SiteIndex:
+    """
+    Índice de sitios soportados construido una vez a partir de los _VALID_URL de los
+    extractores de yt-dlp.
+
+    Cada extractor se indexa por las palabras de dominio de su patrón; para clasificar
+    una URL primero se prueban solo los extractores cuyas palabras coinciden con las
+    etiquetas del host (más los pocos cuyo patrón no tiene dominio literal). El índice
+    es solo un atajo: si no acierta se prueban todos los extractores, y los que aciertan
+    se recuerdan por host para las siguientes URLs del mismo sitio. Los hosts en los
+    que el recorrido completo no encuentra nada también se recuerdan, para no repetirlo
+    con cada enlace a un sitio sin extractor.
+    """
+
+    def __init__(self, extractors):
+        self.by_word = {}
+        self.wildcard = []
+        self.extractors = []
+        self.by_host = {}
+        self.unmatched_hosts = set()
+        for ie in extractors:
+            pattern = getattr(ie, '_VALID_URL', None)
+            if isinstance(pattern, (list, tuple)):
+                pattern = '|'.join(pattern)
+            if not isinstance(pattern, str) or ie.ie_key() == 'Generic':
+                continue
+            self.extractors.append(ie)
+            words = _host_words(pattern)
+            if words is None:
+                self.wildcard.append(ie)
+                continue
+            for word in words:
+                self.by_word.setdefault(word, []).append(ie)
+
+    @classmethod
+    def from_yt_dlp(cls):
+        return cls(get_yt_dlp().extractor.gen_extractor_classes())
+
+    def match(self, url):
+        """Devuelve el ie_key del extractor que acepta la URL, o None."""
+        host = urllib.parse.urlsplit(url).hostname or ''
+        candidates = list(self.by_host.get(host, ()))
+        for key in _label_keys(host):
+            candidates.extend(self.by_word.get(key, ()))
+        candidates.extend(self.wildcard)
+        seen = set()
+        for ie in candidates:
+            if ie in seen:
+                continue
+            seen.add(ie)
+            if ie.suitable(url):
+                return ie.ie_key()
+
+        # El índice no lo cubre: recorrido completo (en el orden de prioridad de yt-dlp)
+        if host in self.unmatched_hosts:
+            return None
+        for ie in self.extractors:
+            if ie not in seen and ie.suitable(url):
+                self.by_host.setdefault(host, []).append(ie)
+                return ie.ie_key()
+        if len(self.unmatched_hosts) >= 4096:
+            self.unmatched_hosts.clear()
+        self.unmatched_hosts.add(host)
+        return None
+
+
+class LinkFilter:
+    """Clasifica las URLs de un mensaje en soportadas y no soportadas antes de llamar a yt-dlp."""
+
+    def __init__(self, config):
+        self.logger = setup_logger('LinkFilter')
+        self.allow_generic = config.link_allow_generic
+        self.index = None
+        self._build_task = None
+        self._cache = {}
+
+    def start(self):
+        """Construye el índice en un hilo al arrancar."""
+        if self._build_task is None:
+            self._build_task = asyncio.create_task(self._build())
+
+    async def _build(self):
+        try:
+            self.index = await asyncio.to_thread(SiteIndex.from_yt_dlp)
+            self.logger.info(f"Índice de sitios soportados: {len(self.index.by_word)} dominios, "
+                             f"{len(self.index.wildcard)} extractores sin dominio fijo")
+        except Exception as e:
+            self.logger.error(f"No se pudo construir el índice de sitios, se aceptan todos los enlaces: {e}")
+
+    async def ready(self):
+        self.start()
+        await asyncio.shield(self._build_task)
+
+    def classify(self, url):
+        """
+        ie_key del extractor para la URL, 'Generic' para enlaces directos a vídeo
+        (o cualquier enlace si LINK_ALLOW_GENERIC), o None si no está soportada.
+        """
+        if self.index is None:
+            return 'Generic'
+        if url in self._cache:
+            return self._cache[url]
+        extractor = self.index.match(url)
+        if extractor is None:
+            path = urllib.parse.urlsplit(url).path.lower()
+            if self.allow_generic or path.endswith(_DIRECT_MEDIA_EXTS):
+                extractor = 'Generic'
+        if len(self._cache) >= 4096:
+            self._cache.clear()
+        self._cache[url] = extractor
+        return extractor
+
+    async def split(self, urls):
+        """Separa las URLs en (soportadas, no soportadas)."""
+        await self.ready()
+        supported, unsupported = [], []
+        for url in urls:
+            if url in self._cache:
+                extractor = self._cache[url]
+            else:
+                # Un fallo del índice recorre todos los extractores: fuera del event loop
+                extractor = await asyncio.to_thread(self.classify, url)
+            (supported if extractor else unsupported).append(url)
+        return supported, unsupported
@@ -0,0 +1,100 @@
+import asyncio
+import hashlib
+import os
+import urllib.parse
+from telethon.tl.types import InputDocument
+from src.config.logger import setup_logger
+
+
+def canonical_url(url):
+    """Normaliza una URL para usarla como clave (esquema/host en minúsculas, sin fragmento)."""
+    parts = urllib.parse.urlsplit(url.strip())
+    path = parts.path.rstrip('/') or '/'
+    return urllib.parse.urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, parts.query, ''))
+
+
+def cache_key_from_info(info):
+    """Clave de contenido: extractor + id del vídeo según yt-dlp."""
+    extractor = info.get('extractor_key') or info.get('extractor') or 'generic'
+    return f"{extractor}:{info.get('id')}"
+
+
+def _sha256_file(filepath, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class MediaCache:
+    """
+    Caché de descargas direccionada por contenido.
+
+    Cada entrada guarda el archivo local y la referencia del documento de Telegram del
+    primer envío, de modo que una petición repetida se reenvía sin descargar ni subir.
+    La caché no borra archivos: el espacio de downloads/ lo gestiona RetentionManager,
+    que respeta los archivos en uso y avisa con forget_file al desalojar; las entradas que
+    se quedan sin archivo ni referencia de Telegram se borran.
+    """
+
+    def __init__(self, db_manager):
+        self.logger = setup_logger('MediaCache')
+        self.db = db_manager
+
+    def lookup_url(self, url):
+        """Busca por URL canónica; devuelve CacheEntry o None."""
+        entry = self.db.get_cache_entry_by_url(canonical_url(url))
+        if entry:
+            self.db.touch_cache_entry(entry.cache_key)
+        return entry
+
+    def lookup_key(self, cache_key):
+        entry = self.db.get_cache_entry(cache_key)
+        if entry:
+            self.db.touch_cache_entry(entry.cache_key)
+        return entry
+
+    def get_input_document(self, entry):
+        """InputDocument para reenviar el archivo por referencia, o None si no hay."""
+        if not entry or not entry.has_file_reference():
+            return None
+        return InputDocument(id=entry.doc_id, access_hash=entry.access_hash,
+                             file_reference=entry.file_reference or b'')
+
+    def get_local_file(self, entry):
+        """Ruta local de la entrada si el archivo sigue en disco."""
+        if entry and entry.filepath and os.path.exists(entry.filepath):
+            return entry.filepath
+        return None
+
+    async def store(self, cache_key, url, filepath):
+        """Registra un archivo recién descargado (el hash se calcula fuera del event loop)."""
+        size = os.path.getsize(filepath)
+        sha256 = await asyncio.to_thread(_sha256_file, filepath)
+        self.db.upsert_cache_entry(cache_key, filepath, size, sha256)
+        self.add_url(url, cache_key)
+        self.logger.info(f"Cacheado {cache_key}: {filepath} ({size} bytes)")
+
+    def store_remote(self, cache_key, url):
+        """Registra contenido subido sin archivo local (p. ej. subida en streaming)."""
+        self.db.upsert_cache_entry(cache_key, None, 0, None)
+        self.add_url(url, cache_key)
+
+    def add_url(self, url, cache_key):
+        self.db.add_cache_url(canonical_url(url), cache_key)
+
+    def remember_upload(self, cache_key, sent_message):
+        """Guarda la referencia del documento enviado para reutilizarla."""
+        document = getattr(sent_message, 'document', None)
+        if document is None:
+            return
+        self.db.set_cache_file_reference(cache_key, document.id, document.access_hash,
+                                         document.file_reference)
+
+    def forget_upload(self, cache_key):
+        self.db.clear_cache_file_reference(cache_key)
+
+    def forget_file(self, filepath):
+        """El archivo local se ha borrado fuera de la caché (p. ej. por retención)."""
+        self.db.clear_cache_filepath(filepath)
@@ -0,0 +1,204 @@
+import json
+import os
+import threading
+import time
+import urllib.parse
+from contextlib import contextmanager
+from src.config.logger import setup_logger
+
+logger = setup_logger('NetLimits')
+_lock = threading.Lock()
+_limiter = None
+
+
+def host_of(url):
+    """Host de la URL en minúsculas y sin 'www.'."""
+    host = (urllib.parse.urlsplit(url).hostname or '').lower()
+    return host[4:] if host.startswith('www.') else host
+
+
+class TokenBucket:
+    """Token bucket compartido entre hilos. rate <= 0 significa sin límite."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(rate, 1)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, amount=1):
+        """Bloquea el hilo hasta poder gastar amount tokens (se permite deuda, como el ratelimit de yt-dlp)."""
+        if self.rate <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= amount
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+
+class DomainLimiter:
+    """
+    Límites de red compartidos por todas las descargas del proceso.
+
+    - Presupuesto global de ancho de banda (DOWNLOAD_BANDWIDTH bytes/s).
+    - Por dominio: conexiones simultáneas (fragmentos o rangos en vuelo de todas las
+      descargas del sitio) y peticiones por segundo.
+    - Por dominio: cabeceras y archivo de cookies compartidos, en vez de un
+      User-Agent fijo en las opciones de yt-dlp.
+
+    Los perfiles por dominio se leen de DOMAIN_PROFILES (JSON), p. ej.:
+        {"example.com": {"headers": {"Referer": "https://example.com/"},
+                         "cookies": "data/cookies/example.txt",
+                         "max_connections": 2, "requests_per_second": 1}}
+    Un perfil se aplica al dominio y a sus subdominios.
+
+    El límite es del proceso. El scheduler del bot reserva la conexión base de cada
+    descarga (también con workers externos, porque todas pasan por él), pero las
+    conexiones extra (fragmentos o rangos) las reserva cada worker con su propio
+    limitador, así que con N workers un dominio puede ver hasta N veces esas extra.
+    """
+
+    def __init__(self, config):
+        self.fragment_concurrency = max(1, config.fragment_concurrency)
+        self.range_connections = max(1, config.range_connections)
+        self.range_min_bytes = config.range_min_bytes
+        self.range_chunk_size = config.range_chunk_size
+        self.bandwidth = TokenBucket(config.download_bandwidth, burst=max(config.download_bandwidth, 1024 * 1024))
+        self.default = {
+            'headers': {'User-Agent': config.download_user_agent},
+            'cookies': config.cookies_file or None,
+            'max_connections': config.domain_max_connections,
+            'requests_per_second': config.domain_requests_per_second,
+        }
+        self.profiles = self._load_profiles(config.domain_profiles)
+        self._slots = {}
+        self._rates = {}
+        self._lock = threading.Lock()
+
+    def _load_profiles(self, path):
+        if not path or not os.path.exists(path):
+            return {}
+        try:
+            with open(path, encoding='utf-8') as f:
+                profiles = json.load(f)
+            logger.info(f"Perfiles de dominio cargados: {', '.join(sorted(profiles)) or 'ninguno'}")
+            return {domain.lower(): profile for domain, profile in profiles.items()}
+        except (OSError, ValueError) as e:
+            logger.error(f"Error leyendo {path}, se usan los valores por defecto: {e}")
+            return {}
+
+    def profile_key(self, host):
+        """Dominio del perfil que aplica al host (el más específico), o el propio host."""
+        labels = host.split('.')
+        for index in range(len(labels) - 1):
+            domain = '.'.join(labels[index:])
+            if domain in self.profiles:
+                return domain
+        return host
+
+    def profile(self, host):
+        profile = dict(self.default)
+        override = self.profiles.get(self.profile_key(host), {})
+        profile.update(override)
+        profile['headers'] = {**self.default['headers'], **override.get('headers', {})}
+        return profile
+
+    def ydl_opts(self, url):
+        """Cabeceras y cookies del dominio para las opciones de yt-dlp."""
+        profile = self.profile(host_of(url))
+        opts = {'http_headers': profile['headers']}
+        if profile['cookies']:
+            opts['cookiefile'] = profile['cookies']
+        return opts
+
+    def _domain_state(self, host):
+        key = self.profile_key(host)
+        with self._lock:
+            if key not in self._slots:
+                profile = self.profile(host)
+                self._slots[key] = threading.BoundedSemaphore(max(1, profile['max_connections']))
+                self._rates[key] = TokenBucket(profile['requests_per_second'])
+            return self._slots[key], self._rates[key]
+
+    def try_connection(self, host):
+        """
+        Reserva una conexión al dominio sin esperar; False si el sitio ya está al límite.
+        La usa el scheduler antes de pasar la descarga al pool (ver DownloadScheduler).
+        """
+        return self._domain_state(host)[0].acquire(blocking=False)
+
+    def release_connection(self, host):
+        self._domain_state(host)[0].release()
+
+    @contextmanager
+    def extra_connections(self, host, wanted):
+        """
+        Reserva hasta wanted conexiones más al dominio sin esperar y devuelve cuántas
+        se concedieron (0 si el sitio está al límite); se liberan al salir.
+        """
+        slots, _ = self._domain_state(host)
+        granted = 0
+        while granted < wanted and slots.acquire(blocking=False):
+            granted += 1
+        try:
+            yield granted
+        finally:
+            for _ in range(granted):
+                slots.release()
+
+    def wait_request(self, host):
+        """Respeta el límite de peticiones por segundo del dominio."""
+        self._domain_state(host)[1].consume()
+
+    def throttle(self, nbytes):
+        """Descuenta nbytes del presupuesto global de ancho de banda."""
+        self.bandwidth.consume(nbytes)
+
+    def progress_hook(self, inner=None):
+        """
+        progress_hook de yt-dlp que aplica el presupuesto de ancho de banda: yt-dlp lo
+        llama tras cada bloque desde el hilo que descarga, así que dormir aquí frena
+        la descarga. Encadena inner si se pasa.
+        """
+        if self.bandwidth.rate <= 0:
+            return inner
+        seen = {}
+
+        def hook(d):
+            if d.get('status') == 'downloading':
+                key = d.get('tmpfilename') or d.get('filename')
+                done = d.get('downloaded_bytes') or 0
+                delta = done - seen.get(key, 0)
+                seen[key] = done
+                if delta > 0:
+                    self.throttle(delta)
+            if inner is not None:
+                inner(d)
+        return hook
+
+
+def configure(config):
+    """Fija la configuración del limitador del proceso (el bot la pasa al arrancar)."""
+    global _limiter
+    with _lock:
+        _limiter = DomainLimiter(config)
+    return _limiter
+
+
+def get_limiter():
+    """
+    Limitador del proceso. En los procesos del pool y en los workers se crea la
+    primera vez a partir del entorno, igual que en el bot.
+    """
+    global _limiter
+    if _limiter is None:
+        from src.config.config import Config
+        with _lock:
+            if _limiter is None:
+                _limiter = DomainLimiter(Config(require_telegram=False))
+    return _limiter
@@ -0,0 +1,244 @@
+import asyncio
+import io
+import json
+import os
+import shutil
+import struct
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from src.config.logger import setup_logger
+from src.utils.metrics import metrics
+
+# Códecs que Telegram reproduce en streaming dentro de un MP4 sin reencodear
+_COPY_VIDEO = ('h264', 'hevc')
+_COPY_AUDIO = ('aac', 'mp3')
+# Margen para la cabecera del contenedor al calcular el bitrate objetivo
+_SIZE_MARGIN = 0.96
+# Por debajo de este bitrate de vídeo no merece la pena reencodear
+MIN_VIDEO_BITRATE = 150_000
+# Telegram acepta miniaturas de hasta 320px por lado
+THUMB_SIZE = 320
+
+
+def probe_media(path):
+    """Duración, dimensiones y códecs del archivo según ffprobe."""
+    output = subprocess.run(
+        ['ffprobe', '-v', 'error', '-print_format', 'json', '-show_format', '-show_streams', path],
+        capture_output=True, text=True, check=True, timeout=60).stdout
+    data = json.loads(output)
+    video = next((s for s in data.get('streams', []) if s.get('codec_type') == 'video'
+                  and not s.get('disposition', {}).get('attached_pic')), None)
+    audio = next((s for s in data.get('streams', []) if s.get('codec_type') == 'audio'), None)
+    duration = float(data.get('format', {}).get('duration') or (video or {}).get('duration') or 0)
+    return {
+        'duration': duration,
+        'width': int((video or {}).get('width') or 0),
+        'height': int((video or {}).get('height') or 0),
+        'vcodec': (video or {}).get('codec_name'),
+        'acodec': (audio or {}).get('codec_name'),
+        'format': data.get('format', {}).get('format_name', ''),
+    }
+
+
+def moov_before_mdat(path):
+    """True si el MP4 ya tiene el índice (moov) antes de los datos: reproducible en streaming."""
+    with open(path, 'rb') as f:
+        return _moov_first(f)
+
+
+def starts_with_moov(data):
+    """Como moov_before_mdat, sobre los primeros bytes del archivo (p. ej. la primera parte de un stream)."""
+    return _moov_first(io.BytesIO(data))
+
+
+def _moov_first(f):
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            return False
+        size, kind = struct.unpack('>I4s', header)
+        if kind == b'moov':
+            return True
+        if kind == b'mdat':
+            return False
+        if size == 1:
+            size = struct.unpack('>Q', f.read(8))[0]
+            f.seek(size - 16, os.SEEK_CUR)
+        elif size == 0:
+            return False
+        else:
+            f.seek(size - 8, os.SEEK_CUR)
+
+
+def target_video_bitrate(duration, max_bytes, audio_bitrate):
+    """Bitrate de vídeo (bits/s) para que duration segundos quepan en max_bytes."""
+    total = max_bytes * 8 * _SIZE_MARGIN / duration
+    return int(total - audio_bitrate)
+
+
+def _ffmpeg(args, timeout):
+    result = subprocess.run(['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y', *args],
+                            capture_output=True, text=True, timeout=timeout)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip()
+                           else f"ffmpeg terminó con código {result.returncode}")
+
+
+def _encode_args(info, video_bitrate, preset, audio_bitrate):
+    """
+    Argumentos de códec: el vídeo solo se reencodea con video_bitrate (para que quepa);
+    si no se copia. El audio se copia si MP4 lo admite y no hay reencode de vídeo.
+    """
+    args = ['-map', '0:v:0?', '-map', '0:a:0?', '-sn', '-dn']
+    if video_bitrate is not None:
+        args += ['-c:v', 'libx264', '-preset', preset, '-b:v', str(video_bitrate),
+                 '-maxrate', str(int(video_bitrate * 1.5)), '-bufsize', str(video_bitrate * 2),
+                 '-pix_fmt', 'yuv420p']
+        # Con poco bitrate se ve mejor a menos resolución
+        if video_bitrate < 500_000 and info['height'] > 480:
+            args += ['-vf', 'scale=-2:480']
+        elif video_bitrate < 1_000_000 and info['height'] > 720:
+            args += ['-vf', 'scale=-2:720']
+    else:
+        args += ['-c:v', 'copy']
+        if info['vcodec'] == 'hevc':
+            args += ['-tag:v', 'hvc1']
+    if info['acodec'] in _COPY_AUDIO and video_bitrate is None:
+        args += ['-c:a', 'copy']
+    else:
+        args += ['-c:a', 'aac', '-b:a', str(audio_bitrate)]
+    return args
+
+
+def make_thumbnail(path, duration, timeout=60):
+    """Extrae un fotograma como JPEG de como mucho THUMB_SIZE px. Devuelve la ruta temporal."""
+    fd, thumb = tempfile.mkstemp(prefix='thumb-', suffix='.jpg')
+    os.close(fd)
+    scale = f"scale='min({THUMB_SIZE},iw)':'min({THUMB_SIZE},ih)':force_original_aspect_ratio=decrease"
+    try:
+        _ffmpeg(['-ss', f"{min(1.0, duration / 2):.2f}", '-i', path, '-frames:v', '1',
+                 '-vf', scale, '-q:v', '5', thumb], timeout)
+    except Exception:
+        os.remove(thumb)
+        raise
+    return thumb
+
+
+def process_media(path, max_bytes, preset='veryfast', audio_bitrate=128_000, timeout=3600):
+    """
+    Deja el vídeo listo para Telegram y genera la miniatura. El vídeo solo se reencodea
+    cuando no cabe en max_bytes, a un bitrate calculado con la duración. Si cabe:
+
+    - con códecs que MP4 admite (H.264/HEVC) se remuxa a MP4 con faststart (moov al
+      principio) copiando el vídeo; un audio no admitido (p. ej. Opus) pasa a AAC;
+    - con otro códec de vídeo (VP9, AV1...) se envía el archivo tal cual, sin streaming,
+      en vez de pagar un reencode completo.
+
+    Se ejecuta en el pool de procesos de MediaProcessor. Devuelve un dict con filename,
+    duration, width, height, thumb (ruta temporal o None), streaming (MP4 reproducible
+    en streaming) y transcoded (hubo reencode, por tamaño o por el audio).
+    """
+    info = probe_media(path)
+    if not info['vcodec']:
+        raise ValueError("El archivo no tiene pista de vídeo")
+    duration = info['duration']
+
+    video_bitrate = None
+    if os.path.getsize(path) > max_bytes:
+        if not duration:
+            raise ValueError("Duración desconocida, no se puede calcular el bitrate objetivo")
+        video_bitrate = target_video_bitrate(duration, max_bytes, audio_bitrate)
+        if video_bitrate < MIN_VIDEO_BITRATE:
+            raise ValueError(f"No cabe en {max_bytes} bytes ni a {MIN_VIDEO_BITRATE // 1000}kbps")
+
+    output = path
+    streaming = video_bitrate is not None or info['vcodec'] in _COPY_VIDEO
+    transcoded = video_bitrate is not None or (streaming and info['acodec'] not in (*_COPY_AUDIO, None))
+    is_mp4 = 'mp4' in info['format'] and path.lower().endswith('.mp4')
+    if streaming and (transcoded or not is_mp4 or not moov_before_mdat(path)):
+        output = os.path.splitext(path)[0] + '.mp4'
+        tmp = os.path.splitext(path)[0] + '.faststart.mp4'
+        try:
+            _ffmpeg(['-i', path, *_encode_args(info, video_bitrate, preset, audio_bitrate),
+                     '-movflags', '+faststart', tmp], timeout)
+            os.replace(tmp, output)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        if output != path:
+            os.remove(path)
+        if transcoded:
+            info = probe_media(output)
+
+    try:
+        thumb = make_thumbnail(output, duration)
+    except Exception:
+        thumb = None
+    return {
+        'filename': output,
+        'duration': int(round(info['duration'] or duration)),
+        'width': info['width'],
+        'height': info['height'],
+        'thumb': thumb,
+        'streaming': streaming,
+        'transcoded': transcoded,
+    }
+
+
+def discard_thumbnail(media):
+    """Borra la miniatura temporal de un resultado de process_media (si la hay)."""
+    thumb = media.pop('thumb', None) if media else None
+    if thumb and os.path.exists(thumb):
+        os.remove(thumb)
+
+
+class MediaProcessor:
+    """
+    Etapa de post-proceso entre la descarga y la subida.
+
+    Los trabajos de ffmpeg van a un pool de procesos de MEDIA_WORKERS procesos, que
+    limita cuántos remux/reencodes corren a la vez. Si ffmpeg no está instalado o el
+    post-proceso falla se sigue con el archivo original.
+    """
+
+    def __init__(self, config):
+        self.logger = setup_logger('MediaProcessor')
+        self.enabled = config.media_postprocess and shutil.which('ffmpeg') and shutil.which('ffprobe')
+        self.workers = max(1, config.media_workers)
+        self.preset = config.media_preset
+        self.audio_bitrate = config.media_audio_bitrate
+        self.timeout = config.media_timeout
+        self._executor = None
+        if config.media_postprocess and not self.enabled:
+            self.logger.warning("ffmpeg/ffprobe no encontrados: se envían los vídeos sin post-proceso")
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    async def process(self, filename, max_bytes):
+        """Devuelve el dict de process_media, o None si no hay post-proceso."""
+        if not self.enabled:
+            return None
+        loop = asyncio.get_running_loop()
+        start = time.monotonic()
+        try:
+            result = await loop.run_in_executor(
+                self._get_executor(), process_media, filename, max_bytes,
+                self.preset, self.audio_bitrate, self.timeout)
+        except Exception as e:
+            self.logger.error(f"Error en el post-proceso de {filename}: {e}")
+            return None
+        metrics.observe_stage('postprocess', time.monotonic() - start)
+        if result['transcoded']:
+            self.logger.info(f"Reencodeado {filename} -> {result['filename']} "
+                             f"({os.path.getsize(result['filename'])} bytes)")
+        return result
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,121 @@
+import asyncio
+import time
+from src.config.logger import setup_logger
+from src.downloader.media_cache import canonical_url
+from src.downloader.net_limits import get_limiter, host_of
+from src.downloader.ytdlp_engine import borrow
+
+
+def run_probe(link, ydl_opts):
+    """Extrae los metadatos del enlace sin descargar (se ejecuta fuera del event loop)."""
+    opts = dict(ydl_opts, skip_download=True, quiet=True)
+    get_limiter().wait_request(host_of(link))
+    with borrow(opts) as ydl:
+        info = ydl.extract_info(link, download=False)
+        return ydl.sanitize_info(info)
+
+
+def estimate_size(fmt, duration=None):
+    """Tamaño estimado en bytes de un formato: filesize, filesize_approx o bitrate × duración."""
+    size = fmt.get('filesize') or fmt.get('filesize_approx')
+    if size:
+        return int(size)
+    tbr = fmt.get('tbr') or ((fmt.get('vbr') or 0) + (fmt.get('abr') or 0))
+    duration = fmt.get('duration') or duration
+    if tbr and duration:
+        # tbr viene en kbit/s
+        return int(tbr * 1000 / 8 * duration)
+    return None
+
+
+def _has_video(fmt):
+    return fmt.get('vcodec') != 'none'
+
+
+def _has_audio(fmt):
+    return fmt.get('acodec') != 'none'
+
+
+def select_format(info, max_bytes):
+    """
+    Devuelve el format selector del mejor formato que cabe en max_bytes, o None.
+
+    Prefiere formatos con audio y vídeo; si no hay ninguno que quepa prueba a combinar
+    el mejor vídeo con el mejor audio (yt-dlp los une con ffmpeg). Si ningún formato de
+    tamaño conocido cabe pero hay alguno de tamaño desconocido se devuelve 'best' y
+    queda la comprobación tras la descarga.
+    """
+    formats = info.get('formats')
+    duration = info.get('duration')
+    if not formats:
+        size = estimate_size(info, duration)
+        return 'best' if size is None or size <= max_bytes else None
+
+    unknown = False
+    # yt-dlp ordena los formatos de peor a mejor
+    candidates = list(reversed(formats))
+    for fmt in candidates:
+        if _has_video(fmt) and _has_audio(fmt):
+            size = estimate_size(fmt, duration)
+            if size is None:
+                unknown = True
+            elif size <= max_bytes:
+                return fmt['format_id']
+
+    audio = [f for f in candidates if _has_audio(f) and not _has_video(f)]
+    for video in (f for f in candidates if _has_video(f) and not _has_audio(f)):
+        video_size = estimate_size(video, duration)
+        if video_size is None:
+            unknown = True
+            continue
+        for fmt in audio:
+            audio_size = estimate_size(fmt, duration)
+            if audio_size is not None and video_size + audio_size <= max_bytes:
+                return f"{video['format_id']}+{fmt['format_id']}"
+    return 'best' if unknown else None
+
+
+def best_estimated_size(info):
+    """Tamaño estimado del mejor formato (el que elegiría 'best'), o None si se desconoce."""
+    requested = info.get('requested_formats')
+    if requested:
+        sizes = [estimate_size(f, info.get('duration')) for f in requested]
+        return None if None in sizes else sum(sizes)
+    return estimate_size(info, info.get('duration'))
+
+
+def selected_size(info, format_selector):
+    """Tamaño estimado del formato elegido por select_format, o None si se desconoce."""
+    if not format_selector or format_selector == 'best':
+        return best_estimated_size(info)
+    formats = {f.get('format_id'): f for f in info.get('formats') or []}
+    sizes = [estimate_size(formats.get(fid, {}), info.get('duration')) for fid in format_selector.split('+')]
+    return None if None in sizes else sum(sizes)
+
+
+class MediaProber:
+    """Probe de metadatos con caché en memoria de TTL corto."""
+
+    def __init__(self, config):
+        self.logger = setup_logger('MediaProber')
+        self.ttl = config.probe_cache_ttl
+        self._cache = {}
+
+    async def probe(self, link, ydl_opts):
+        """Devuelve el info dict de yt-dlp para el enlace, reutilizando uno reciente si existe."""
+        key = canonical_url(link)
+        now = time.monotonic()
+        cached = self._cache.get(key)
+        if cached and cached[0] > now:
+            self.logger.info(f"Probe cache hit: {link}")
+            return cached[1]
+
+        info = await asyncio.to_thread(run_probe, link, ydl_opts)
+        self._purge(now)
+        self._cache[key] = (now + self.ttl, info)
+        return info
+
+    def _purge(self, now):
+        expired = [key for key, (expires, _) in self._cache.items() if expires <= now]
+        for key in expired:
+            del self._cache[key]
@@ -0,0 +1,176 @@
+import asyncio
+import itertools
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from src.config.logger import setup_logger
+from src.downloader.job_queue import RemoteRunner, get_queue_backend
+from src.downloader.net_limits import get_limiter
+from src.utils.metrics import metrics
+
+
+class DownloadJob:
+    """Trabajo encolado en el scheduler."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, chat_id, func, args, host=None):
+        self.id = next(self._ids)
+        self.chat_id = chat_id
+        self.func = func
+        self.args = args
+        self.host = host
+        self.future = asyncio.get_running_loop().create_future()
+        self.submitted_at = time.monotonic()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def run_time(self):
+        """Segundos de ejecución en el pool (sin la espera en cola), o None."""
+        if self.started_at is None or self.finished_at is None:
+            return None
+        return self.finished_at - self.started_at
+
+    def __await__(self):
+        return self.future.__await__()
+
+
+class DownloadScheduler:
+    """
+    Cola de descargas con límite global, por chat y por dominio.
+
+    Los trabajos se agrupan en una cola por chat y se despachan en round-robin entre
+    chats, así un chat que pega 30 enlaces no deja sin turno al resto. Un trabajo con
+    host solo sale de la cola cuando hay una conexión libre para ese dominio (ver
+    net_limits): esperar en el pool dejaría hilos parados que otros sitios podrían usar. Cada trabajo se
+    ejecuta en un pool de hilos o procesos para no bloquear el event loop de Telethon,
+    o, con DOWNLOAD_BACKEND=sqlite|redis, en workers externos a través de una cola.
+    """
+
+    def __init__(self, config):
+        self.logger = setup_logger('DownloadScheduler')
+        self.max_workers = config.download_workers
+        self.per_chat_limit = config.download_per_chat
+        self.executor_kind = config.download_executor
+        self._executor = None
+        self._remote = None
+        if config.download_backend != 'local':
+            # Descargas en workers externos: sin streaming ni hooks de progreso en proceso
+            self.executor_kind = 'queue'
+            self._remote = RemoteRunner(get_queue_backend(config), config)
+            # La capacidad la ponen los workers (WORKER_CONCURRENCY cada uno), no DOWNLOAD_WORKERS:
+            # aquí cada trabajo es solo una corrutina esperando su resultado
+            self.max_workers = config.queue_max_in_flight or None
+        self._queues = OrderedDict()
+        self._active = {}
+        self._running = 0
+
+    def _get_executor(self):
+        if self._executor is None:
+            if self.executor_kind == 'process':
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix='download')
+            self.logger.info(f"Pool de descargas ({self.executor_kind}) con {self.max_workers} workers")
+        return self._executor
+
+    def submit(self, chat_id, func, *args, host=None):
+        """
+        Encola func(*args) para el chat indicado y devuelve el DownloadJob (awaitable).
+        host es el dominio del que descarga, para el límite de conexiones por dominio.
+        """
+        job = DownloadJob(chat_id, func, args, host)
+        self._queues.setdefault(chat_id, deque()).append(job)
+        self.logger.info(f"Job {job.id} encolado para chat {chat_id} (posición {self.position(job)})")
+        self._dispatch()
+        return job
+
+    def position(self, job):
+        """
+        Posición estimada del trabajo en la cola (1 = el siguiente en salir).
+        Devuelve 0 si ya se está ejecutando o ha terminado.
+        """
+        queue = self._queues.get(job.chat_id)
+        if not queue or job not in queue:
+            return 0
+        index = queue.index(job)
+        ahead = index
+        for chat_id, other in self._queues.items():
+            if chat_id != job.chat_id:
+                # Con round-robin, cada chat adelanta como mucho un trabajo por ronda
+                ahead += min(len(other), index + 1)
+        return ahead + 1
+
+    def queue_depth(self):
+        """Número de trabajos esperando en cola."""
+        return sum(len(q) for q in self._queues.values())
+
+    def in_flight(self):
+        """Número de trabajos ejecutándose."""
+        return self._running
+
+    def _next_job(self):
+        for chat_id in list(self._queues):
+            queue = self._queues[chat_id]
+            if self._active.get(chat_id, 0) >= self.per_chat_limit:
+                continue
+            # El primer trabajo del chat cuyo dominio tenga una conexión libre
+            job = next((job for job in queue if self._acquire_host(job)), None)
+            if job is None:
+                continue
+            queue.remove(job)
+            # Rotar el chat al final para el round-robin
+            self._queues.move_to_end(chat_id)
+            if not queue:
+                del self._queues[chat_id]
+            return job
+        return None
+
+    def _acquire_host(self, job):
+        return job.host is None or get_limiter().try_connection(job.host)
+
+    def _dispatch(self):
+        while self.max_workers is None or self._running < self.max_workers:
+            job = self._next_job()
+            if job is None:
+                return
+            self._running += 1
+            self._active[job.chat_id] = self._active.get(job.chat_id, 0) + 1
+            asyncio.create_task(self._run(job))
+
+    async def _run(self, job):
+        loop = asyncio.get_running_loop()
+        job.started_at = time.monotonic()
+        metrics.observe_stage('queue', job.started_at - job.submitted_at)
+        try:
+            if self._remote is not None:
+                result = await self._remote.run(job.func, job.args)
+            else:
+                result = await loop.run_in_executor(self._get_executor(), job.func, *job.args)
+            if not job.future.done():
+                job.future.set_result(result)
+        except Exception as e:
+            self.logger.error(f"Job {job.id} falló: {e}")
+            if not job.future.done():
+                job.future.set_exception(e)
+        finally:
+            job.finished_at = time.monotonic()
+            if job.host is not None:
+                get_limiter().release_connection(job.host)
+            self._running -= 1
+            self._active[job.chat_id] -= 1
+            if not self._active[job.chat_id]:
+                del self._active[job.chat_id]
+            self._dispatch()
+
+    def shutdown(self):
+        """Cancela los trabajos en cola y cierra el pool."""
+        for queue in self._queues.values():
+            for job in queue:
+                job.future.cancel()
+        self._queues.clear()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,48 @@
+import asyncio
+from src.config.logger import setup_logger
+
+
+class Flight:
+    """Trabajo en curso para una clave; los seguidores esperan su future."""
+
+    def __init__(self, owner):
+        self.owner = owner
+        self.future = asyncio.get_running_loop().create_future()
+        self.followers = 0
+
+
+class SingleFlight:
+    """
+    Deduplicación de peticiones en curso.
+
+    La primera petición para una clave (URL canónica o extractor:id) lidera el trabajo;
+    las que llegan mientras tanto se enganchan a su Flight y reciben el resultado
+    cuando el líder aterriza, en lugar de lanzar otra descarga del mismo contenido.
+    """
+
+    def __init__(self):
+        self.logger = setup_logger('SingleFlight')
+        self._flights = {}
+
+    def join(self, key):
+        """Devuelve el Flight en curso para la clave, o None."""
+        flight = self._flights.get(key)
+        if flight is not None:
+            flight.followers += 1
+            self.logger.info(f"Petición enganchada a {key} ({flight.followers} en espera)")
+        return flight
+
+    def lead(self, key, owner=None):
+        """Registra un nuevo Flight para la clave; owner identifica al líder (p. ej. su lote)."""
+        flight = Flight(owner)
+        self._flights[key] = flight
+        return flight
+
+    def land(self, key, result=None):
+        """Termina el Flight y despierta a los seguidores con el resultado."""
+        flight = self._flights.pop(key, None)
+        if flight is not None and not flight.future.done():
+            flight.future.set_result(result)
+
+    def in_flight(self):
+        return len(self._flights)
@@ -0,0 +1,141 @@
+import asyncio
+import threading
+import urllib.request
+from src.config.logger import setup_logger
+from src.downloader.net_limits import get_limiter
+from src.downloader.postprocess import starts_with_moov
+
+logger = setup_logger('Streaming')
+
+
+class StreamClosed(Exception):
+    """El consumidor cerró el buffer (la subida falló o se canceló)."""
+
+
+class StreamBuffer:
+    """
+    Buffer acotado entre el hilo que descarga y las corrutinas que suben.
+
+    Como mucho `window` partes están en memoria a la vez: el productor se bloquea
+    hasta que la subida libera hueco, así el pico de memoria es window × part_size
+    y no depende del tamaño del archivo.
+    """
+
+    def __init__(self, window):
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._slots = threading.Semaphore(window)
+        self._closed = threading.Event()
+        self.part_count = None
+        self.total_bytes = 0
+        self.error = None
+        # Si el MP4 trae moov antes de mdat (se sabe con la primera parte)
+        self.faststart = False
+
+    # --- lado productor (hilo del pool) ---
+
+    def put(self, index, data, is_last):
+        while not self._slots.acquire(timeout=1):
+            if self._closed.is_set():
+                raise StreamClosed()
+        if self._closed.is_set():
+            raise StreamClosed()
+        self.total_bytes += len(data)
+        if is_last:
+            self.part_count = index + 1
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, (index, data, is_last))
+
+    def finish(self, error=None):
+        """Marca el final del stream (con error si la descarga falló)."""
+        self.error = error
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, None)
+
+    # --- lado consumidor (event loop) ---
+
+    async def get(self):
+        """Devuelve (index, data, is_last) o None cuando no quedan partes."""
+        item = await self._queue.get()
+        if item is None:
+            # Dejar la marca de fin para el resto de consumidores
+            self._queue.put_nowait(None)
+            if self.error is not None:
+                raise self.error
+        return item
+
+    def release(self):
+        """Libera el hueco de una parte ya subida."""
+        self._slots.release()
+
+    def close(self):
+        self._closed.set()
+
+
+def stream_http(url, headers, part_size, buffer, host):
+    """
+    Descarga una URL HTTP progresiva troceándola en partes de part_size hacia el buffer.
+    Se ejecuta en el pool del scheduler, que ya reservó la conexión al dominio host
+    (igual que para run_download); aquí se aplican además las peticiones por segundo
+    del dominio y el presupuesto de ancho de banda. Retiene una parte para saber cuál
+    es la última.
+    """
+    error = None
+    limiter = get_limiter()
+    try:
+        limiter.wait_request(host)
+        request = urllib.request.Request(url, headers=headers or {})
+        with urllib.request.urlopen(request, timeout=60) as response:
+            index = 0
+            pending = _read_part(response, part_size)
+            # Sin post-proceso: solo se marca como streaming si ya viene con faststart
+            buffer.faststart = starts_with_moov(pending)
+            while pending:
+                limiter.throttle(len(pending))
+                following = _read_part(response, part_size)
+                buffer.put(index, pending, is_last=not following)
+                pending = following
+                index += 1
+        if buffer.part_count is None:
+            raise IOError(f"Stream vacío: {url}")
+    except StreamClosed:
+        logger.info(f"Stream cancelado: {url}")
+    except Exception as e:
+        error = e
+    finally:
+        buffer.finish(error)
+    return buffer.total_bytes
+
+
+def _read_part(response, part_size):
+    chunks = []
+    remaining = part_size
+    while remaining:
+        chunk = response.read(remaining)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b''.join(chunks)
+
+
+def get_streamable_format(info, format_selector, min_size):
+    """
+    Devuelve el formato elegido si admite subida en streaming: un único formato
+    progresivo por HTTP(S), mp4, con audio y vídeo y tamaño estimado >= min_size.
+    """
+    if not format_selector or '+' in format_selector:
+        return None
+    formats = info.get('formats') or [info]
+    if format_selector == 'best':
+        fmt = formats[-1] if formats else None
+    else:
+        fmt = next((f for f in formats if f.get('format_id') == format_selector), None)
+    if not fmt or not fmt.get('url'):
+        return None
+    if fmt.get('protocol') not in ('http', 'https') or fmt.get('ext') != 'mp4':
+        return None
+    if fmt.get('vcodec') == 'none' or fmt.get('acodec') == 'none':
+        return None
+    size = fmt.get('filesize') or fmt.get('filesize_approx')
+    if not size or size < min_size:
+        return None
+    return fmt
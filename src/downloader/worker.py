@@ -0,0 +1,87 @@
+import os
+import signal
+import socket
+import threading
+from src.config.logger import setup_logger
+from src.downloader.job_queue import get_queue_backend, resolve_func
+
+
+class DownloadWorker:
+    """
+    Worker de descargas desacoplado del frontend de Telegram.
+
+    Reclama trabajos de la cola compartida, los ejecuta (run_download) y deja el
+    resultado para el frontend. Mientras trabaja renueva el lease con heartbeats;
+    si el proceso muere, el lease caduca y otro worker (o el frontend) lo reencola.
+    """
+
+    def __init__(self, config):
+        self.logger = setup_logger('DownloadWorker')
+        self.backend = get_queue_backend(config)
+        self.concurrency = config.worker_concurrency
+        self.lease = config.queue_lease
+        self.max_attempts = config.queue_max_attempts
+        self.poll_interval = config.queue_poll_interval
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}"
+        self._stop = threading.Event()
+
+    def run(self):
+        """Arranca concurrency hilos de trabajo y bloquea hasta SIGTERM/SIGINT."""
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *_: self.stop())
+        threads = [
+            threading.Thread(target=self._loop, args=(f"{self.worker_id}-{slot}",), name=f'worker-{slot}')
+            for slot in range(self.concurrency)
+        ]
+        self.logger.info(f"Worker {self.worker_id} con {self.concurrency} hilos")
+        for thread in threads:
+            thread.start()
+        while any(thread.is_alive() for thread in threads):
+            for thread in threads:
+                thread.join(timeout=1)
+
+    def stop(self):
+        self.logger.info("Parando: se terminan los trabajos en curso")
+        self._stop.set()
+
+    def _loop(self, worker):
+        while not self._stop.is_set():
+            try:
+                requeued, failed = self.backend.requeue_expired(self.max_attempts)
+                if requeued or failed:
+                    self.logger.warning(f"Leases caducados: {requeued} reencolados, {failed} fallidos")
+                claimed = self.backend.claim(worker, self.lease)
+            except Exception as e:
+                self.logger.error(f"Error accediendo a la cola: {e}")
+                claimed = None
+            if claimed is None:
+                self._stop.wait(self.poll_interval)
+                continue
+            self._execute(worker, *claimed)
+
+    def _execute(self, worker, job_id, payload):
+        done = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(worker, job_id, done), daemon=True)
+        heartbeat.start()
+        try:
+            func = resolve_func(payload['func'])
+            self.logger.info(f"Trabajo {job_id}: {payload['func']}")
+            result = func(*payload['args'])
+            self.backend.complete(job_id, worker, result)
+        except Exception as e:
+            self.logger.error(f"Trabajo {job_id} falló: {e}")
+            try:
+                self.backend.fail(job_id, worker, str(e))
+            except Exception as queue_error:
+                self.logger.error(f"Error marcando el trabajo {job_id} como fallido: {queue_error}")
+        finally:
+            done.set()
+
+    def _heartbeat(self, worker, job_id, done):
+        while not done.wait(self.lease / 3):
+            try:
+                if not self.backend.heartbeat(job_id, worker, self.lease):
+                    self.logger.warning(f"Trabajo {job_id} ya no es de este worker (lease perdido)")
+                    return
+            except Exception as e:
+                self.logger.warning(f"Error renovando el lease de {job_id}: {e}")
@@ -0,0 +1,147 @@
+import asyncio
+import importlib
+import json
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from src.config.logger import setup_logger
+from src.utils.metrics import metrics
+
+# Opciones que cambian en cada llamada y se aplican sobre la instancia reutilizada
+_PER_CALL_OPTS = ('format', 'progress_hooks')
+# Tras este número de usos la instancia se recrea (cookies, caché de extractores...)
+MAX_USES = 100
+
+logger = setup_logger('YtdlpEngine')
+_import_lock = threading.Lock()
+_yt_dlp = None
+_local = threading.local()
+
+
+def get_yt_dlp():
+    """Importa yt_dlp la primera vez que se necesita (el import cuesta ~1s)."""
+    global _yt_dlp
+    if _yt_dlp is None:
+        with _import_lock:
+            if _yt_dlp is None:
+                start = time.monotonic()
+                module = importlib.import_module('yt_dlp')
+                elapsed = time.monotonic() - start
+                metrics.gauge('ytdlp_import_seconds', 'Tiempo de importar yt-dlp').set(elapsed)
+                logger.info(f"yt-dlp {module.version.__version__} importado en {elapsed:.2f}s")
+                _yt_dlp = module
+    return _yt_dlp
+
+
+def _signature(opts):
+    base = {key: value for key, value in opts.items() if key not in _PER_CALL_OPTS}
+    return json.dumps(base, sort_keys=True, default=repr)
+
+
+def _create(opts):
+    yt_dlp = get_yt_dlp()
+    start = time.monotonic()
+    base = {key: value for key, value in opts.items() if key not in _PER_CALL_OPTS}
+    ydl = yt_dlp.YoutubeDL(base)
+    metrics.observe_stage('ytdlp_setup', time.monotonic() - start)
+    return ydl
+
+
+def _configure(ydl, opts, progress_hook):
+    """Aplica el formato y los hooks de esta llamada sobre una instancia reutilizada."""
+    fmt = opts.get('format')
+    if fmt != ydl.params.get('format'):
+        ydl.params['format'] = fmt
+        # Igual que YoutubeDL.__init__
+        ydl.format_selector = (
+            fmt if fmt in (None, '-') or callable(fmt) else ydl.build_format_selector(fmt))
+    hooks = list(opts.get('progress_hooks', []))
+    if progress_hook is not None:
+        hooks.append(progress_hook)
+    ydl._progress_hooks = hooks
+
+
+@contextmanager
+def borrow(opts, progress_hook=None):
+    """
+    Presta una instancia YoutubeDL ya inicializada para estas opciones.
+
+    Hay una instancia por hilo (o proceso) del pool y por juego de opciones base, así
+    el registro de extractores y el parseo de opciones se pagan una vez por worker y
+    no en cada enlace. Si la llamada falla la instancia se descarta.
+    """
+    instances = getattr(_local, 'instances', None)
+    if instances is None:
+        instances = _local.instances = {}
+    key = _signature(opts)
+    entry = instances.pop(key, None)
+    if entry is None or entry[1] >= MAX_USES:
+        if entry is not None:
+            entry[0].close()
+        entry = [_create(opts), 0]
+    ydl = entry[0]
+    _configure(ydl, opts, progress_hook)
+    try:
+        yield ydl
+    except BaseException:
+        ydl.close()
+        raise
+    entry[1] += 1
+    ydl._progress_hooks = []
+    instances[key] = entry
+
+
+def warm_up():
+    """Importa yt-dlp fuera del camino de las peticiones (se llama en un hilo al arrancar)."""
+    get_yt_dlp()
+
+
+def update_yt_dlp():
+    """
+    Actualiza el paquete yt-dlp con pip. Devuelve la salida de pip.
+    El proceso sigue usando la versión ya importada hasta el siguiente reinicio.
+    """
+    result = subprocess.run(
+        [sys.executable, '-m', 'pip', 'install', '--no-cache-dir', '-U', 'yt-dlp'],
+        capture_output=True, text=True, timeout=600)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip() or f"pip terminó con código {result.returncode}")
+    return result.stdout
+
+
+class YtdlpMaintenance:
+    """
+    Tarea de mantenimiento de yt-dlp: calienta el import al arrancar y comprueba
+    actualizaciones cada interval segundos, esperando a que no haya descargas en curso.
+    Nunca se ejecuta en el camino de una petición.
+    """
+
+    def __init__(self, config, is_idle=None):
+        self.logger = setup_logger('YtdlpMaintenance')
+        self.interval = config.ytdlp_update_interval
+        self.is_idle = is_idle or (lambda: True)
+        self._task = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        try:
+            await asyncio.to_thread(warm_up)
+        except Exception as e:
+            self.logger.error(f"Error importando yt-dlp: {e}")
+        if not self.interval:
+            return
+        while True:
+            await asyncio.sleep(self.interval)
+            while not self.is_idle():
+                await asyncio.sleep(30)
+            try:
+                output = await asyncio.to_thread(update_yt_dlp)
+                self.logger.info(f"Comprobada actualización de yt-dlp (efectiva al reiniciar): "
+                                 f"{output.strip().splitlines()[-1] if output.strip() else 'sin cambios'}")
+            except Exception as e:
+                self.logger.error(f"Error actualizando yt-dlp: {e}")
@@ -0,0 +1,79 @@
+import copy
+from src.downloader.http_ranges import range_download
+from src.downloader.net_limits import get_limiter, host_of
+from src.downloader.ytdlp_engine import borrow
+
+# Protocolos de yt-dlp que se descargan por fragmentos (admiten concurrent_fragment_downloads)
+_FRAGMENT_PROTOCOLS = ('m3u8', 'm3u8_native', 'http_dash_segments', 'http_dash_segments_generator', 'ism', 'f4m')
+
+
+def run_download(link, ydl_opts, info=None, progress_hook=None):
+    """
+    Descarga el enlace con yt-dlp y devuelve un dict con la ruta del archivo
+    y los datos del extractor (extractor_key, id) para la caché.
+    Si se pasa el info dict del probe se reutiliza y no se repite la extracción.
+    progress_hook se añade a los progress_hooks de yt-dlp (solo con el pool de hilos).
+    Se ejecuta dentro del pool del scheduler (hilo o proceso), nunca en el event loop,
+    por eso vive a nivel de módulo: tiene que poder serializarse para un ProcessPoolExecutor.
+    La instancia YoutubeDL se reutiliza entre enlaces del mismo worker (ver ytdlp_engine).
+
+    La conexión base del límite por dominio la reserva el scheduler antes de pasar el
+    trabajo al pool (ver DownloadScheduler). Solo cuando el formato elegido puede
+    aprovecharlas se piden conexiones extra, sin esperar: fragmentos HLS/DASH en
+    paralelo, o rangos en paralelo para archivos progresivos grandes.
+    """
+    limiter = get_limiter()
+    host = host_of(link)
+    with borrow(ydl_opts, limiter.progress_hook(progress_hook)) as ydl:
+        if info is None:
+            ydl.params['concurrent_fragment_downloads'] = 1
+            limiter.wait_request(host)
+            return _result(ydl, ydl.extract_info(link, download=True))
+
+        selected = ydl.process_ie_result(copy.deepcopy(info), download=False)
+        if _is_large_progressive(selected, limiter):
+            with limiter.extra_connections(host, limiter.range_connections - 1) as extra:
+                if extra:
+                    result = _download_ranges(ydl, selected, 1 + extra, limiter, host, progress_hook)
+                    if result is not None:
+                        return result
+
+        wanted = limiter.fragment_concurrency - 1 if _is_fragmented(selected) else 0
+        with limiter.extra_connections(host, wanted) as extra:
+            ydl.params['concurrent_fragment_downloads'] = 1 + extra
+            return _result(ydl, ydl.process_ie_result(info, download=True))
+
+
+def _result(ydl, info):
+    return {
+        'filename': ydl.prepare_filename(info),
+        'extractor_key': info.get('extractor_key'),
+        'id': info.get('id'),
+    }
+
+
+def _is_fragmented(selected):
+    formats = selected.get('requested_formats') or [selected]
+    return any(fmt.get('protocol') in _FRAGMENT_PROTOCOLS for fmt in formats)
+
+
+def _is_large_progressive(selected, limiter):
+    """Un único archivo HTTP(S) de al menos RANGE_MIN_BYTES."""
+    if selected.get('requested_formats') or selected.get('protocol') not in ('http', 'https'):
+        return False
+    size = selected.get('filesize') or selected.get('filesize_approx') or 0
+    return bool(selected.get('url')) and size >= limiter.range_min_bytes
+
+
+def _download_ranges(ydl, selected, connections, limiter, host, progress_hook):
+    """Descarga el formato por rangos en paralelo. Devuelve None para seguir con yt-dlp."""
+    headers = dict(selected.get('http_headers') or {})
+    cookie_header = getattr(ydl.cookiejar, 'get_cookie_header', None)
+    cookies = cookie_header(selected['url']) if cookie_header else None
+    if cookies:
+        headers['Cookie'] = cookies
+    filename = ydl.prepare_filename(selected)
+    if range_download(selected['url'], headers, filename, connections, limiter.range_chunk_size,
+                      limiter, host, progress_hook) is None:
+        return None
+    return _result(ydl, dict(selected, filename=filename))
@@ -1,12 +1,30 @@
-from telethon import events
+import html
+import os
+import time
+from telethon import events, Button
 from src.config.logger import setup_logger
+from src.database.catalog import get_catalog
+from src.database.models import ARTIFACT_STORED, ARTIFACT_PERSISTED
+from src.telegram.telegram_messenger import TelegramMessenger
 from src.utils.message_info import MessageInfo
+from src.utils.metrics import metrics
+
+FILE_SCOPES = {
+    'stored': (ARTIFACT_STORED, "📦 Guardados"),
+    'persist': (ARTIFACT_PERSISTED, "💾 Persistidos"),
+}
+FILE_SORTS = {'size': "📏 Tamaño", 'age': "🕒 Antigüedad"}
+
+STAGES = ('queue', 'ytdlp_setup', 'extract', 'download', 'postprocess', 'stream', 'upload', 'publish', 'total')
 
 class CommandHandler:
     def __init__(self, client, config):
         self.client = client
         self.config = config
         self.logger = setup_logger('CommandHandler')
+        self.catalog = get_catalog(config)
+        # Las respuestas salen por el dispatcher compartido, como las de LinkHandler
+        self.messenger = TelegramMessenger(client, config)
 
     def register_commands(self):
         """Registra los comandos del bot."""
@@ -20,7 +38,7 @@ class CommandHandler:
                 
                 # Responder con la información
                 info_text = msg_info.get_summary_text()
-                await self.client.send_message(
+                await self.messenger.send_message(
                     message.chat_id,
                     info_text,
                     parse_mode='markdown',
@@ -31,8 +49,142 @@ class CommandHandler:
                 
             except Exception as e:
                 self.logger.error(f"Error procesando comando /info: {e}")
-                await self.client.send_message(
+                await self.messenger.send_message(
                     message.chat_id,
                     "❌ Error al obtener información del chat.",
                     reply_to=message.id
-                )
\ No newline at end of file
+                )
+
+        @self.client.on(events.NewMessage(pattern=r'^/stats$'))
+        async def handle_stats_command(event):
+            """Maneja el comando /stats (solo el propietario)."""
+            message = event.message
+            if message.sender_id != self.config.user_id:
+                return
+            try:
+                await self.messenger.send_message(
+                    message.chat_id,
+                    self._stats_text(),
+                    parse_mode='markdown',
+                    reply_to=message.id
+                )
+                self.logger.info(f"Comando /stats ejecutado en chat {message.chat_id}")
+            except Exception as e:
+                self.logger.error(f"Error procesando comando /stats: {e}")
+
+        @self.client.on(events.NewMessage(pattern=r'^/files(?:\s+(\w+))?(?:\s+(\w+))?$'))
+        async def handle_files_command(event):
+            """Maneja /files [stored|persist] [size|age] (solo el propietario)."""
+            message = event.message
+            if message.sender_id != self.config.user_id:
+                return
+            scope = event.pattern_match.group(1) or 'stored'
+            sort = event.pattern_match.group(2) or 'age'
+            if scope in FILE_SORTS and event.pattern_match.group(2) is None:
+                scope, sort = 'stored', scope
+            if scope not in FILE_SCOPES or sort not in FILE_SORTS:
+                await self.messenger.send_message(
+                    message.chat_id, "Uso: /files [stored|persist] [size|age]", reply_to=message.id)
+                return
+            try:
+                text, buttons = self._files_page(scope, sort, 0)
+                await self.messenger.send_message(
+                    message.chat_id, text, parse_mode='html', buttons=buttons, reply_to=message.id)
+                self.logger.info(f"Comando /files ejecutado en chat {message.chat_id}")
+            except Exception as e:
+                self.logger.error(f"Error procesando comando /files: {e}")
+
+        @self.client.on(events.CallbackQuery(pattern=rb'^files:'))
+        async def handle_files_page(event):
+            """Paginación de /files: files:{scope}:{sort}:{page}."""
+            if event.sender_id != self.config.user_id:
+                await self.messenger.answer_callback(event, "⛔ Solo el propietario")
+                return
+            try:
+                _, scope, sort, page = event.data.decode('utf-8').split(':')
+                text, buttons = self._files_page(scope, sort, int(page))
+                await self.messenger.edit_callback_message(event, text, parse_mode='html', buttons=buttons)
+                await self.messenger.answer_callback(event)
+            except Exception as e:
+                self.logger.error(f"Error paginando /files: {e}")
+                await self.messenger.answer_callback(event, "❌ Error procesando acción")
+
+    def _files_page(self, scope, sort, page):
+        """Texto y botones de una página del listado de archivos del catálogo."""
+        per_page = self.config.files_page_size
+        state, title = FILE_SCOPES[scope]
+        entries, total, total_bytes = self.catalog.page(state, sort, page, per_page)
+        pages = max(1, (total + per_page - 1) // per_page)
+        if page >= pages and total:
+            page = pages - 1
+            entries, total, total_bytes = self.catalog.page(state, sort, page, per_page)
+
+        lines = [f"<b>{title}</b>: {total} archivos, {total_bytes / (1024 * 1024):.0f} MB "
+                 f"({FILE_SORTS[sort].split(' ', 1)[1].lower()}, página {page + 1}/{pages})", ""]
+        now = time.time()
+        for entry in entries:
+            lines.append(f"<code>{entry.id}</code> · {entry.size / (1024 * 1024):.1f} MB · "
+                         f"{_format_age(now - entry.created_at)} · {html.escape(os.path.basename(entry.path))}")
+        if not entries:
+            lines.append("No hay archivos")
+
+        navigation = []
+        if page > 0:
+            navigation.append(Button.inline("◀️", f"files:{scope}:{sort}:{page - 1}"))
+        if page + 1 < pages:
+            navigation.append(Button.inline("▶️", f"files:{scope}:{sort}:{page + 1}"))
+        other_sort = 'size' if sort == 'age' else 'age'
+        other_scope = 'persist' if scope == 'stored' else 'stored'
+        buttons = [
+            Button.inline(FILE_SORTS[other_sort], f"files:{scope}:{other_sort}:0"),
+            Button.inline(FILE_SCOPES[other_scope][1], f"files:{other_scope}:{sort}:0"),
+        ]
+        return "\n".join(lines), [row for row in (navigation, buttons) if row]
+
+    def _stats_text(self):
+        """Resumen legible de las métricas del proceso."""
+        lines = ["📊 **Estadísticas**", ""]
+
+        stages = metrics.get('stage_seconds')
+        lines.append("**Latencia por etapa** (n / media / p50 / p95)")
+        for stage in STAGES:
+            series = stages.series.get((('stage', stage),)) if stages else None
+            if not series or not series[2]:
+                continue
+            count = series[2]
+            lines.append(
+                f"• {stage}: {count} / {series[1] / count:.2f}s / "
+                f"≤{stages.quantile(0.5, stage=stage):g}s / ≤{stages.quantile(0.95, stage=stage):g}s")
+
+        speeds = metrics.get('transfer_bytes_per_second')
+        lines += ["", "**Transferencia**"]
+        for direction in ('download', 'upload'):
+            total = metrics.value(f'{direction}_bytes_total')
+            series = speeds.series.get((('direction', direction),)) if speeds else None
+            average = f", media {series[1] / series[2] / 1e6:.1f} MB/s" if series and series[2] else ""
+            lines.append(f"• {direction}: {total / (1024 * 1024):.1f} MB{average}")
+
+        outbound = self.messenger.get_stats()
+        lines += [
+            "",
+            f"**Cola:** {metrics.value('download_queue_depth')} en espera, "
+            f"{metrics.value('download_in_flight')} en curso",
+            f"**Telegram:** {outbound['sent']} enviados, {outbound['coalesced']} ediciones fusionadas, "
+            f"{outbound['flood_waited']} FloodWait, {outbound['failed']} fallidos, "
+            f"{outbound['pending']} pendientes, {outbound['in_flight']} en curso",
+            f"**Event loop:** retraso {metrics.value('event_loop_lag_last_seconds') * 1000:.0f} ms",
+            f"**Disco:** {metrics.value('downloads_ephemeral_bytes') / (1024 * 1024):.0f} MB en downloads, "
+            f"{metrics.value('downloads_persistent_bytes') / (1024 * 1024):.0f} MB persistidos",
+        ]
+        return "\n".join(lines)
+
+
+def _format_age(seconds):
+    """Antigüedad legible: 45s, 12min, 3h, 5d."""
+    if seconds < 60:
+        return f"{seconds:.0f}s"
+    if seconds < 3600:
+        return f"{seconds / 60:.0f}min"
+    if seconds < 86400:
+        return f"{seconds / 3600:.0f}h"
+    return f"{seconds / 86400:.0f}d"
@@ -0,0 +1,170 @@
+import asyncio
+import time
+from src.config.logger import setup_logger
+
+
+def _settle(tracker):
+    # Un texto explícito reemplaza al progreso pendiente de publicar
+    if tracker is not None:
+        tracker.dirty = False
+
+
+def _close(tracker):
+    # Estado final: el ProgressReporter ya no debe sobrescribirlo
+    if tracker is not None:
+        tracker.closed = True
+
+
+class MessageStatus:
+    """Estado de un enlace mostrado en su propio mensaje de progreso."""
+
+    batch = None
+    tracker = None
+    final_text = None
+    job_id = None
+
+    def __init__(self, messenger, message):
+        self.messenger = messenger
+        self.message = message
+
+    async def update(self, text, wait=True):
+        _settle(self.tracker)
+        await self.messenger.edit_message(self.message, text, wait=wait)
+
+    async def fail(self, text):
+        _close(self.tracker)
+        self.final_text = text
+        await self.update(text)
+
+    async def finish(self):
+        _close(self.tracker)
+        await self.messenger.delete_message(self.message)
+
+    async def notify_owner(self, text):
+        await self.messenger.send_notification_to_me(text, parse_mode='md')
+
+
+class BatchItemStatus:
+    """Estado de un enlace dentro de un LinkBatch (una línea del mensaje consolidado)."""
+
+    tracker = None
+    final_text = None
+    job_id = None
+
+    def __init__(self, batch, index):
+        self.batch = batch
+        self.index = index
+
+    async def update(self, text, wait=True):
+        _settle(self.tracker)
+        # El lote ya re-renderiza en segundo plano, nunca bloquea
+        await self.batch.set_line(self.index, text)
+
+    async def fail(self, text):
+        _close(self.tracker)
+        self.final_text = text
+        await self.batch.set_line(self.index, text, final=True)
+
+    async def finish(self):
+        _close(self.tracker)
+        await self.batch.set_line(self.index, "✅ Enviado", final=True)
+
+    async def notify_owner(self, text):
+        self.batch.digest.append(text)
+
+
+class LinkBatch:
+    """
+    Varios enlaces de un mismo mensaje procesados a la vez.
+
+    Mantiene un único mensaje de estado con una línea por enlace, que se edita como
+    mucho una vez cada `interval` segundos; acumula los resultados para enviarlos
+    agrupados en álbumes y las notificaciones para el propietario en un solo resumen.
+    """
+
+    def __init__(self, messenger, chat_id, links, interval):
+        self.logger = setup_logger('LinkBatch')
+        self.messenger = messenger
+        self.chat_id = chat_id
+        self.links = links
+        self.interval = interval
+        self.lines = ["⏳ En cola"] * len(links)
+        self.results = []
+        self.digest = []
+        # Callbacks a ejecutar cuando el álbum ya se ha enviado
+        self.on_sent = []
+        self.message = None
+        self._items = {}
+        self._last_render = 0.0
+        self._pending_render = None
+
+    def item(self, index):
+        # Siempre el mismo objeto por enlace: su final_text refleja también el envío del álbum
+        status = self._items.get(index)
+        if status is None:
+            status = self._items[index] = BatchItemStatus(self, index)
+        return status
+
+    def add_result(self, index, file, filename, cache_key):
+        """Guarda un vídeo listo para enviar en el álbum."""
+        self.results.append({
+            'index': index,
+            'link': self.links[index],
+            'file': file,
+            'filename': filename,
+            'cache_key': cache_key,
+        })
+
+    async def start(self, message=None):
+        """Envía el mensaje de estado, o reutiliza uno existente (p. ej. al reanudar tras un reinicio)."""
+        if message is not None:
+            self.message = message
+            await self._render(force=True)
+        else:
+            self.message = await self.messenger.send_message(self.chat_id, self._render_text())
+
+    async def set_line(self, index, text, final=False):
+        self.lines[index] = text
+        if final:
+            await self._render()
+        else:
+            self._schedule_render()
+
+    async def finish(self):
+        """Último render del estado y envío del resumen al propietario."""
+        if self._pending_render:
+            self._pending_render.cancel()
+            self._pending_render = None
+        await self._render(force=True)
+        if self.digest:
+            await self.messenger.send_notification_to_me("\n\n➖➖➖\n\n".join(self.digest), parse_mode='md')
+
+    def _render_text(self):
+        lines = [f"Descargando {len(self.links)} videos:"]
+        for index, (link, state) in enumerate(zip(self.links, self.lines), start=1):
+            lines.append(f"{index}. {state}\n    {link}")
+        return "\n".join(lines)
+
+    def _schedule_render(self):
+        if self._pending_render:
+            return
+        delay = max(0.0, self.interval - (time.monotonic() - self._last_render))
+        self._pending_render = asyncio.create_task(self._delayed_render(delay))
+
+    async def _delayed_render(self, delay):
+        await asyncio.sleep(delay)
+        self._pending_render = None
+        await self._render(force=True)
+
+    async def _render(self, force=False):
+        if self.message is None:
+            return
+        if not force and time.monotonic() - self._last_render < self.interval:
+            self._schedule_render()
+            return
+        self._last_render = time.monotonic()
+        try:
+            await self.messenger.edit_message(self.message, self._render_text())
+        except Exception as e:
+            # MessageNotModified u otro error puntual: el siguiente render lo corrige
+            self.logger.warning(f"Error actualizando estado del lote: {e}")
@@ -1,13 +1,38 @@
+import asyncio
 import os
 import re
-import urllib.parse
+import time
+from collections import OrderedDict
 from telethon import events, Button
 from src.config.logger import setup_logger
 from src.telegram.telegram_messenger import TelegramMessenger
+from src.telegram.upload_engine import UploadEngine
 from src.utils.file_manager import FileManager
+from src.utils.retention_manager import RetentionManager
 from src.database.manager import DatabaseManager
+from src.database.catalog import get_catalog
+from src.database.models import JOB_PROBING, JOB_DOWNLOADING, JOB_UPLOADING, JOB_DONE, JOB_FAILED
 from src.utils.message_info import MessageInfo
-import yt_dlp
+from src.utils.metrics import metrics
+from src.downloader.scheduler import DownloadScheduler
+from src.downloader.ytdlp_runner import run_download
+from src.downloader.ytdlp_engine import YtdlpMaintenance
+from src.downloader.link_filter import LinkFilter, extract_urls
+from src.downloader.media_cache import MediaCache, cache_key_from_info, canonical_url
+from src.downloader.single_flight import SingleFlight
+from src.downloader.probe import MediaProber, select_format, best_estimated_size, selected_size
+from src.downloader.streaming import StreamBuffer, stream_http, get_streamable_format
+from src.downloader.postprocess import MediaProcessor, discard_thumbnail
+from src.downloader import net_limits
+from src.handlers.link_batch import LinkBatch, MessageStatus
+from src.handlers.progress_reporter import ProgressReporter
+
+# Reinicios tras los que un trabajo se da por fallido (evita bucles si un enlace tumba el bot)
+MAX_JOB_ATTEMPTS = 3
+# Los trabajos terminados se guardan una semana en el journal
+JOB_RETENTION = 7 * 24 * 3600
+# Cada cuánto se recalcula la posición de un trabajo que espera en la cola local
+QUEUE_POSITION_INTERVAL = 2
 
 class LinkHandler:
     def __init__(self, client, config):
@@ -15,174 +40,760 @@ class LinkHandler:
         self.config = config
         self.logger = setup_logger('LinkHandler')
         self.messenger = TelegramMessenger(client, config)
-        self.file_manager = FileManager()
+        self.file_manager = FileManager(config)
         self.db_manager = DatabaseManager()
+        self.scheduler = DownloadScheduler(config)
+        self.media_cache = MediaCache(self.db_manager)
+        self.prober = MediaProber(config)
+        self.upload_engine = UploadEngine(client, config)
+        self.media_processor = MediaProcessor(config)
+        self.limiter = net_limits.configure(config)
+        self.progress = ProgressReporter(config.progress_interval)
+        self.flights = SingleFlight()
+        self.catalog = get_catalog(config)
+        self.retention = RetentionManager(self.file_manager, config, on_evict=self._forget_file)
+        self.link_filter = LinkFilter(config)
+        self.ytdlp_maintenance = YtdlpMaintenance(
+            config, is_idle=lambda: not self.scheduler.in_flight() and not self.scheduler.queue_depth())
+        self._register_metrics()
+
+    def _register_metrics(self):
+        metrics.callback('download_queue_depth', 'Descargas esperando en cola', self.scheduler.queue_depth)
+        metrics.callback('download_in_flight', 'Descargas ejecutándose', self.scheduler.in_flight)
+        metrics.callback('links_in_flight', 'Enlaces distintos en curso (single-flight)', self.flights.in_flight)
+        metrics.callback('downloads_ephemeral_bytes', 'Bytes en downloads/ sujetos a retención',
+                         lambda: self.retention.usage()[0])
+        metrics.callback('downloads_persistent_bytes', 'Bytes en downloads/persist',
+                         lambda: self.retention.usage()[1])
+
+    def _forget_file(self, filepath):
+        """A file was deleted (by retention or by the user): drop it from the cache and the catalog."""
+        self.media_cache.forget_file(filepath)
+        self.catalog.forget_path(filepath)
 
     def register_handlers(self):
+        self.retention.start()
+        self.catalog.start()
+        self.ytdlp_maintenance.start()
+        self.link_filter.start()
+        asyncio.create_task(self._resume_jobs())
+
         @self.client.on(events.NewMessage(incoming=True))
         async def handle_incoming_message(event):
             """Handle incoming messages with links."""
             try:
                 message = event.message
-                if message.text:
-                    all_links = self._extract_all_links(message.text)
-                    if all_links:
-                        for link in all_links:
-                            await self._process_link(message, link)
-                    else:
-                        self.logger.info(f"No links found in the message. {message.text} ")
+                urls = extract_urls(message)
+                if not urls:
+                    self.logger.debug(f"No links found in message {message.id} from chat {message.chat_id}")
+                    return
+                all_links, unsupported = await self.link_filter.split(urls)
+                if unsupported:
+                    self.logger.info(f"Rejected {len(unsupported)} unsupported links from chat {message.chat_id}")
+                    await self.messenger.send_message(
+                        message.chat_id, "❌ Enlace no soportado:\n" + "\n".join(unsupported))
+                if len(all_links) == 1:
+                    await self._process_single_link(message, all_links[0])
+                elif all_links:
+                    await self._process_links(message, all_links)
             except Exception as e:
                 self.logger.error(f"Error handling link message: {e}")
 
-        @self.client.on(events.CallbackQuery)
+        @self.client.on(events.CallbackQuery(pattern=rb'^(persist|delete):'))
         async def handle_callback(event):
-            """Handle callback queries from inline buttons."""
+            """Handle the persist/delete inline buttons (callback data carries the catalog id)."""
             try:
-                data = event.data.decode('utf-8')
-                if data.startswith('persist:'):
-                    filename = data.split(':', 1)[1]
-                    filepath = os.path.join('downloads', filename)
-                    if self.file_manager.persist_file(filepath):
-                        await event.answer("✅ Archivo persistido correctamente")
-                        await event.edit("", buttons=None)
-                    else:
-                        await event.answer("❌ Error al persistir archivo")
-                elif data.startswith('delete:'):
-                    filename = data.split(':', 1)[1]
-                    filepath = os.path.join('downloads', filename)
-                    if self.file_manager.delete_file(filepath):
-                        await event.answer("🗑️ Archivo eliminado correctamente")
-                        await event.edit("", buttons=None)
+                action, token = event.data.decode('utf-8').split(':', 1)
+                entry = self._resolve_artifact(token)
+                if entry is None:
+                    await self.messenger.answer_callback(event, "❌ Archivo no encontrado")
+                elif action == 'persist':
+                    persist_path = os.path.join(self.file_manager.persist_dir, os.path.basename(entry.path))
+                    if await asyncio.to_thread(self.file_manager.persist_file, entry.path):
+                        self.catalog.mark_persisted(entry, persist_path)
+                        await self.messenger.answer_callback(event, "✅ Archivo persistido correctamente")
+                        await self._consume_button(event)
                     else:
-                        await event.answer("❌ Error al eliminar archivo")
+                        await self.messenger.answer_callback(event, "❌ Error al persistir archivo")
                 else:
-                    await event.answer("Acción desconocida")
+                    if self.file_manager.delete_file(entry.path):
+                        self.retention.forget(entry.path)
+                        self._forget_file(entry.path)
+                        await self.messenger.answer_callback(event, "🗑️ Archivo eliminado correctamente")
+                        await self._consume_button(event)
+                    else:
+                        await self.messenger.answer_callback(event, "❌ Error al eliminar archivo")
             except Exception as e:
                 self.logger.error(f"Error handling callback: {e}")
-                await event.answer("❌ Error procesando acción")
+                await self.messenger.answer_callback(event, "❌ Error procesando acción")
 
+    def _resolve_artifact(self, token):
+        """Catalog entry for a button token; buttons sent before the catalog carry the file name."""
+        entry = self.catalog.get(token)
+        if entry is None:
+            legacy_path = os.path.join('downloads', os.path.basename(token))
+            if os.path.exists(legacy_path):
+                entry = self.catalog.ensure(legacy_path)
+        return entry
 
-    def _extract_all_links(self, text):
-        """Extract all URLs from text."""
-        pattern = r'https?://[^\s]+'
-        return re.findall(pattern, text)
+    def _file_buttons(self, link, filename, label=""):
+        """Persist/delete button row for a downloaded file."""
+        entry = self.catalog.ensure(filename, source_url=link)
+        return [Button.inline(f"💾 Persistir{label}", f"persist:{entry.id}"),
+                Button.inline(f"🗑️ Borrar{label}", f"delete:{entry.id}")]
 
-    async def _process_link(self, message, link):
-        """Download video from link using yt-dlp."""
-       
+    async def _consume_button(self, event):
+        """Remove the pressed button's row; clear the keyboard if it was the last one."""
+        message = await event.get_message()
+        rows = [
+            [Button.inline(button.text, button.data) for button in row]
+            for row in (message.buttons or [])
+            if not any(button.data == event.data for button in row)
+        ]
+        if rows:
+            await self.messenger.edit_callback_message(event, buttons=rows)
+        else:
+            await self.messenger.edit_callback_message(event, "", buttons=None)
+
+    async def _process_single_link(self, message, link):
+        """Process one link with its own progress message."""
+        self.logger.info(f"Processing link: {link}")
         try:
-            self.logger.info(f"Processing link: {link}")
             proccess_msg = await self.messenger.send_message(message.chat_id,
                 f"Descargando video de: {link}", parse_mode='md')
+        except Exception as e:
+            self.logger.error(f"Error sending progress message: {e}")
+            return
+        await self._notify_request(message, [link])
+        status = MessageStatus(self.messenger, proccess_msg)
+        status.job_id = self._create_job(message, link, proccess_msg)
+        await self._process_job(message, link, status)
+
+    async def _process_links(self, message, links):
+        """Process several links concurrently with one consolidated status message."""
+        self.logger.info(f"Processing {len(links)} links")
+        batch = LinkBatch(self.messenger, message.chat_id, links, self.config.progress_interval)
+        await batch.start()
+        await self._notify_request(message, links)
+        for index, link in enumerate(links):
+            batch.item(index).job_id = self._create_job(message, link, batch.message)
+        await self._run_batch(message, batch)
+
+    async def _run_batch(self, message, batch):
+        """Run every link of the batch, then send the album and the final state."""
+        semaphore = asyncio.Semaphore(self.config.links_per_message_concurrency)
+
+        async def run(index, link):
+            async with semaphore:
+                await self._process_job(message, link, batch.item(index))
+
+        await asyncio.gather(*(run(index, link) for index, link in enumerate(batch.links)),
+                             return_exceptions=True)
+        await self._send_album(message, batch)
+        for callback in batch.on_sent:
+            callback()
+        await batch.finish()
+
+    # --- journal de trabajos ---
+
+    def _create_job(self, message, link, status_message):
+        """Record the job in the journal; returns its id (None if the journal is unavailable)."""
+        try:
+            return self.db_manager.create_job(message.chat_id, link, message.id,
+                                              status_message.id if status_message else None)
+        except Exception as e:
+            self.logger.error(f"Error recording job for {link}: {e}")
+            return None
+
+    def _journal(self, status, state, **fields):
+        if status.job_id is None:
+            return
+        try:
+            self.db_manager.update_job(status.job_id, state=state, **fields)
+        except Exception as e:
+            self.logger.error(f"Error updating job {status.job_id}: {e}")
+
+    def _complete_job(self, status):
+        """Mark the job done or failed; in a batch, only once the album has been sent."""
+        def complete():
+            if status.final_text:
+                self._journal(status, JOB_FAILED, error=status.final_text)
+            else:
+                self._journal(status, JOB_DONE)
+
+        if status.batch is not None:
+            status.batch.on_sent.append(complete)
+        else:
+            complete()
+
+    def _journal_hook(self, status, progress_hook):
+        """Wrap the yt-dlp progress hook to record the .part path once it is known."""
+        if status.job_id is None or progress_hook is None:
+            return progress_hook
+        recorded = []
+
+        def hook(d):
+            part_path = d.get('tmpfilename')
+            if part_path and not recorded:
+                recorded.append(part_path)
+                self._journal(status, JOB_DOWNLOADING, part_path=part_path)
+            progress_hook(d)
+        return hook
+
+    async def _process_job(self, message, link, status):
+        """
+        Process a journaled link. If the bot stops mid-way the job stays unfinished
+        and is resumed on the next startup.
+        """
+        try:
+            await self._process_link(message, link, status)
+        except Exception as e:
+            status.final_text = status.final_text or f"❌ {e}"
+            self._complete_job(status)
+            raise
+        self._complete_job(status)
+
+    async def _resume_jobs(self):
+        """Re-queue the jobs interrupted by a restart, re-attaching to their progress messages."""
+        try:
+            self.db_manager.prune_jobs(time.time() - JOB_RETENTION)
+            jobs = self.db_manager.get_unfinished_jobs()
+        except Exception as e:
+            self.logger.error(f"Error reading job journal: {e}")
+            return
+        if not jobs:
+            return
+        self.logger.info(f"Resuming {len(jobs)} interrupted jobs")
 
+        groups = OrderedDict()
+        for job in jobs:
+            groups.setdefault((job.chat_id, job.status_message_id), []).append(job)
+        for (chat_id, status_message_id), group in groups.items():
+            asyncio.create_task(self._resume_group(chat_id, status_message_id, group))
+
+    async def _resume_group(self, chat_id, status_message_id, jobs):
+        try:
+            for job in jobs:
+                if job.part_path and os.path.exists(job.part_path):
+                    self.logger.info(f"Job {job.id}: resuming {job.link} from "
+                                     f"{os.path.getsize(job.part_path)} bytes ({job.part_path})")
+
+            exhausted = [job for job in jobs if job.attempts + 1 >= MAX_JOB_ATTEMPTS]
+            jobs = [job for job in jobs if job.attempts + 1 < MAX_JOB_ATTEMPTS]
+            for job in exhausted:
+                self.db_manager.update_job(job.id, state=JOB_FAILED, error="Demasiados reinicios")
+            for job in jobs:
+                self.db_manager.update_job(job.id, attempts=job.attempts + 1)
+
+            request_message, status_message = await self._get_job_messages(
+                chat_id, exhausted[0] if exhausted else jobs[0], status_message_id)
+            if exhausted:
+                await self.messenger.send_message(
+                    chat_id, "❌ No se pudo completar tras varios reinicios:\n" +
+                    "\n".join(job.link for job in exhausted))
+            if not jobs:
+                return
+
+            if len(jobs) == 1:
+                job = jobs[0]
+                if status_message is None:
+                    status_message = await self.messenger.send_message(
+                        chat_id, f"Descargando video de: {job.link}", parse_mode='md')
+                    self.db_manager.update_job(job.id, status_message_id=status_message.id)
+                status = MessageStatus(self.messenger, status_message)
+                status.job_id = job.id
+                await status.update(f"🔄 Reanudando tras un reinicio: {job.link}")
+                # Solo se usa el chat del mensaje original; si ya no existe vale el de progreso
+                await self._process_job(request_message or status_message, job.link, status)
+                return
+
+            batch = LinkBatch(self.messenger, chat_id, [job.link for job in jobs], self.config.progress_interval)
+            batch.lines = ["🔄 Reanudando tras un reinicio"] * len(jobs)
+            await batch.start(status_message)
+            for index, job in enumerate(jobs):
+                batch.item(index).job_id = job.id
+                if status_message is None:
+                    self.db_manager.update_job(job.id, status_message_id=batch.message.id)
+            await self._run_batch(request_message or batch.message, batch)
+        except Exception as e:
+            self.logger.error(f"Error resuming jobs in chat {chat_id}: {e}")
+
+    async def _get_job_messages(self, chat_id, job, status_message_id):
+        """Fetch the original request and progress messages (None if they were deleted)."""
+        ids = [job.request_message_id, status_message_id]
+        try:
+            messages = await self.client.get_messages(chat_id, ids=[i for i in ids if i])
+        except Exception as e:
+            self.logger.warning(f"Error fetching messages of job {job.id}: {e}")
+            return None, None
+        by_id = {m.id: m for m in messages if m is not None}
+        return by_id.get(job.request_message_id), by_id.get(status_message_id)
+
+    async def _notify_request(self, message, links):
+        """Notify the owner about a download request (one message for all links)."""
+        try:
+            if (self.config.user_id != message.chat_id):
+                # Obtener información del usuario que solicita
+                msg_info = MessageInfo(message)
+                sender = msg_info.get_sender_info()
+                user_info = f"👤 Usuario: {sender['first_name'] or 'Unknown'}"
+                if sender['username']:
+                    user_info += f" (@{sender['username']})"
+                user_info += f" - ID: `{sender['id']}`"
+                user_info += f"\n📍 Chat: `{msg_info.get_chat_id()}` ({msg_info.get_chat_type()})"
+
+                if len(links) == 1:
+                    links_text = f"🔗 Link: {links[0]}"
+                else:
+                    links_text = f"🔗 Links ({len(links)}):\n" + "\n".join(f"• {link}" for link in links)
+
+                # Notificar al usuario
+                notification = f"🎥 **Nueva descarga solicitada**\n\n{user_info}\n\n{links_text}"
+                await self.messenger.send_notification_to_me(notification, parse_mode='md')
+        except Exception as e:
+            self.logger.error(f"Error notifying user: {e}")
+
+    async def _process_link(self, message, link, status):
+        """Download video from link using yt-dlp, reporting live progress on the status."""
+        # El tracker lo usan también los seguidores al subir el archivo del líder
+        tracker = self.progress.track(status)
+        try:
+            # Single-flight: si el mismo enlace ya está en curso, esperar a su resultado
+            url_key = canonical_url(link)
+            flight = self.flights.join(url_key)
+            if flight is not None:
+                try:
+                    await self._follow_flight(message, link, status, flight,
+                                              lambda: self.media_cache.lookup_url(link))
+                except Exception as e:
+                    self.logger.error(f"Error following in-flight download: {e}")
+                    await status.fail(f"❌ Error descargando video de: {str(e)}")
+                return
+
+            flight_keys = [url_key]
+            pinned = []
+            self.flights.lead(url_key, owner=status.batch)
             try:
-                if (self.config.user_id != message.chat_id):
-                    # Obtener información del usuario que solicita
-                    msg_info = MessageInfo(message)
-                    sender = msg_info.get_sender_info()
-                    user_info = f"👤 Usuario: {sender['first_name'] or 'Unknown'}"
-                    if sender['username']:
-                        user_info += f" (@{sender['username']})"
-                    user_info += f" - ID: `{sender['id']}`"
-                    user_info += f"\n📍 Chat: `{msg_info.get_chat_id()}` ({msg_info.get_chat_type()})"
-                    
-                    # Notificar al usuario
-                    notification = f"🎥 **Nueva descarga solicitada**\n\n{user_info}\n\n🔗 Link: {link}"
-                    await self.messenger.send_notification_to_me(notification, parse_mode='md')
-            except Exception as e:
-                self.logger.error(f"Error notifying user: {e}")
-
-            # Configure yt-dlp
-            ydl_opts = {
-                'outtmpl': os.path.join('downloads', '%(title)s.%(ext)s'),
-                'format': 'best',  # Best available format
-                'http_headers': {
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-                },
-                'update_self': True
-            }
+                with metrics.timer('total'):
+                    await self._run_link(message, link, status, tracker, flight_keys, pinned)
+            finally:
+                self._release(flight_keys, pinned, status)
+        finally:
+            self.progress.untrack(tracker)
+
+    def _release(self, keys, pinned, status):
+        """
+        Wake up followers as soon as this link's file is ready (in a batch, before the
+        album is sent, so batches following each other can't deadlock); unpin files
+        only once the album has been sent.
+        """
+        result = {'error': status.final_text, 'filename': pinned[-1] if pinned else None}
+        for key in keys:
+            self.flights.land(key, result)
+
+        def unpin():
+            for path in pinned:
+                self.retention.unpin(path)
+
+        if status.batch is not None:
+            status.batch.on_sent.append(unpin)
+        else:
+            unpin()
 
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(link, download=True)
-                filename = ydl.prepare_filename(info)
+    async def _follow_flight(self, message, link, status, flight, lookup, cache_key=None):
+        """
+        Wait for the in-flight leader, then re-send its upload by file reference, or
+        upload the leader's local file when it has not been sent yet (batch leaders
+        send their album later).
+        """
+        if flight.owner is not None and flight.owner is status.batch:
+            # El líder está en este mismo mensaje: esperarle bloquearía el lote
+            await status.fail("🔁 Enlace repetido en este mensaje")
+            return
+
+        await status.update("🔁 Este video ya se está descargando, esperando...")
+        result = await asyncio.shield(flight.future) or {}
+        if await self._deliver_cached(message, link, lookup(), status):
+            if cache_key:
+                self.media_cache.add_url(link, cache_key)
+            return
+        filename = result.get('filename')
+        if not result.get('error') and filename and os.path.exists(filename):
+            self.retention.pin(filename)
+            try:
+                await self._deliver(message, link, filename, filename, None, status)
+            finally:
+                self.retention.unpin(filename)
+            return
+        await status.fail(result.get('error') or "❌ Error descargando video")
+
+    async def _run_link(self, message, link, status, tracker, flight_keys, pinned):
+        """Download video from link using yt-dlp."""
+
+        media = None
+        try:
+            # Reenviar desde la caché si ya se descargó antes
+            if await self._deliver_cached(message, link, self.media_cache.lookup_url(link), status):
+                return
+
+            ydl_opts = self._build_ydl_opts(link)
+
+            # Probe: metadatos sin descargar para elegir un formato que quepa
+            self._journal(status, JOB_PROBING)
+            with metrics.timer('extract'):
+                info = await self.prober.probe(link, ydl_opts)
+            cache_key = cache_key_from_info(info)
+
+            # Otra URL del mismo contenido ya subida: reenviar por referencia
+            cached = self.media_cache.lookup_key(cache_key)
+            if cached and await self._deliver_cached(message, link, cached, status):
+                self.media_cache.add_url(link, cache_key)
+                return
+
+            # Otra URL del mismo contenido descargándose ahora mismo
+            flight = self.flights.join(cache_key)
+            if flight is not None:
+                await self._follow_flight(message, link, status, flight,
+                                          lambda: self.media_cache.lookup_key(cache_key), cache_key)
+                return
+            self.flights.lead(cache_key, owner=status.batch)
+            flight_keys.append(cache_key)
+
+            max_size = self.config.max_upload_bytes
+            publish_only = False
+            format_selector = select_format(info, max_size)
+            if format_selector is None:
+                estimated = best_estimated_size(info)
+                if estimated is not None and estimated > self.config.max_download_bytes:
+                    error_msg = f"❌ Archivo demasiado grande ({estimated / (1024*1024):.1f}MB). No se descargará"
+                    self.logger.warning(f"Rejected before download: {link} (~{estimated} bytes)")
+                    await status.fail(error_msg)
+                    await status.notify_owner(f"Archivo rechazado por tamaño: {link}")
+                    return
+                # No cabe en Telegram: descargar el mejor formato y publicarlo en www
+                publish_only = True
+                format_selector = 'best'
+            ydl_opts['format'] = format_selector
+
+            # MP4 progresivo: subir mientras se descarga, sin pasar por disco
+            stream_format = None
+            if not publish_only and self.config.streaming_upload and self.scheduler.executor_kind == 'thread':
+                stream_format = get_streamable_format(info, format_selector, self.config.streaming_min_bytes)
+            if stream_format:
+                self._journal(status, JOB_DOWNLOADING)
+                streamed = await self._stream_link(message, link, info, stream_format, status)
+                if streamed is not None:
+                    self._journal(status, JOB_UPLOADING)
+                    input_file, media = streamed
+                    await self._deliver(message, link, input_file, None, cache_key, status, media)
+                    return
+
+            # Comprobar espacio en disco antes de admitir la descarga
+            if not await self.retention.admit(selected_size(info, format_selector)):
+                await status.fail("❌ No hay espacio en disco para descargar el video. Inténtalo más tarde")
+                await status.notify_owner(f"Descarga rechazada por falta de espacio: {link}")
+                return
+
+            # Encolar la descarga en el pool para no bloquear el event loop
+            # Los hooks de progreso no se pueden enviar a otro proceso
+            progress_hook = tracker.on_download if self.scheduler.executor_kind == 'thread' else None
+            progress_hook = self._journal_hook(status, progress_hook)
+            self._journal(status, JOB_DOWNLOADING)
+            job = self.scheduler.submit(message.chat_id, run_download, link, ydl_opts, info, progress_hook,
+                                        host=net_limits.host_of(link))
+            await self._wait_in_queue(job, status, link)
+            result = await job
+            filename = result['filename']
 
             self.logger.info(f"Downloaded: {filename}")
-            
-            # Verificar tamaño del archivo (límite de Telegram: 50MB para bots)
+            if job.run_time is not None:
+                metrics.observe_stage('download', job.run_time)
+                metrics.observe_transfer('download', os.path.getsize(filename), job.run_time)
+
+            # Protegerlo de la retención ya, el post-proceso puede tardar hasta MEDIA_TIMEOUT
+            self.retention.register(filename)
+            self.retention.pin(filename)
+            pinned.append(filename)
+
+            # MP4 faststart, reencode si no cabe, miniatura y atributos de vídeo
+            if self.media_processor.enabled:
+                await status.update(f"🎞️ Procesando video: {link}")
+            media = await self.media_processor.process(filename, max_size)
+            if media is not None:
+                if media['filename'] != filename:
+                    # process_media sustituyó el original (remux o reencode)
+                    self.retention.forget(filename)
+                    filename = media['filename']
+                    self.retention.pin(filename)
+                    pinned.append(filename)
+                self.retention.register(filename)
+                publish_only = publish_only and os.path.getsize(filename) > max_size
+            self.catalog.ensure(filename, link, message.chat_id, message.sender_id)
+
+            if publish_only:
+                discard_thumbnail(media)
+                await status.fail(f"❌ Archivo demasiado grande para Telegram (límite {max_size / (1024*1024):.0f}MB)")
+                await self._publish_to_www(link, filename, "Ningún formato cabe en el límite de Telegram", status)
+                return
+
+            # Verificar tamaño real del archivo (la estimación del probe puede fallar)
             file_size = os.path.getsize(filename)
-            max_size = 50 * 1024 * 1024  # 50MB en bytes
-            
+
             if file_size > max_size:
-                error_msg = f"❌ Archivo demasiado grande ({file_size / (1024*1024):.1f}MB). Límite de Telegram: 50MB"
+                error_msg = f"❌ Archivo demasiado grande ({file_size / (1024*1024):.1f}MB). Límite de Telegram: {max_size / (1024*1024):.0f}MB"
                 self.logger.warning(f"File too large: {filename} ({file_size} bytes)")
-                
+
                 # Eliminar archivo y notificar
+                discard_thumbnail(media)
                 os.remove(filename)
-                await self.messenger.edit_message(proccess_msg, error_msg)
-                await self.messenger.send_notification_to_me(f"Archivo rechazado por tamaño: {link}", parse_mode='md')
+                self.retention.forget(filename)
+                self._forget_file(filename)
+                await status.fail(error_msg)
+                await status.notify_owner(f"Archivo rechazado por tamaño: {link}")
                 return
-            
+
             # Actualizar mensaje de progreso
-            await self.messenger.edit_message(proccess_msg, "✅ Video descargado, enviando...")
-            
-    
+            await status.update("✅ Video descargado, enviando...")
+
+
 
         except Exception as e:
             error_msg = f"Error descargando video de: {str(e)}"
             self.logger.error(f"Error downloading video: {e}")
-            
-            # Intentar actualizar mensaje de progreso si existe
+            discard_thumbnail(media)
+
+            # Intentar actualizar mensaje de progreso
             try:
-                if 'proccess_msg' in locals():
-                    await self.messenger.edit_message(proccess_msg, f"❌ {error_msg}")
+                await status.fail(f"❌ {error_msg}")
             except:
-                pass  
-            await self.messenger.send_notification_to_me(error_msg, parse_mode='md')
+                pass
+            await status.notify_owner(error_msg)
+            return
 
         try:
-            # Crear botones inline
-            buttons = [
-                [Button.inline("💾 Persistir", f"persist:{os.path.basename(filename)}"),
-                Button.inline("🗑️ Borrar", f"delete:{os.path.basename(filename)}")]
-            ]
-
             # Enviar video al chat de origen con botones
-            await self.client.send_file(
-                message.chat_id,
-                filename,
-                caption=f"Video descargado de:\n{link}\n\nElige qué hacer con el archivo:",
-                parse_mode='markdown',
-                supports_streaming=True,
-                spoiler=True,
-                buttons=buttons
-            )
-
-            # Eliminar mensaje de progreso
-            await self.messenger.delete_message(proccess_msg)
+            self._journal(status, JOB_UPLOADING)
+            await self._deliver(message, link, filename, filename, cache_key, status, media)
+
+        except Exception as e:
+            self.logger.error(f"Error sending video: {e}")
+            await status.fail("❌ Error enviando video")
+            await self._publish_to_www(link, filename, str(e), status)
+
+    def _build_ydl_opts(self, link):
+        """Base yt-dlp options shared by the probe and the download, with the site's headers and cookies."""
+        return {
+            'outtmpl': os.path.join('downloads', '%(title)s [%(id)s].%(ext)s'),
+            'format': 'best',  # Best available format
+            'continuedl': True,  # Reanudar .part existentes (p. ej. tras un reinicio)
+            **self.limiter.ydl_opts(link),
+        }
+
+    async def _publish_to_www(self, link, filename, reason, status):
+        """Copy the file to www and send the owner a download link."""
+        ## creamos el link
+        video_link = self.file_manager.get_www_url(os.path.basename(filename))
+
+        # publicar el archivo en www (hardlink/reflink, copia solo como último recurso; el original se queda)
+        with metrics.timer('publish'):
+            await self.file_manager.publish_to_www(filename)
+
+        error_details = (
+            f"ALTER-EGO\n\n"
+            f"❌ **Error enviando video**\n\n"
+            f"**Error:** {reason}\n\n"
+            f"🔍 **Buscando solución alternativa...**\n\n"
+            f"📋 **Detalles técnicos:**\n"
+            f"• **Link original:** {link}\n"
+            f"• **Link descarga:** [📥 Descargar archivo]({video_link})\n"
+        )
+        await status.notify_owner(error_details)
+
+    async def _wait_in_queue(self, job, status, link):
+        """
+        Show the job's queue position and keep it current until it starts running.
+        Only for the local backend: with a queue backend the bot does not see the
+        workers' queue, so a position would mean nothing.
+        """
+        if self.scheduler.executor_kind == 'queue':
+            return
+        shown = None
+        while not job.future.done():
+            position = self.scheduler.position(job)
+            if not position:
+                return
+            if position != shown:
+                await status.update(f"⏳ En cola (posición {position}): {link}", wait=False)
+                shown = position
+            await asyncio.wait({job.future}, timeout=QUEUE_POSITION_INTERVAL)
+
+    async def _stream_link(self, message, link, info, fmt, status):
+        """
+        Download a progressive format straight into the uploader through a bounded buffer.
+        Returns the uploaded InputFile and its video attributes, or None so the caller
+        falls back to a normal download. The file skips MediaProcessor, so the attributes
+        come from the extractor and it is only flagged as streamable when it is already
+        faststart.
+        """
+        buffer = StreamBuffer(self.config.streaming_window)
+        host = net_limits.host_of(link)
+        job = self.scheduler.submit(message.chat_id, stream_http, fmt['url'], fmt.get('http_headers'),
+                                    self.upload_engine.part_size, buffer, host, host=host)
+        job.future.add_done_callback(lambda f: buffer.finish(IOError("Stream cancelado")) if f.cancelled() else None)
+        title = re.sub(r'[\\/:*?"<>|]', '_', info.get('title') or str(info.get('id')))
+        try:
+            self.logger.info(f"Streaming {link} ({fmt.get('format_id')})")
+            input_file = await self.upload_engine.upload_stream(
+                buffer, f"{title}.mp4", fmt.get('filesize') or fmt.get('filesize_approx'),
+                progress_callback=status.tracker.on_upload)
+            await job
+            if job.run_time is not None:
+                metrics.observe_stage('stream', job.run_time)
+                metrics.observe_transfer('download', buffer.total_bytes, job.run_time)
+            media = {
+                'filename': f"{title}.mp4",
+                'duration': int(round(info.get('duration') or 0)),
+                'width': fmt.get('width') or info.get('width') or 0,
+                'height': fmt.get('height') or info.get('height') or 0,
+                'thumb': None,
+                'streaming': buffer.faststart,
+            }
+            return input_file, media
+        except Exception as e:
+            buffer.close()
+            self.logger.warning(f"Streaming failed for {link}, falling back to download: {e}")
+            return None
+
+    async def _deliver(self, message, link, file, filename, cache_key, status, media=None):
+        """
+        Send a ready video: right away for a single link, or collected into the
+        batch album when the link is part of a multi-link message.
+        media carries the MediaProcessor attributes and thumbnail, when available.
+        """
+        if media is not None:
+            file = await self._attach_media(file, media, status)
+        if status.batch is not None:
+            if isinstance(file, str):
+                file = await self.upload_engine.upload(file, progress_callback=status.tracker.on_upload)
+            status.batch.add_result(status.index, file, filename, cache_key)
+            await status.update("📦 Listo, pendiente de enviar")
+            return
+
+        sent = await self._send_video(message.chat_id, link, file, filename,
+                                      progress_callback=status.tracker.on_upload)
+        await self._remember_upload(cache_key, link, filename, sent)
+
+        # Eliminar mensaje de progreso
+        await status.finish()
 
+    async def _attach_media(self, file, media, status):
+        """Upload the file and wrap it with its video attributes and thumbnail."""
+        try:
+            if isinstance(file, str):
+                file = await self.upload_engine.upload(file, progress_callback=status.tracker.on_upload)
+            return await self.upload_engine.video_media(file, media, spoiler=status.batch is None)
+        finally:
+            discard_thumbnail(media)
+
+    async def _remember_upload(self, cache_key, link, filename, sent):
+        """Guardar en caché con la referencia de Telegram para reutilizarla."""
+        if cache_key is None:
+            return
+        try:
+            if filename and os.path.exists(filename):
+                await self.media_cache.store(cache_key, link, filename)
+            else:
+                self.media_cache.store_remote(cache_key, link)
+            self.media_cache.remember_upload(cache_key, sent)
         except Exception as e:
+            self.logger.error(f"Error caching {cache_key}: {e}")
 
-            ## creamos el link
-            video_link = f"http://portal.davidperezmillan.com/grande/downloads/{urllib.parse.quote(os.path.basename(filename))}"
+    async def _send_album(self, message, batch):
+        """Send the batch results grouped in albums of up to 10, with one keyboard message per album."""
+        for start in range(0, len(batch.results), 10):
+            group = batch.results[start:start + 10]
+            if len(group) == 1:
+                await self._send_batch_result(message, batch, group[0])
+                continue
+            try:
+                sent = await self.messenger.send_file(
+                    message.chat_id,
+                    [result['file'] for result in group],
+                    caption=[f"{result['index'] + 1}. Video descargado de:\n{result['link']}" for result in group],
+                    parse_mode='markdown',
+                    supports_streaming=True
+                )
+            except Exception as e:
+                self.logger.error(f"Error sending album, sending videos one by one: {e}")
+                for result in group:
+                    await self._send_batch_result(message, batch, result)
+                continue
 
-            # copiar el archivo a app/www
-            self.file_manager.copy_file_to_www(filename)
+            for result, sent_message in zip(group, sent):
+                await self._remember_upload(result['cache_key'], result['link'], result['filename'], sent_message)
+                await batch.item(result['index']).finish()
 
+            buttons = [
+                self._file_buttons(result['link'], result['filename'], f" {result['index'] + 1}")
+                for result in group if result['filename']
+            ]
+            if buttons:
+                await self.messenger.send_message(message.chat_id, "Elige qué hacer con los archivos:", buttons=buttons)
 
+    async def _send_batch_result(self, message, batch, result):
+        """Send one batch result on its own, falling back to www publishing."""
+        status = batch.item(result['index'])
+        try:
+            sent = await self._send_video(message.chat_id, result['link'], result['file'], result['filename'])
+            await self._remember_upload(result['cache_key'], result['link'], result['filename'], sent)
+            await status.finish()
+        except Exception as e:
             self.logger.error(f"Error sending video: {e}")
-            error_details = (
-                f"ALTER-EGO\n\n"
-                f"❌ **Error enviando video**\n\n"
-                f"**Error:** {str(e)}\n\n"
-                f"🔍 **Buscando solución alternativa...**\n\n"
-                f"📋 **Detalles técnicos:**\n"
-                f"• **Link original:** {link}\n"
-                f"• **Link descarga:** [📥 Descargar archivo]({video_link})\n"
-            )
-            await self.messenger.send_notification_to_me(error_details, parse_mode='md')
-
-    def _extract_xvideos_links(self, text):
-
-        """Extract xvideos.com links from text."""
-        pattern = r'https?://(?:www\.)?xvideos\.com/video[^/\s]+/[^/\s]*'
-        return re.findall(pattern, text)
\ No newline at end of file
+            await status.fail("❌ Error enviando video")
+            if result['filename'] and os.path.exists(result['filename']):
+                await self._publish_to_www(result['link'], result['filename'], str(e), status)
+
+    async def _send_video(self, chat_id, link, file, filename, progress_callback=None):
+        """Send a video (local path, uploaded InputFile or InputDocument) with the persist/delete buttons."""
+        if isinstance(file, str):
+            # Subida en partes y en paralelo antes de enviar
+            file = await self.upload_engine.upload(file, progress_callback=progress_callback)
+
+        buttons = None
+        if filename:
+            # Crear botones inline (solo llevan el id del catálogo)
+            buttons = [self._file_buttons(link, filename)]
+
+        return await self.messenger.send_file(
+            chat_id,
+            file,
+            caption=f"Video descargado de:\n{link}\n\nElige qué hacer con el archivo:",
+            parse_mode='markdown',
+            supports_streaming=True,
+            spoiler=True,
+            buttons=buttons
+        )
+
+    async def _deliver_cached(self, message, link, entry, status):
+        """Re-send a cached video by Telegram file reference. Returns True on success."""
+        document = self.media_cache.get_input_document(entry)
+        if document is None:
+            return False
+        local_file = self.media_cache.get_local_file(entry)
+        if local_file:
+            self.retention.touch(local_file)
+        if status.batch is not None:
+            # Sin cache_key: la entrada ya existe y no hay nada nuevo que guardar
+            status.batch.add_result(status.index, document, local_file, None)
+            await status.update("📦 En caché, pendiente de enviar")
+            return True
+        try:
+            await self._send_video(message.chat_id, link, document, local_file)
+            self.logger.info(f"Sent from cache: {entry.cache_key}")
+            await status.finish()
+            return True
+        except Exception as e:
+            # Referencia caducada o inválida: se descargará y subirá de nuevo
+            self.logger.warning(f"Cached file reference failed for {entry.cache_key}: {e}")
+            self.media_cache.forget_upload(entry.cache_key)
+            return False
@@ -0,0 +1,114 @@
+import asyncio
+import time
+from src.config.logger import setup_logger
+
+
+def _format_bytes(value):
+    return f"{value / (1024*1024):.1f}MB"
+
+
+def _format_eta(seconds):
+    seconds = int(seconds)
+    return f"{seconds // 60}:{seconds % 60:02d}"
+
+
+class ProgressTracker:
+    """
+    Progreso de un trabajo (descarga o subida).
+
+    Los hooks solo guardan números: se llaman por cada chunk, a veces desde hilos
+    del pool, así que no formatean texto ni tocan Telegram. El texto lo genera el
+    ProgressReporter como mucho una vez por intervalo.
+    """
+
+    def __init__(self, status):
+        self.status = status
+        self.stage = None
+        self.done = 0
+        self.total = None
+        self.speed = None
+        self.eta = None
+        self.dirty = False
+        self.closed = False
+        self.last_render = 0.0
+        self._upload_started = None
+
+    def on_download(self, d):
+        """progress_hook de yt-dlp."""
+        if d.get('status') != 'downloading':
+            return
+        self.stage = 'download'
+        self.done = d.get('downloaded_bytes') or 0
+        self.total = d.get('total_bytes') or d.get('total_bytes_estimate')
+        self.speed = d.get('speed')
+        self.eta = d.get('eta')
+        self.dirty = True
+
+    def on_upload(self, sent, total):
+        """progress_callback de la subida (Telethon/UploadEngine)."""
+        now = time.monotonic()
+        if self.stage != 'upload':
+            self.stage = 'upload'
+            self._upload_started = now
+        elapsed = now - self._upload_started
+        self.done = sent
+        self.total = total
+        self.speed = sent / elapsed if elapsed > 0 else None
+        self.eta = (total - sent) / self.speed if self.speed and total else None
+        self.dirty = True
+
+    def render(self):
+        label = "⬇️ Descargando" if self.stage == 'download' else "📤 Enviando"
+        parts = [label]
+        if self.total:
+            parts.append(f"{min(self.done * 100 // self.total, 100)}%")
+            parts.append(f"{_format_bytes(self.done)}/{_format_bytes(self.total)}")
+        else:
+            parts.append(_format_bytes(self.done))
+        if self.speed:
+            parts.append(f"{_format_bytes(self.speed)}/s")
+        if self.eta is not None:
+            parts.append(f"ETA {_format_eta(self.eta)}")
+        return " · ".join(parts)
+
+
+class ProgressReporter:
+    """
+    Publica el progreso de todos los trabajos activos con un único ticker.
+
+    Cada `interval` segundos recorre los trackers con cambios y edita su mensaje,
+    así el número de ediciones está acotado a una por mensaje e intervalo
+    independientemente de cuántos chunks lleguen.
+    """
+
+    def __init__(self, interval):
+        self.logger = setup_logger('ProgressReporter')
+        self.interval = interval
+        self._trackers = set()
+        self._task = None
+
+    def track(self, status):
+        tracker = ProgressTracker(status)
+        status.tracker = tracker
+        self._trackers.add(tracker)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return tracker
+
+    def untrack(self, tracker):
+        tracker.closed = True
+        self._trackers.discard(tracker)
+
+    async def _run(self):
+        while self._trackers:
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            for tracker in list(self._trackers):
+                if not tracker.dirty or tracker.closed or now - tracker.last_render < self.interval:
+                    continue
+                tracker.dirty = False
+                tracker.last_render = now
+                try:
+                    await tracker.status.update(tracker.render(), wait=False)
+                except Exception as e:
+                    self.logger.warning(f"Error actualizando progreso: {e}")
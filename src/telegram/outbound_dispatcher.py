@@ -0,0 +1,246 @@
+import asyncio
+import heapq
+import itertools
+import time
+import weakref
+from telethon.errors import FloodWaitError, SlowModeWaitError
+from src.config.logger import setup_logger
+from src.utils.metrics import metrics
+
+# Prioridades: menor número sale antes
+PRIORITY_USER = 0
+PRIORITY_PROGRESS = 1
+PRIORITY_OWNER = 2
+
+_dispatchers = weakref.WeakKeyDictionary()
+
+
+def get_dispatcher(client, config):
+    """Devuelve el dispatcher compartido del cliente (uno por TelegramClient)."""
+    dispatcher = _dispatchers.get(client)
+    if dispatcher is None:
+        dispatcher = OutboundDispatcher(client, config)
+        _dispatchers[client] = dispatcher
+    return dispatcher
+
+
+class TokenBucket:
+    """
+    Token bucket clásico: `rate` tokens por segundo hasta `capacity`.
+    La capacidad es como mínimo 1 (si no, nunca habría un token entero) y rate <= 0
+    significa sin límite.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now):
+        """Segundos hasta que haya un token disponible (0 si ya lo hay)."""
+        if self.rate <= 0:
+            return 0.0
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+
+class OutboundCall:
+    """Llamada pendiente a la API de Telegram."""
+
+    _seq = itertools.count()
+
+    def __init__(self, priority, chat_id, func, args, kwargs, coalesce_key=None):
+        self.priority = priority
+        self.seq = next(self._seq)
+        self.chat_id = chat_id
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.coalesce_key = coalesce_key
+        self.discarded = False
+        self.future = asyncio.get_running_loop().create_future()
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class OutboundDispatcher:
+    """
+    Cola de salida hacia Telegram con límites por chat y globales.
+
+    Las llamadas se ordenan por prioridad y se despachan cuando tanto el bucket del chat
+    como el global tienen tokens. Las ediciones pendientes del mismo mensaje se fusionan
+    (gana la última) y un FloodWaitError bloquea el chat el tiempo indicado y reencola
+    la llamada en vez de fallar.
+    """
+
+    def __init__(self, client, config):
+        self.client = client
+        self.logger = setup_logger('OutboundDispatcher')
+        self.private_rate = config.outbound_private_rate
+        self.group_rate = config.outbound_group_rate
+        self.burst = config.outbound_burst
+        self.global_bucket = TokenBucket(config.outbound_global_rate, config.outbound_global_rate)
+        self.max_in_flight = config.outbound_max_in_flight
+        self._heap = []
+        self._pending_edits = {}
+        self._chat_buckets = {}
+        self._blocked_until = {}
+        self._in_flight = 0
+        self._wakeup = None
+        self._task = None
+        self.counters = {'queued': 0, 'sent': 0, 'coalesced': 0, 'flood_waited': 0, 'failed': 0}
+        for name in self.counters:
+            metrics.callback(f'outbound_{name}_total', f'Llamadas salientes a Telegram: {name}',
+                             lambda name=name: self.counters[name], kind='counter')
+        metrics.callback('outbound_pending', 'Llamadas salientes en cola', lambda: len(self._heap))
+
+    def stats(self):
+        """Contadores y estado actual de la cola."""
+        return dict(self.counters, pending=len(self._heap), in_flight=self._in_flight)
+
+    def submit(self, priority, chat_id, func, *args, coalesce_key=None, **kwargs):
+        """Encola func(*args, **kwargs) y devuelve un future con su resultado."""
+        self._ensure_running()
+        if coalesce_key is not None:
+            pending = self._pending_edits.get(coalesce_key)
+            if pending is not None:
+                # Última escritura gana: se reemplazan los argumentos de la edición pendiente
+                pending.args = args
+                pending.kwargs = kwargs
+                if priority < pending.priority:
+                    pending.priority = priority
+                    heapq.heapify(self._heap)
+                self.counters['coalesced'] += 1
+                return pending.future
+
+        call = OutboundCall(priority, chat_id, func, args, kwargs, coalesce_key)
+        if coalesce_key is not None:
+            self._pending_edits[coalesce_key] = call
+        heapq.heappush(self._heap, call)
+        self.counters['queued'] += 1
+        self._wakeup.set()
+        return call.future
+
+    def discard_edit(self, coalesce_key):
+        """Descarta la edición pendiente (p. ej. porque el mensaje se va a borrar)."""
+        pending = self._pending_edits.pop(coalesce_key, None)
+        if pending is not None:
+            pending.discarded = True
+            if not pending.future.done():
+                pending.future.set_result(None)
+
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            # Telegram: ~1 msg/s por chat privado y ~20 msg/min por grupo
+            rate = self.private_rate if chat_id is None or chat_id > 0 else self.group_rate
+            bucket = TokenBucket(rate, self.burst)
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    def _call_delay(self, call, now):
+        blocked = self._blocked_until.get(call.chat_id, 0) - now
+        return max(blocked, self._chat_bucket(call.chat_id).delay(now))
+
+    def _next_call(self):
+        """Saca la llamada lista de mayor prioridad, o devuelve (None, espera)."""
+        now = time.monotonic()
+        global_delay = self.global_bucket.delay(now)
+        if global_delay:
+            return None, global_delay
+        skipped = []
+        wait = None
+        call = None
+        while self._heap:
+            candidate = heapq.heappop(self._heap)
+            if candidate.discarded:
+                continue
+            delay = self._call_delay(candidate, now)
+            if delay <= 0:
+                call = candidate
+                break
+            skipped.append(candidate)
+            wait = delay if wait is None else min(wait, delay)
+        for candidate in skipped:
+            heapq.heappush(self._heap, candidate)
+        return call, wait
+
+    async def _run(self):
+        while True:
+            if self._in_flight >= self.max_in_flight:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            call, wait = self._next_call()
+            if call is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            now = time.monotonic()
+            self.global_bucket.consume(now)
+            self._chat_bucket(call.chat_id).consume(now)
+            if call.coalesce_key is not None:
+                self._pending_edits.pop(call.coalesce_key, None)
+            self._in_flight += 1
+            asyncio.create_task(self._execute(call))
+
+    async def _execute(self, call):
+        try:
+            result = await call.func(*call.args, **call.kwargs)
+            self.counters['sent'] += 1
+            if not call.future.done():
+                call.future.set_result(result)
+        except (FloodWaitError, SlowModeWaitError) as e:
+            self.counters['flood_waited'] += 1
+            self.logger.warning(f"FloodWait de {e.seconds}s en chat {call.chat_id}, reencolando")
+            self._blocked_until[call.chat_id] = time.monotonic() + e.seconds
+            self._requeue(call)
+        except Exception as e:
+            self.counters['failed'] += 1
+            if not call.future.done():
+                call.future.set_exception(e)
+        finally:
+            self._in_flight -= 1
+            self._wakeup.set()
+
+    def _requeue(self, call):
+        if call.coalesce_key is not None:
+            newer = self._pending_edits.get(call.coalesce_key)
+            if newer is not None:
+                # Ya hay una edición más reciente encolada: esta se descarta
+                newer.future.add_done_callback(lambda f: self._chain(f, call.future))
+                return
+            self._pending_edits[call.coalesce_key] = call
+        heapq.heappush(self._heap, call)
+
+    @staticmethod
+    def _chain(source, target):
+        if target.done():
+            return
+        if source.cancelled():
+            target.cancel()
+        elif source.exception() is not None:
+            target.set_exception(source.exception())
+        else:
+            target.set_result(source.result())
@@ -1,30 +1,69 @@
 from src.config.logger import setup_logger
+from src.telegram.outbound_dispatcher import (
+    get_dispatcher, PRIORITY_USER, PRIORITY_PROGRESS, PRIORITY_OWNER
+)
 
 class TelegramMessenger:
     def __init__(self, client, config):
         self.client = client
         self.config = config
         self.logger = setup_logger('TelegramMessenger')
+        # Todas las llamadas salen por el dispatcher compartido (rate limit + FloodWait)
+        self.dispatcher = get_dispatcher(client, config)
 
     async def send_notification_to_me(self, text, parse_mode=None):
         self.logger.info(f"Sending notification to user {self.config.user_id}: {text}")
-        message = await self.send_message(self.config.user_id, text, parse_mode)
+        message = await self.send_message(self.config.user_id, text, parse_mode, priority=PRIORITY_OWNER)
         return message
 
-    async def send_message(self, chat_id, text, parse_mode=None):
+    async def send_message(self, chat_id, text, parse_mode=None, buttons=None, priority=PRIORITY_USER, **kwargs):
         self.logger.info(f"Sending message to chat {chat_id}: {text}")
-        message = await self.client.send_message(chat_id, text, parse_mode=parse_mode)
+        message = await self.dispatcher.submit(priority, chat_id, self.client.send_message,
+                                               chat_id, text, parse_mode=parse_mode, buttons=buttons, **kwargs)
         return message
 
-    async def edit_message(self, message, new_text, parse_mode=None):
+    async def send_file(self, chat_id, file, priority=PRIORITY_USER, **kwargs):
+        self.logger.info(f"Sending file to chat {chat_id}")
+        return await self.dispatcher.submit(priority, chat_id, self.client.send_file, chat_id, file, **kwargs)
+
+    async def edit_message(self, message, new_text, parse_mode=None, wait=True):
+        """
+        Edita el mensaje. Las ediciones pendientes del mismo mensaje se fusionan y solo
+        se envía el último texto. Con wait=False no espera a que la edición salga.
+        """
         self.logger.info(f"Editing message {message.id} in chat {message.chat_id}: {new_text}")
-        edited_message = await self.client.edit_message(message.chat_id, message.id, new_text, parse_mode=parse_mode)
+        future = self.dispatcher.submit(PRIORITY_PROGRESS, message.chat_id, self.client.edit_message,
+                                        message.chat_id, message.id, new_text, parse_mode=parse_mode,
+                                        coalesce_key=(message.chat_id, message.id))
+        if not wait:
+            future.add_done_callback(self._log_background_error)
+            return None
+        edited_message = await future
         return edited_message
 
     async def delete_message(self, message_or_id, chat_id=None):
         if hasattr(message_or_id, 'id') and hasattr(message_or_id, 'chat_id'):
-            await self.client.delete_messages(message_or_id.chat_id, message_or_id.id)
+            chat_id, message_id = message_or_id.chat_id, message_or_id.id
         else:
             if chat_id is None:
                 raise ValueError("chat_id required when passing message id")
-            await self.client.delete_messages(chat_id, message_or_id)
\ No newline at end of file
+            message_id = message_or_id
+        # Una edición pendiente de un mensaje borrado ya no tiene sentido
+        self.dispatcher.discard_edit((chat_id, message_id))
+        await self.dispatcher.submit(PRIORITY_USER, chat_id, self.client.delete_messages, chat_id, message_id)
+
+    async def answer_callback(self, event, *args, **kwargs):
+        """Responde a un botón inline (event.answer) a través del dispatcher."""
+        return await self.dispatcher.submit(PRIORITY_USER, event.chat_id, event.answer, *args, **kwargs)
+
+    async def edit_callback_message(self, event, *args, **kwargs):
+        """Edita el mensaje del botón pulsado (event.edit) a través del dispatcher."""
+        return await self.dispatcher.submit(PRIORITY_USER, event.chat_id, event.edit, *args, **kwargs)
+
+    def get_stats(self):
+        """Contadores del dispatcher: queued, sent, coalesced, flood_waited, failed, pending, in_flight."""
+        return self.dispatcher.stats()
+
+    def _log_background_error(self, future):
+        if not future.cancelled() and future.exception() is not None:
+            self.logger.warning(f"Error in background edit: {future.exception()}")
@@ -0,0 +1,247 @@
+import asyncio
+import inspect
+import math
+import mimetypes
+import os
+import random
+import time
+from telethon.errors import FloodWaitError
+from telethon.network import MTProtoSender
+from telethon.tl.functions.upload import SaveBigFilePartRequest
+from telethon.tl.types import (
+    DocumentAttributeFilename, DocumentAttributeVideo, InputFileBig, InputMediaUploadedDocument
+)
+from src.config.logger import setup_logger
+from src.utils.metrics import metrics
+
+# Telegram exige partes de como mucho 512KB (múltiplos de 1KB que dividan 512KB),
+# como mucho 4000 partes por archivo, y trata como "big" los archivos > 10MB
+MAX_PART_SIZE = 512 * 1024
+MAX_PARTS = 4000
+BIG_FILE_THRESHOLD = 10 * 1024 * 1024
+
+
+class UploadEngine:
+    """
+    Subida de archivos grandes en partes y en paralelo.
+
+    Los archivos > 10MB se parten en trozos de hasta 512KB que se suben con
+    SaveBigFilePartRequest repartidos entre varias conexiones MTProto al DC del bot.
+    Las partes ya subidas se recuerdan por archivo mientras dura la llamada, así que
+    cada reintento solo sube lo que falta.
+    """
+
+    def __init__(self, client, config):
+        self.client = client
+        self.logger = setup_logger('UploadEngine')
+        self.connections = max(1, config.upload_connections)
+        self.part_size = self._check_part_size(config.upload_part_size, config.max_upload_bytes)
+        self.retries = config.upload_retries
+        # (ruta, tamaño, mtime) -> (file_id, partes subidas)
+        self._partial = {}
+
+    async def upload(self, filepath, progress_callback=None):
+        """Sube el archivo y devuelve el InputFile/InputFileBig para send_file."""
+        file_size = os.path.getsize(filepath)
+        start = time.monotonic()
+        if file_size <= BIG_FILE_THRESHOLD:
+            result = await self.client.upload_file(filepath, progress_callback=progress_callback)
+            self._record(file_size, start)
+            return result
+
+        stat = os.stat(filepath)
+        key = (os.path.abspath(filepath), stat.st_size, stat.st_mtime)
+        file_id, done = self._partial.setdefault(key, (random.getrandbits(63), set()))
+        part_count = math.ceil(file_size / self.part_size)
+
+        try:
+            for attempt in range(1, self.retries + 1):
+                try:
+                    await self._upload_parts(filepath, file_id, done, part_count, file_size, progress_callback)
+                    break
+                except Exception as e:
+                    self.logger.warning(
+                        f"Subida de {filepath} interrumpida ({len(done)}/{part_count} partes), "
+                        f"intento {attempt}/{self.retries}: {e}")
+                    if attempt == self.retries:
+                        raise
+                    await asyncio.sleep(2 ** attempt)
+        finally:
+            self._partial.pop(key, None)
+
+        self._record(file_size, start)
+        self.logger.info(f"Subido {filepath} ({file_size} bytes, {part_count} partes)")
+        return InputFileBig(file_id, part_count, os.path.basename(filepath))
+
+    async def upload_stream(self, buffer, file_name, total_size=None, progress_callback=None):
+        """
+        Sube las partes de un StreamBuffer según van llegando.
+        Mientras no se conoce la última parte se envía file_total_parts=-1.
+        """
+        file_id = random.getrandbits(63)
+        uploaded = [0]
+        start = time.monotonic()
+
+        async def worker(sender):
+            while True:
+                item = await buffer.get()
+                if item is None:
+                    return
+                index, data, is_last = item
+                try:
+                    total_parts = index + 1 if is_last else -1
+                    await self._send_part(sender, SaveBigFilePartRequest(file_id, index, total_parts, data))
+                finally:
+                    buffer.release()
+                uploaded[0] += len(data)
+                if progress_callback:
+                    result = progress_callback(uploaded[0], max(total_size or 0, uploaded[0]))
+                    if inspect.isawaitable(result):
+                        await result
+
+        senders = await self._open_senders()
+        workers = [asyncio.create_task(worker(sender)) for sender in senders]
+        try:
+            await asyncio.gather(*workers)
+        except Exception:
+            buffer.close()
+            raise
+        finally:
+            for task in workers:
+                task.cancel()
+            await self._close_senders(senders)
+
+        self._record(uploaded[0], start)
+        self.logger.info(f"Subido en streaming {file_name} ({uploaded[0]} bytes, {buffer.part_count} partes)")
+        return InputFileBig(file_id, buffer.part_count, file_name)
+
+    async def video_media(self, file, media, spoiler=False):
+        """
+        Envuelve un InputFile ya subido con los atributos de vídeo (duración, tamaño,
+        streaming) y la miniatura de MediaProcessor, así Telegram no tiene que procesarlo.
+        Lo que no es MP4 (VP9/AV1 sin reencodear) va con su tipo MIME y sin streaming.
+        """
+        thumb = None
+        if media.get('thumb'):
+            thumb = await self.client.upload_file(media['thumb'])
+        return InputMediaUploadedDocument(
+            file=file,
+            mime_type=mimetypes.guess_type(media['filename'])[0] or 'video/mp4',
+            attributes=[
+                DocumentAttributeVideo(duration=media['duration'], w=media['width'], h=media['height'],
+                                       supports_streaming=media.get('streaming', True)),
+                DocumentAttributeFilename(os.path.basename(media['filename'])),
+            ],
+            thumb=thumb,
+            spoiler=spoiler,
+        )
+
+    def _check_part_size(self, part_size, max_bytes):
+        """
+        Tamaño de parte válido para Telegram: una potencia de dos entre 1KB y 512KB con
+        la que el archivo más grande admitido (MAX_UPLOAD_BYTES) no pase de 4000 partes.
+        Si UPLOAD_PART_SIZE no cumple, se avisa y se usa 512KB.
+        """
+        valid = (1024 <= part_size <= MAX_PART_SIZE and MAX_PART_SIZE % part_size == 0
+                 and math.ceil(max_bytes / part_size) <= MAX_PARTS)
+        if not valid:
+            self.logger.warning(
+                f"UPLOAD_PART_SIZE={part_size} no vale para subir hasta {max_bytes} bytes "
+                f"(máx. {MAX_PARTS} partes de 1KB-512KB), se usa {MAX_PART_SIZE}")
+            return MAX_PART_SIZE
+        return part_size
+
+    def _record(self, nbytes, start):
+        elapsed = time.monotonic() - start
+        metrics.observe_stage('upload', elapsed)
+        metrics.observe_transfer('upload', nbytes, elapsed)
+
+    async def _upload_parts(self, filepath, file_id, done, part_count, file_size, progress_callback):
+        pending = asyncio.Queue()
+        for index in range(part_count):
+            if index not in done:
+                pending.put_nowait(index)
+
+        senders = await self._open_senders()
+        fd = os.open(filepath, os.O_RDONLY)
+        try:
+            workers = [
+                asyncio.create_task(self._worker(sender, fd, pending, file_id, done, part_count,
+                                                 file_size, progress_callback))
+                for sender in senders
+            ]
+            try:
+                await asyncio.gather(*workers)
+            finally:
+                for worker in workers:
+                    worker.cancel()
+        finally:
+            os.close(fd)
+            await self._close_senders(senders)
+
+    async def _worker(self, sender, fd, pending, file_id, done, part_count, file_size, progress_callback):
+        while True:
+            try:
+                index = pending.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            data = await asyncio.to_thread(os.pread, fd, self.part_size, index * self.part_size)
+            request = SaveBigFilePartRequest(file_id, index, part_count, data)
+            await self._send_part(sender, request)
+            done.add(index)
+
+            if progress_callback:
+                uploaded = min(len(done) * self.part_size, file_size)
+                result = progress_callback(uploaded, file_size)
+                if inspect.isawaitable(result):
+                    await result
+
+    async def _send_part(self, sender, request):
+        for attempt in range(1, self.retries + 1):
+            try:
+                if sender is None:
+                    return await self.client(request)
+                return await sender.send(request)
+            except FloodWaitError as e:
+                self.logger.warning(f"FloodWait subiendo parte {request.file_part}: {e.seconds}s")
+                await asyncio.sleep(e.seconds)
+            except (ConnectionError, asyncio.TimeoutError) as e:
+                if attempt == self.retries:
+                    raise
+                self.logger.warning(f"Error de red en parte {request.file_part}, reintentando: {e}")
+                await asyncio.sleep(attempt)
+        raise RuntimeError(f"No se pudo subir la parte {request.file_part}")
+
+    async def _open_senders(self):
+        """
+        Abre conexiones extra al DC del bot reutilizando su auth_key.
+        Si no se pueden abrir se usa la conexión principal del cliente (None).
+        """
+        senders = []
+        try:
+            dc = await self.client._get_dc(self.client.session.dc_id)
+            for _ in range(self.connections):
+                sender = MTProtoSender(self.client.session.auth_key, loggers=self.client._log)
+                await sender.connect(self.client._connection(
+                    dc.ip_address,
+                    dc.port,
+                    dc.id,
+                    loggers=self.client._log,
+                    proxy=self.client._proxy,
+                    local_addr=self.client._local_addr
+                ))
+                senders.append(sender)
+        except Exception as e:
+            self.logger.warning(f"No se pudieron abrir conexiones de subida extra ({e}), usando la principal")
+        if not senders:
+            # Aun con una sola conexión, varias partes en vuelo aprovechan mejor el ancho de banda
+            return [None] * self.connections
+        return senders
+
+    async def _close_senders(self, senders):
+        for sender in senders:
+            if sender is not None:
+                try:
+                    await sender.disconnect()
+                except Exception as e:
+                    self.logger.warning(f"Error cerrando conexión de subida: {e}")
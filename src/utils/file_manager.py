@@ -1,11 +1,24 @@
+import asyncio
+import errno
+import fcntl
 import os
 import shutil
+import urllib.parse
 from src.config.logger import setup_logger
 
+# ioctl FICLONE de Linux (_IOW(0x94, 9, int)): reflink en btrfs/xfs/overlayfs compatibles
+FICLONE = 0x40049409
+
+DEFAULT_WWW_DIR = '/app/www'
+DEFAULT_WWW_BASE_URL = 'http://portal.davidperezmillan.com/grande/downloads'
+
+
 class FileManager:
-    def __init__(self):
+    def __init__(self, config=None):
         self.logger = setup_logger('FileManager')
         self.persist_dir = os.path.join('downloads', 'persist')
+        self.www_dir = getattr(config, 'www_dir', None) or DEFAULT_WWW_DIR
+        self.www_base_url = (getattr(config, 'www_base_url', None) or DEFAULT_WWW_BASE_URL).rstrip('/')
         self._ensure_dirs()
 
     def _ensure_dirs(self):
@@ -14,63 +27,110 @@ class FileManager:
         os.makedirs(self.persist_dir, exist_ok=True)
 
     def persist_file(self, filepath):
-        """Mueve el archivo a la carpeta persist."""
+        """Mueve el archivo a la carpeta persist (rename O(1); copia solo entre volúmenes)."""
         try:
             if not os.path.exists(filepath):
                 self.logger.error(f"Archivo no encontrado: {filepath}")
                 return False
-            
+
             filename = os.path.basename(filepath)
             persist_path = os.path.join(self.persist_dir, filename)
-            
-            shutil.move(filepath, persist_path)
+
+            try:
+                os.rename(filepath, persist_path)
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    raise
+                shutil.move(filepath, persist_path)
             self.logger.info(f"Archivo persistido: {filepath} -> {persist_path}")
             return True
         except Exception as e:
             self.logger.error(f"Error persistiendo archivo {filepath}: {e}")
             return False
 
-    def copy_file_to_www(self, filepath, newfilename=None):
+    def get_www_url(self, filename):
+        """URL pública del archivo publicado en www."""
+        return f"{self.www_base_url}/{urllib.parse.quote(filename)}"
+
+    async def publish_to_www(self, filepath, newfilename=None, allow_move=False):
         """
-        Copia el archivo a la carpeta www para acceso público.
+        Publica el archivo en la carpeta www para acceso público.
+        Prueba, en orden, hardlink, reflink (FICLONE) y rename atómico (si allow_move),
+        que son O(1) en el tamaño del archivo; solo si ninguno funciona copia el
+        archivo en un hilo para no bloquear el event loop.
         Args:
-            filepath (str): Ruta del archivo a copiar.
-            newfilename (str, optional): Nuevo nombre para el archivo copiado. 
+            filepath (str): Ruta del archivo a publicar.
+            newfilename (str, optional): Nuevo nombre para el archivo publicado.
             Si no se proporciona, se usa el nombre original.
             solo el nombre
+            allow_move (bool): Permite mover el original si no se puede enlazar. Por
+            defecto no: el original sigue en downloads/ para la caché y la retención.
         Returns:
-            bool: True si la copia fue exitosa, False en caso contrario.
+            bool: True si la publicación fue exitosa, False en caso contrario.
         """
         try:
             if not os.path.exists(filepath):
                 self.logger.error(f"Archivo no encontrado: {filepath}")
                 return False
 
-            www_dir = '/app/www'
-            os.makedirs(www_dir, exist_ok=True)
+            os.makedirs(self.www_dir, exist_ok=True)
             filename = os.path.basename(filepath)
-            www_path = os.path.join(www_dir, newfilename or filename)
+            www_path = os.path.join(self.www_dir, newfilename or filename)
 
-            shutil.copy2(filepath, www_path)
-            self.logger.info(f"Archivo copiado a www: {filepath} -> {www_path}")
+            method = self._publish_linked(filepath, www_path, allow_move)
+            if method is None:
+                await asyncio.to_thread(self._copy_atomic, filepath, www_path)
+                method = 'copy'
+            self.logger.info(f"Archivo publicado en www ({method}): {filepath} -> {www_path}")
             return True
         except Exception as e:
-            self.logger.error(f"Error copiando archivo a www {filepath}: {e}")
+            self.logger.error(f"Error publicando archivo en www {filepath}: {e}")
             return False
 
-            
-            www_dir = '/app/www'
-            os.makedirs(www_dir, exist_ok=True)
-            filename = os.path.basename(filepath)
-            www_path = os.path.join(www_dir, filename)
-            
-            shutil.copy2(filepath, www_path)
-            self.logger.info(f"Archivo copiado a www: {filepath} -> {www_path}")
-            return True
-        except Exception as e:
-            self.logger.error(f"Error copiando archivo a www {filepath}: {e}")
-            return False
+    def _publish_linked(self, src, dst, allow_move):
+        """Intenta las estrategias O(1); devuelve el nombre de la que funcionó o None."""
+        if os.path.exists(dst):
+            os.remove(dst)
+        try:
+            os.link(src, dst)
+            return 'hardlink'
+        except OSError as e:
+            self.logger.debug(f"Hardlink no disponible ({e})")
+        try:
+            self._reflink(src, dst)
+            return 'reflink'
+        except OSError as e:
+            self.logger.debug(f"Reflink no disponible ({e})")
+        if allow_move:
+            try:
+                os.rename(src, dst)
+                return 'rename'
+            except OSError as e:
+                self.logger.debug(f"Rename no disponible ({e})")
+        return None
 
+    def _reflink(self, src, dst):
+        tmp = f"{dst}.tmp"
+        with open(src, 'rb') as fsrc, open(tmp, 'wb') as fdst:
+            try:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+            except OSError:
+                fdst.close()
+                os.remove(tmp)
+                raise
+        os.replace(tmp, dst)
+
+    def _copy_atomic(self, src, dst):
+        # copyfile usa sendfile en Linux; el rename final evita servir un archivo a medias
+        tmp = f"{dst}.tmp"
+        try:
+            shutil.copyfile(src, tmp)
+            shutil.copystat(src, tmp)
+            os.replace(tmp, dst)
+        except Exception:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
 
     def delete_file(self, filepath):
         """Elimina el archivo del filesystem."""
@@ -84,4 +144,4 @@ class FileManager:
                 return False
         except Exception as e:
             self.logger.error(f"Error eliminando archivo {filepath}: {e}")
-            return False
\ No newline at end of file
+            return False
@@ -0,0 +1,225 @@
+import asyncio
+import time
+from contextlib import contextmanager
+from src.config.logger import setup_logger
+
+# Buckets por defecto para latencias (segundos) y velocidades (bytes/s)
+LATENCY_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+SPEED_BUCKETS = (64e3, 256e3, 1e6, 2.5e6, 5e6, 10e6, 25e6, 50e6, 100e6)
+
+
+def _label_text(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels) + '}'
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        for labels, value in self.values.items():
+            yield self.name, labels, value
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        self.values[tuple(sorted(labels.items()))] = value
+
+
+class CallbackMetric:
+    """Métrica cuyo valor se lee de una función al exportar (profundidad de cola, contadores ajenos...)."""
+
+    def __init__(self, name, help_text, func, kind='gauge'):
+        self.name = name
+        self.help = help_text
+        self.func = func
+        self.kind = kind
+
+    def samples(self):
+        yield self.name, (), self.func()
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        # labels -> [counts por bucket..., +Inf], suma, total
+        self.series = {}
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        counts = series[0]
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[index] += 1
+                break
+        else:
+            counts[-1] += 1
+        series[1] += value
+        series[2] += 1
+
+    def quantile(self, q, **labels):
+        """Cuantil aproximado (límite superior del bucket), o None si no hay datos."""
+        series = self.series.get(tuple(sorted(labels.items())))
+        if not series or not series[2]:
+            return None
+        target = q * series[2]
+        seen = 0
+        for bound, count in zip(self.buckets + (float('inf'),), series[0]):
+            seen += count
+            if seen >= target:
+                return bound
+        return float('inf')
+
+    def samples(self):
+        for labels, (counts, total, count) in self.series.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else f'{bound:g}'
+                yield f'{self.name}_bucket', labels + (('le', le),), cumulative
+            yield f'{self.name}_sum', labels, total
+            yield f'{self.name}_count', labels, count
+
+
+class MetricsRegistry:
+    """Registro de métricas del proceso con exportación en formato texto de Prometheus."""
+
+    def __init__(self, prefix='grande_bot'):
+        self.prefix = prefix
+        self.logger = setup_logger('Metrics')
+        self._metrics = {}
+
+    def _get(self, cls, name, *args, **kwargs):
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = cls(f'{self.prefix}_{name}', *args, **kwargs)
+            self._metrics[name] = metric
+        return metric
+
+    def counter(self, name, help_text=''):
+        return self._get(Counter, name, help_text)
+
+    def gauge(self, name, help_text=''):
+        return self._get(Gauge, name, help_text)
+
+    def histogram(self, name, help_text='', buckets=LATENCY_BUCKETS):
+        return self._get(Histogram, name, help_text, buckets)
+
+    def callback(self, name, help_text, func, kind='gauge'):
+        """Registra (o reemplaza) una métrica calculada al exportar."""
+        metric = CallbackMetric(f'{self.prefix}_{name}', help_text, func, kind)
+        self._metrics[name] = metric
+        return metric
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def value(self, name, default=0):
+        """Valor actual (sin etiquetas) de un contador, gauge o métrica calculada."""
+        metric = self._metrics.get(name)
+        if metric is None or isinstance(metric, Histogram):
+            return default
+        for _, labels, value in metric.samples():
+            if not labels:
+                return value
+        return default
+
+    @contextmanager
+    def timer(self, stage):
+        """Mide la duración del bloque en el histograma stage_seconds."""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe_stage(stage, time.monotonic() - start)
+
+    def observe_stage(self, stage, seconds):
+        self.histogram('stage_seconds', 'Duración de cada etapa del procesado de un enlace').observe(
+            seconds, stage=stage)
+
+    def observe_transfer(self, direction, nbytes, seconds):
+        """Registra bytes transferidos y la velocidad (download/upload)."""
+        self.counter(f'{direction}_bytes_total', f'Bytes de {direction}').inc(nbytes)
+        if seconds > 0:
+            self.histogram('transfer_bytes_per_second', 'Velocidad de descarga/subida',
+                           SPEED_BUCKETS).observe(nbytes / seconds, direction=direction)
+
+    def render(self):
+        """Exporta todas las métricas en formato texto de Prometheus."""
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            try:
+                for name, labels, value in metric.samples():
+                    lines.append(f'{name}{_label_text(labels)} {value}')
+            except Exception as e:
+                self.logger.warning(f"Error leyendo la métrica {metric.name}: {e}")
+        return '\n'.join(lines) + '\n'
+
+
+metrics = MetricsRegistry()
+
+
+async def watch_loop_lag(interval=0.5):
+    """Watchdog: mide cuánto se retrasa el event loop respecto a un sleep de `interval`."""
+    lag_gauge = metrics.gauge('event_loop_lag_last_seconds', 'Último retraso medido del event loop')
+    lag_histogram = metrics.histogram('event_loop_lag_seconds', 'Retrasos del event loop (segundos)')
+    while True:
+        start = time.monotonic()
+        await asyncio.sleep(interval)
+        lag = max(0.0, time.monotonic() - start - interval)
+        lag_gauge.set(lag)
+        lag_histogram.observe(lag)
+
+
+async def start_metrics_server(host, port):
+    """Servidor HTTP mínimo que responde GET /metrics con el texto de Prometheus."""
+    logger = setup_logger('MetricsServer')
+
+    async def handle(reader, writer):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+            # Descartar cabeceras
+            while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b'\r\n', b'\n', b''):
+                pass
+            parts = request_line.decode('latin-1').split()
+            if len(parts) >= 2 and parts[0] == 'GET' and parts[1].split('?')[0] == '/metrics':
+                body = metrics.render().encode('utf-8')
+                status = '200 OK'
+                content_type = 'text/plain; version=0.0.4; charset=utf-8'
+            else:
+                body = b'Not Found\n'
+                status = '404 Not Found'
+                content_type = 'text/plain'
+            writer.write(
+                f'HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n'
+                f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n'.encode('latin-1') + body)
+            await writer.drain()
+        except Exception as e:
+            logger.warning(f"Error atendiendo petición de métricas: {e}")
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    logger.info(f"Métricas disponibles en http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,225 @@
+import asyncio
+import os
+import shutil
+import time
+from src.config.logger import setup_logger
+
+# Archivos que yt-dlp aún está escribiendo
+_PARTIAL_SUFFIXES = ('.part', '.ytdl', '.tmp')
+
+
+class Artifact:
+    """Archivo conocido por el gestor de retención."""
+
+    __slots__ = ('path', 'size', 'last_access', 'persistent')
+
+    def __init__(self, path, size, last_access, persistent):
+        self.path = path
+        self.size = size
+        self.last_access = last_access
+        self.persistent = persistent
+
+
+class RetentionManager:
+    """
+    Retención de downloads/ con cuota de bytes, TTL y desalojo LRU.
+
+    Lleva un índice en memoria de los archivos (tamaño y último acceso) que se
+    reconstruye con barridos incrementales del directorio en un hilo, por lotes,
+    así directorios con decenas de miles de archivos no paran el event loop.
+    Los archivos de persist/ se contabilizan aparte y nunca se desalojan.
+    """
+
+    def __init__(self, file_manager, config, on_evict=None):
+        self.logger = setup_logger('RetentionManager')
+        self.file_manager = file_manager
+        self.root = 'downloads'
+        self.persist_dir = file_manager.persist_dir
+        self.quota = config.retention_quota_bytes
+        self.ttl = config.retention_ttl
+        self.interval = config.retention_interval
+        self.min_free = config.retention_min_free_bytes
+        self.admission_wait = config.retention_admission_wait
+        self.min_age = config.retention_min_age
+        self.scan_batch = 500
+        self.on_evict = on_evict
+        self._artifacts = {}
+        self._pinned = set()
+        self._task = None
+        self._sweep_lock = asyncio.Lock()
+
+    def start(self):
+        """Arranca el barrido periódico en segundo plano."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    # --- índice ---
+
+    def register(self, path):
+        """Añade o refresca un archivo recién escrito."""
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return
+        self._artifacts[path] = Artifact(path, size, time.time(), self._is_persistent(path))
+
+    def touch(self, path):
+        """Marca un acceso (p. ej. reenvío desde la caché) para el LRU."""
+        artifact = self._artifacts.get(path)
+        if artifact is not None:
+            artifact.last_access = time.time()
+
+    def forget(self, path):
+        self._artifacts.pop(path, None)
+
+    def pin(self, path):
+        """Protege un archivo en uso (descarga o subida en curso) del desalojo."""
+        self._pinned.add(path)
+
+    def unpin(self, path):
+        self._pinned.discard(path)
+
+    def usage(self):
+        """Bytes en uso: (efímeros, persistidos)."""
+        ephemeral = persistent = 0
+        for artifact in self._artifacts.values():
+            if artifact.persistent:
+                persistent += artifact.size
+            else:
+                ephemeral += artifact.size
+        return ephemeral, persistent
+
+    def stats(self):
+        ephemeral, persistent = self.usage()
+        return {
+            'files': len(self._artifacts),
+            'ephemeral_bytes': ephemeral,
+            'persistent_bytes': persistent,
+            'quota_bytes': self.quota,
+            'free_bytes': self._free_bytes(),
+        }
+
+    # --- admisión ---
+
+    async def admit(self, needed_bytes):
+        """
+        Comprueba que hay espacio para una descarga de needed_bytes (más la reserva).
+        Si falta, desaloja y espera hasta admission_wait segundos a que se libere.
+        """
+        needed = (needed_bytes or 0) + self.min_free
+        deadline = time.monotonic() + self.admission_wait
+        while True:
+            free = self._free_bytes()
+            if free >= needed:
+                return True
+            await self.sweep(extra_bytes=needed - free)
+            if self._free_bytes() >= needed:
+                return True
+            if time.monotonic() >= deadline:
+                self.logger.warning(f"Sin espacio para {needed_bytes} bytes (libres: {free})")
+                return False
+            await asyncio.sleep(min(5, max(0.0, deadline - time.monotonic())))
+
+    def _free_bytes(self):
+        return shutil.disk_usage(self.root).free
+
+    # --- barrido ---
+
+    async def _run(self):
+        while True:
+            try:
+                await self.sweep()
+            except Exception as e:
+                self.logger.error(f"Error en el barrido de retención: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def sweep(self, extra_bytes=0):
+        """Re-escanea downloads/ por lotes y aplica TTL, cuota y la reserva pedida."""
+        async with self._sweep_lock:
+            await self._rescan()
+            await self._evict(extra_bytes)
+
+    async def _rescan(self):
+        seen = {}
+        for directory in (self.root, self.persist_dir):
+            iterator = await asyncio.to_thread(os.scandir, directory)
+            try:
+                while True:
+                    batch = await asyncio.to_thread(self._scan_batch, iterator)
+                    if not batch:
+                        break
+                    for path, size, last_access in batch:
+                        seen[path] = (size, last_access)
+                    # Ceder el loop entre lotes
+                    await asyncio.sleep(0)
+            finally:
+                iterator.close()
+
+        for path in list(self._artifacts):
+            if path not in seen:
+                del self._artifacts[path]
+        for path, (size, last_access) in seen.items():
+            artifact = self._artifacts.get(path)
+            if artifact is None:
+                self._artifacts[path] = Artifact(path, size, last_access, self._is_persistent(path))
+            else:
+                artifact.size = size
+                artifact.last_access = max(artifact.last_access, last_access)
+
+    def _scan_batch(self, iterator):
+        batch = []
+        for entry in iterator:
+            try:
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+                stat = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            batch.append((entry.path, stat.st_size, max(stat.st_atime, stat.st_mtime)))
+            if len(batch) >= self.scan_batch:
+                break
+        return batch
+
+    async def _evict(self, extra_bytes=0):
+        now = time.time()
+        candidates = sorted(
+            (a for a in self._artifacts.values() if self._evictable(a, now)),
+            key=lambda a: a.last_access,
+        )
+        ephemeral, _ = self.usage()
+        to_free = max(ephemeral - self.quota, 0, extra_bytes)
+
+        victims = []
+        for artifact in candidates:
+            expired = now - artifact.last_access > self.ttl
+            if not expired and to_free <= 0:
+                # Orden LRU: el resto es más reciente y no hace falta espacio
+                break
+            victims.append(artifact)
+            to_free -= artifact.size
+
+        for start in range(0, len(victims), self.scan_batch):
+            batch = victims[start:start + self.scan_batch]
+            await asyncio.to_thread(self._delete_batch, batch)
+            for artifact in batch:
+                self._artifacts.pop(artifact.path, None)
+                if self.on_evict:
+                    self.on_evict(artifact.path)
+        if victims:
+            self.logger.info(f"Retención: desalojados {len(victims)} archivos "
+                             f"({sum(a.size for a in victims)} bytes)")
+
+    def _delete_batch(self, artifacts):
+        for artifact in artifacts:
+            self.file_manager.delete_file(artifact.path)
+
+    def _evictable(self, artifact, now):
+        if artifact.persistent or artifact.path in self._pinned:
+            return False
+        if artifact.path.endswith(_PARTIAL_SUFFIXES) and now - artifact.last_access < self.ttl:
+            # Descarga en curso o reanudable: solo se borra cuando caduca
+            return False
+        return now - artifact.last_access >= self.min_age
+
+    def _is_persistent(self, path):
+        return os.path.dirname(os.path.abspath(path)) == os.path.abspath(self.persist_dir)
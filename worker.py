@@ -0,0 +1,23 @@
+from dotenv import load_dotenv
+from src.config.config import Config
+from src.config.logger import setup_logger
+from src.downloader.worker import DownloadWorker
+
+# Cargar variables de entorno
+load_dotenv()
+
+def main():
+    logger = setup_logger('Worker')
+    logger.info("Iniciando worker de descargas...")
+
+    # Los workers no necesitan credenciales de Telegram
+    config = Config(require_telegram=False)
+    if config.download_backend == 'local':
+        # Salida limpia: con restart on-failure el contenedor no entra en bucle
+        logger.warning("DOWNLOAD_BACKEND=local: las descargas se hacen en el bot, el worker no tiene nada que hacer")
+        return
+
+    DownloadWorker(config).run()
+
+if __name__ == '__main__':
+    main()